@@ -7,6 +7,8 @@ import coloredlogs
 import reusables
 from PySide6 import QtGui, QtWidgets, QtCore
 
+from fastflix.exceptions import QueueInUse
+from fastflix.ff_queue import claim_queue, release_queue
 from fastflix.flix import ffmpeg_audio_encoders, ffmpeg_configuration, ffprobe_configuration, ffmpeg_opencl_support
 from fastflix.language import t
 from fastflix.models.config import Config, MissingFF
@@ -277,6 +279,14 @@ def app_setup(
 
     app.fastflix.config.save()
 
+    try:
+        claim_queue(app.fastflix.queue_path, "FastFlix")
+    except QueueInUse as err:
+        # Other FastFlix windows already keep the queue file in step, a headless runner or farm server doesn't
+        if err.owner != "FastFlix":
+            message(f"{err}\n\n{t('Stop it before starting FastFlix')}", title=t("Queue in use"))
+            sys.exit(1)
+
     startup_tasks = [
         Task(t("Gather FFmpeg version"), ffmpeg_configuration),
         Task(t("Gather FFprobe version"), ffprobe_configuration),
@@ -321,3 +331,5 @@ def start_app(worker_queue, status_queue, log_queue, portable_mode=False, enable
     except Exception:
         logger.exception("Error while running FastFlix")
         raise
+    finally:
+        release_queue(app.fastflix.queue_path)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Headless queue runner, `fastflix run-queue <queue.yaml>`.
+
+Runs a saved queue straight through the conversion worker without starting the GUI. Nothing here (or anything
+it imports) may import PySide6, so startup stays quick on machines that only encode.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Event, Thread
+from typing import Optional, TextIO
+
+import reusables
+
+from fastflix.conversion_worker import log_path, queue_worker
+from fastflix.exceptions import QueueInUse
+from fastflix.ff_queue import (
+    claim_queue,
+    execute_requests,
+    get_queue,
+    pending_commands,
+    release_queue,
+    resumable_commands,
+    save_queue,
+)
+from fastflix.models.video import Video
+from fastflix.progress import ProgressEvent
+from fastflix.telemetry import EtaPredictor, job_details
+from fastflix.version import __version__
+
+__all__ = ["HeadlessQueue", "run_queue_cli"]
+
+logger = logging.getLogger("fastflix-core")
+
+exit_success = 0
+exit_failed = 1
+exit_usage = 2
+exit_interrupted = 130
+
+
+class WorkerController:
+    """Stands in for the GUI process the conversion worker watches, the worker stops once this "dies" """
+
+    def __init__(self):
+        self.finished = Event()
+
+    def is_alive(self) -> bool:
+        return not self.finished.is_set()
+
+    def join(self, timeout=None):
+        pass
+
+
+class HeadlessQueue:
+    """
+    Sends every unfinished video of a queue to the conversion worker, the same way the GUI does, and writes
+    one JSON object per line to the output for every start, progress report, finish and the final summary.
+    """
+
+    def __init__(
+        self,
+        queue_file: Path,
+        jobs: int = 1,
+        out: TextIO = sys.stdout,
+        show_output: bool = False,
+        stall_timeout: float = 0,
+        stall_retries: int = 0,
+    ):
+        self.queue_file = queue_file
+        self.jobs = max(1, jobs)
+        self.stall_timeout = stall_timeout
+        self.stall_retries = stall_retries
+        self.out = out
+        self.show_output = show_output
+        self.queue: list[Video] = []
+        self.worker_queue = Queue()
+        self.status_queue = Queue()
+        self.log_queue = Queue()
+        self.controller = WorkerController()
+        self.worker: Optional[Thread] = None
+
+    def emit(self, event: str, **fields):
+        self.out.write(json.dumps({"event": event, "time": round(time.time(), 3), **fields}) + "\n")
+        self.out.flush()
+
+    def load(self) -> list[Video]:
+        self.queue = get_queue(self.queue_file)
+        todo = [video for video in self.queue if not video.status.complete]
+        for video in todo:
+            video.status.clear_for_resume(resumable_commands(video))
+        return todo
+
+    def save(self):
+        try:
+            save_queue(self.queue, self.queue_file)
+        except Exception:
+            logger.exception(f"Could not save queue progress to {self.queue_file}")
+
+    def find_video(self, video_uuid: str) -> Optional[Video]:
+        for video in self.queue:
+            if video.uuid == video_uuid:
+                return video
+        return None
+
+    def running_videos(self) -> list[Video]:
+        return [video for video in self.queue if video.status.running]
+
+    def send(self, video: Video):
+        names = {command.uuid: command.name for command in video.video_settings.conversion_commands}
+        for request in execute_requests(video, job_details(video)):
+            command_uuid = request[2]
+            self.emit(
+                "start", video=video.uuid, command=command_uuid, name=names[command_uuid], source=str(video.source)
+            )
+            self.worker_queue.put(request)
+
+    def dispatch(self):
+        free_slots = self.jobs - len(self.running_videos())
+        for video in self.queue:
+            if free_slots <= 0:
+                break
+            if video.status.ready:
+                self.send(video)
+                free_slots -= 1
+
+    def handle_status(self, status: str, video_uuid: str, command_uuid: str):
+        video = self.find_video(video_uuid)
+        if not video:
+            return
+        if command_uuid in video.status.running_commands:
+            video.status.running_commands.remove(command_uuid)
+        video.status.running = bool(video.status.running_commands)
+        self.emit(status, video=video_uuid, command=command_uuid)
+
+        if status == "complete":
+            video.status.current_command += 1
+            video.status.completed_commands.append(command_uuid)
+            if not video.status.running:
+                if pending_commands(video):
+                    self.send(video)
+                else:
+                    video.status.complete = True
+                    video.status.success = True
+                    self.emit("video_complete", video=video_uuid, output=str(video.video_settings.output_path))
+            self.save()
+        elif status == "error":
+            if not video.status.error and video.status.running:
+                self.worker_queue.put(["cancel", video_uuid])
+            video.status.error = True
+            self.save()
+        elif status == "cancelled" and not video.status.error:
+            video.status.cancelled = True
+
+    def handle_log(self, message):
+        if isinstance(message, ProgressEvent):
+            video = self.find_video(message.video_uuid)
+            fields = {
+                "video": message.video_uuid,
+                "command": message.command_uuid,
+                "frame": message.frame,
+                "fps": message.fps,
+                "out_time": message.out_time,
+                "speed": message.speed,
+                "bitrate": message.bitrate,
+                "size": message.total_size,
+            }
+            if video:
+                settings = video.video_settings
+                length = (settings.end_time or video.duration) - (settings.start_time or 0)
+                if length:
+                    fields["percent"] = round(min(message.out_time / length * 100, 100), 1)
+            self.emit("progress", **fields)
+        elif isinstance(message, list) and self.show_output:
+            for line in message:
+                print(line, file=sys.stderr)
+
+    def drain_logs(self):
+        while True:
+            try:
+                self.handle_log(self.log_queue.get_nowait())
+            except Empty:
+                return
+
+    def run(self) -> int:
+        todo = self.load()
+        if not todo:
+            self.emit("summary", total=0, complete=0, failed=0)
+            return exit_success
+
+        predictor = EtaPredictor()
+        predictor.refresh()
+        eta, unknown = predictor.queue_eta(todo, slots=self.jobs)
+        self.emit("queue", total=len(todo), eta=round(eta), unpredicted=unknown)
+
+        log_path.mkdir(parents=True, exist_ok=True)
+        self.worker = Thread(
+            target=queue_worker,
+            args=(
+                self.controller,
+                self.worker_queue,
+                self.status_queue,
+                self.log_queue,
+                self.jobs,
+                self.stall_timeout,
+                self.stall_retries,
+            ),
+            daemon=True,
+        )
+        self.worker.start()
+
+        interrupted = False
+        try:
+            self.dispatch()
+            while self.running_videos():
+                self.drain_logs()
+                if not self.worker.is_alive():
+                    logger.error("Conversion worker stopped unexpectedly")
+                    for video in self.running_videos():
+                        video.status.running = False
+                        video.status.error = True
+                    break
+                try:
+                    status = self.status_queue.get(timeout=0.1)
+                except Empty:
+                    continue
+                if status[0] == "exit":
+                    break
+                self.handle_status(*status)
+                self.dispatch()
+        except KeyboardInterrupt:
+            interrupted = True
+            self.worker_queue.put(["cancel"])
+        finally:
+            self.controller.finished.set()
+            self.worker.join(timeout=10)
+            self.drain_logs()
+            self.save()
+
+        failed = [video for video in todo if video.status.error or video.status.cancelled]
+        self.emit(
+            "summary",
+            total=len(todo),
+            complete=len([video for video in todo if video.status.complete]),
+            failed=len(failed),
+            interrupted=interrupted,
+        )
+        if interrupted:
+            return exit_interrupted
+        return exit_failed if failed else exit_success
+
+
+def run_queue_cli(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="fastflix run-queue",
+        description="Encode a saved FastFlix queue without starting the GUI. "
+        "Progress is written to stdout as one JSON object per line.",
+    )
+    parser.add_argument("queue_file", type=Path, help="queue .yaml file saved from FastFlix")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="queue items to encode at the same time")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print encoder output to stderr")
+    parser.add_argument(
+        "--stall-timeout", type=float, default=600, help="seconds without progress before a command is stopped, 0 off"
+    )
+    parser.add_argument("--stall-retries", type=int, default=1, help="restarts of a stalled command before it fails")
+    options = parser.parse_args(args)
+
+    if not options.queue_file.exists():
+        print(f"Queue file {options.queue_file} does not exist", file=sys.stderr)
+        return exit_usage
+
+    if options.verbose:
+        logger.addHandler(reusables.get_stream_handler(level=logging.DEBUG))
+        logger.setLevel(logging.DEBUG)
+    logger.info(f"Starting FastFlix {__version__} headless queue runner")
+
+    try:
+        claim_queue(options.queue_file, "run-queue")
+    except QueueInUse as err:
+        print(err, file=sys.stderr)
+        return exit_usage
+    try:
+        return HeadlessQueue(
+            options.queue_file,
+            jobs=options.jobs,
+            show_output=options.verbose,
+            stall_timeout=options.stall_timeout,
+            stall_retries=options.stall_retries,
+        ).run()
+    finally:
+        release_queue(options.queue_file)
@@ -2,17 +2,19 @@
 # -*- coding: utf-8 -*-
 import datetime
 import logging
-import secrets
+import re
 import shlex
-import time
 from pathlib import Path
 from queue import Full
 from subprocess import PIPE
-from threading import Thread
-from typing import Literal
+from threading import Event, Lock, Thread
+from typing import List, Literal, Optional
 import sys
+import time
+
+from psutil import Error as PsutilError, Popen
 
-from psutil import Popen
+from fastflix.progress import ProgressEvent, ProgressParser
 
 try:
     from psutil import (
@@ -44,41 +46,117 @@ else:
 
 logger = logging.getLogger("fastflix-core")
 
-__all__ = ["BackgroundRunner"]
+line_breaks = re.compile(rb"\r\n|\r|\n")
+
+# Text status lines that are redrawn constantly, only the newest one in a batch is worth sending
+status_line = re.compile(r"^(frame=|\[\s*\d+(\.\d+)?%\])|remain \d")
+
+__all__ = ["BackgroundRunner", "LogBatcher", "StallWatchdog"]
+
+
+class LogBatcher:
+    """
+    Coalesce encoder output into lists of lines so the GUI gets one queue message per batch instead of per line.
+    A batch is sent every interval seconds or as soon as it holds max_lines. Within a batch only the latest
+    status line and the latest progress event are kept, the progress event is sent right after its batch.
+    Every line sent gets the prefix, which tells apart the output of encodes running at the same time.
+    """
+
+    def __init__(self, put, interval: float = 0.1, max_lines: int = 200, prefix: str = ""):
+        self.put = put
+        self.prefix = prefix
+        self.interval = interval
+        self.max_lines = max_lines
+        self.lock = Lock()
+        self.lines = []
+        self.status_index = None
+        self.progress = None
+        self.stopped = Event()
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, item):
+        with self.lock:
+            if isinstance(item, ProgressEvent):
+                self.progress = item
+            elif status_line.search(item):
+                if self.status_index is None:
+                    self.status_index = len(self.lines)
+                    self.lines.append(item)
+                else:
+                    self.lines[self.status_index] = item
+            else:
+                self.lines.append(item)
+            full = len(self.lines) >= self.max_lines
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            lines, self.lines = self.lines, []
+            progress, self.progress = self.progress, None
+            self.status_index = None
+        if lines:
+            self.put([f"{self.prefix}{line}" for line in lines] if self.prefix else lines)
+        if progress:
+            self.put(progress)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        self.stopped.set()
+        self.flush()
 
 
 class BackgroundRunner:
-    def __init__(self, log_queue):
+    read_size = 64 * 1024
+
+    def __init__(
+        self,
+        log_queue,
+        logger_name: str = "fastflix-core",
+        video_uuid: str = "",
+        command_uuid: str = "",
+        log_prefix: str = "",
+    ):
+        self.logger = logging.getLogger(logger_name)
+        self.log_prefix = log_prefix
+        self.progress = ProgressParser(video_uuid=video_uuid, command_uuid=command_uuid)
         self.process = None
         self.killed = False
-        self.output_file = None
-        self.error_output_file = None
+        self.readers = []
+        self.readers_lock = Lock()
+        self.readers_finished = 0
+        self.batcher = None
         self.log_queue = log_queue
         self.error_detected = False
         self.success_detected = False
         self.error_message = []
         self.success_message = []
         self.started_at = None
+        self.lines_read = 0
 
-    def start_exec(self, command, work_dir: str = None, shell: bool = False, errors=(), successes=()):
+    def start_exec(
+        self,
+        command,
+        work_dir: str = None,
+        shell: bool = False,
+        errors=(),
+        successes=(),
+        cpu_affinity: Optional[List[int]] = None,
+    ):
         self.clean()
-        logger.debug(f"Using work dir: {work_dir}")
+        self.logger.debug(f"Using work dir: {work_dir}")
         work_path = Path(work_dir)
         work_path.mkdir(exist_ok=True, parents=True)
-        self.output_file = work_path / f"encoder_output_{secrets.token_hex(6)}.log"
-        self.error_output_file = work_path / f"encoder_error_output_{secrets.token_hex(6)}.log"
-        logger.debug(f"command output file set to: {self.output_file}")
-        logger.debug(f"command error output file set to: {self.error_output_file}")
-        self.output_file.touch(exist_ok=True)
-        self.error_output_file.touch(exist_ok=True)
         self.error_message = errors
         self.success_message = successes
-        logger.info(f"Running command: {command}")
-        stdout_handle = None
-        stderr_handle = None
+        self.logger.info(f"Running command: {command}")
         try:
-            stdout_handle = open(self.output_file, "w")
-            stderr_handle = open(self.error_output_file, "w")
             if isinstance(command, list):
                 popen_cmd = command
             elif not shell:
@@ -89,36 +167,47 @@ class BackgroundRunner:
                 popen_cmd,
                 shell=shell,
                 cwd=work_dir,
-                stdout=stdout_handle,
-                stderr=stderr_handle,
+                stdout=PIPE,
+                stderr=PIPE,
                 stdin=PIPE,  # FFmpeg can try to read stdin and wrecks havoc on linux
-                encoding="utf-8",
             )
         except PermissionError:
-            logger.error(
+            self.logger.error(
                 "Could not encode video due to permissions error."
                 "Please make sure encoder is executable and you have permissions to run it."
                 "Otherwise try running FastFlix as an administrator."
             )
-            if stdout_handle:
-                stdout_handle.close()
-            if stderr_handle:
-                stderr_handle.close()
             self.error_detected = True
             return
         except Exception:
-            logger.exception("Could not start worker process")
-            if stdout_handle:
-                stdout_handle.close()
-            if stderr_handle:
-                stderr_handle.close()
+            self.logger.exception("Could not start worker process")
             self.error_detected = True
             return
 
         self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        if cpu_affinity:
+            self.set_affinity(cpu_affinity)
 
-        thread = Thread(target=self.read_output, daemon=True)
-        thread.start()
+        self.batcher = LogBatcher(self._safe_log_put, prefix=self.log_prefix)
+        self.batcher.start()
+        self.readers_finished = 0
+        self.readers = [
+            Thread(target=self.read_output, args=(self.process.stdout, self.handle_output_line), daemon=True),
+            Thread(target=self.read_output, args=(self.process.stderr, self.handle_error_line), daemon=True),
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def set_affinity(self, cores: List[int]):
+        """Pin the command (and anything a shell already started for it) to a set of logical CPUs"""
+        try:
+            for process in [self.process, *self.process.children(recursive=True)]:
+                process.cpu_affinity(cores)
+        except (AttributeError, PsutilError, OSError):
+            # Not supported on macOS, or the process already exited
+            self.logger.debug(f"Could not set CPU affinity to {cores}")
+        else:
+            self.logger.info(f"Set command CPU affinity to {cores}")
 
     def change_priority(
         self, new_priority: Literal["Realtime", "High", "Above Normal", "Normal", "Below Normal", "Idle"]
@@ -126,9 +215,9 @@ class BackgroundRunner:
         try:
             if self.process:
                 self.process.nice(priority_levels[new_priority])
-                logger.info(f"Set command priority to {new_priority}")
+                self.logger.info(f"Set command priority to {new_priority}")
         except Exception:
-            logger.exception(f"Could not set process priority to {new_priority}")
+            self.logger.exception(f"Could not set process priority to {new_priority}")
 
     def _safe_log_put(self, msg):
         """Put message to log queue with timeout to prevent blocking if GUI is dead."""
@@ -137,77 +226,92 @@ class BackgroundRunner:
         except Full:
             pass  # GUI likely dead, ignore
 
-    def read_output(self):
-        with (
-            open(self.output_file, "r", encoding="utf-8", errors="ignore") as out_file,
-            open(self.error_output_file, "r", encoding="utf-8", errors="ignore") as err_file,
+    def handle_output_line(self, line):
+        self.lines_read += 1
+        self.logger.info(line)
+        self.batcher.add(line)
+        if not self.success_detected:
+            for success in self.success_message:
+                if success in line:
+                    self.success_detected = True
+
+    def handle_error_line(self, err_line):
+        self.lines_read += 1
+        if self.progress.is_progress_line(err_line):
+            if event := self.progress.feed(err_line):
+                self.logger.info(event.summary())
+                self.batcher.add(event)
+            return
+        self.logger.info(err_line)
+        self.batcher.add(err_line)
+        if (
+            "Conversion failed!" in err_line
+            or "Error during output" in err_line
+            or "Error parsing global options" in err_line
+            or "Device creation failed" in err_line
         ):
-            while True:
-                time.sleep(0.01)
-                if not self.is_alive():
-                    excess = out_file.read()
-                    logger.info(excess)
-                    self._safe_log_put(excess)
-
-                    err_excess = err_file.read()
-                    logger.info(err_excess)
-                    self._safe_log_put(err_excess)
-                    if self.process.returncode is not None and self.process.returncode > 0:
-                        self.error_detected = True
-                    break
-                line = out_file.readline().rstrip()
-                if line:
-                    logger.info(line)
-                    self._safe_log_put(line)
-                    if not self.success_detected:
-                        for success in self.success_message:
-                            if success in line:
-                                self.success_detected = True
-
-                err_line = err_file.readline().rstrip()
-                if err_line:
-                    logger.info(err_line)
-                    self._safe_log_put(err_line)
-                    if (
-                        "Conversion failed!" in err_line
-                        or "Error during output" in err_line
-                        or "Error parsing global options" in err_line
-                        or "Device creation failed" in err_line
-                    ):
-                        self.error_detected = True
-                    if not self.error_detected:
-                        for error in self.error_message:
-                            if error in err_line:
-                                self.error_detected = True
+            self.error_detected = True
+        if not self.error_detected:
+            for error in self.error_message:
+                if error in err_line:
+                    self.error_detected = True
 
+    def read_output(self, stream, handler):
+        """
+        Block on the pipe instead of polling, handing every line to the handler as soon as it arrives.
+        Encoders redraw their status with carriage returns, so those end a line as well.
+        """
+        pending = b""
         try:
-            self.output_file.unlink()
-            self.error_output_file.unlink()
-        except OSError:
-            pass
+            while chunk := stream.read1(self.read_size):
+                lines = line_breaks.split(pending + chunk)
+                pending = lines.pop()
+                for line in lines:
+                    self._handle_raw_line(line, handler)
+            self._handle_raw_line(pending, handler)
+        except (OSError, ValueError):
+            self.logger.exception("Could not read encoder output")
+        finally:
+            stream.close()
+            with self.readers_lock:
+                self.readers_finished += 1
+                last_reader = self.readers_finished == len(self.readers)
+            if last_reader:
+                # Last reader out sends whatever is still waiting in the batch
+                self.batcher.stop()
 
-    def read(self, limit=None):
-        if not self.is_alive():
-            return
-        return self.process.stdout.read(limit)
+    @staticmethod
+    def _handle_raw_line(line: bytes, handler):
+        line = line.decode("utf-8", errors="ignore").rstrip()
+        if line:
+            handler(line)
 
     def is_alive(self):
         if not self.process:
             return False
-        return True if self.process.poll() is None else False
+        if self.process.poll() is None:
+            return True
+        # Let the readers drain what is left in the pipes so error detection sees the final lines
+        for reader in self.readers:
+            reader.join(timeout=1)
+        if self.process.returncode is not None and self.process.returncode > 0:
+            self.error_detected = True
+        return False
 
     def clean(self):
         self.kill(log=False)
         self.process = None
+        self.readers = []
         self.error_detected = False
         self.success_detected = False
         self.killed = False
         self.started_at = None
+        self.lines_read = 0
 
     def kill(self, log=True):
         if self.process and self.process.poll() is None:
             if log:
-                logger.warning(f"Stopping encoder worker process {self.process.pid}")
+                self.logger.warning(f"Stopping encoder worker process {self.process.pid}")
             try:
                 # if reusables.win_based:
                 #     os.kill(self.process.pid, signal.CTRL_C_EVENT)
@@ -217,7 +321,7 @@ class BackgroundRunner:
                 self.process.kill()
             except Exception as err:
                 if log:
-                    logger.exception(f"Couldn't terminate process: {err}")
+                    self.logger.exception(f"Couldn't terminate process: {err}")
         self.killed = True
 
     def pause(self):
@@ -229,3 +333,77 @@ class BackgroundRunner:
         if not self.process:
             return False
         self.process.resume()
+
+
+class StallWatchdog:
+    """
+    Notices a command that is still running but no longer getting anywhere, like ffmpeg stuck on a network read
+    or a hardware encoder hung on a broken device. Once a command has reported ffmpeg progress only advancing
+    frames count as activity, before that (and for tools that never report it) any output or a few seconds of
+    new CPU time will do. Checked at most every check_interval seconds, paused commands are never stalled.
+    """
+
+    check_interval = 5.0
+
+    def __init__(self, runner: BackgroundRunner, timeout: float, cpu_threshold: float = 2.0):
+        self.runner = runner
+        self.timeout = timeout
+        self.cpu_threshold = cpu_threshold
+        self.paused = False
+        self.reports_progress = False
+        self.last_progress = None
+        self.lines_read = 0
+        self.cpu_time = 0.0
+        self.last_check = 0.0
+        self.last_activity = time.monotonic()
+
+    def reset(self):
+        self.last_activity = time.monotonic()
+
+    def process_cpu_time(self) -> float:
+        process = self.runner.process
+        if not process:
+            return 0.0
+        total = 0.0
+        try:
+            for proc in [process, *process.children(recursive=True)]:
+                times = proc.cpu_times()
+                total += times.user + times.system
+        except PsutilError:
+            pass
+        return total
+
+    def active(self) -> bool:
+        event = self.runner.progress.latest
+        if event:
+            self.reports_progress = True
+            progress = (event.frame, event.out_time_us)
+            if progress != self.last_progress:
+                self.last_progress = progress
+                return True
+        if self.reports_progress:
+            return False
+
+        active = False
+        if self.runner.lines_read != self.lines_read:
+            self.lines_read = self.runner.lines_read
+            active = True
+        cpu_time = self.process_cpu_time()
+        # Children that exited take their CPU time with them, so the total can go down
+        if cpu_time >= self.cpu_time + self.cpu_threshold or cpu_time < self.cpu_time:
+            active = active or cpu_time > self.cpu_time
+            self.cpu_time = cpu_time
+        return active
+
+    def stalled(self) -> bool:
+        """If the command has not made any progress within the timeout"""
+        if not self.timeout or self.paused:
+            return False
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        if self.active():
+            self.last_activity = now
+            return False
+        return now - self.last_activity > self.timeout
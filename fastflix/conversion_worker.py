@@ -1,16 +1,21 @@
 # -*- coding: utf-8 -*-
 import logging
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from dataclasses import dataclass
 from pathlib import Path
-from queue import Empty, Full
-from typing import Literal
+from queue import Empty, Full, SimpleQueue
+from typing import Literal, Optional
 from datetime import datetime
 
 import reusables
 from platformdirs import user_data_dir
 from pathvalidate import sanitize_filename
 
-from fastflix.command_runner import BackgroundRunner
+from fastflix.command_runner import BackgroundRunner, StallWatchdog
 from fastflix.language import t
+from fastflix.scheduler import slot_cpu_sets
+from fastflix.telemetry import JobRecorder, TelemetryStore, telemetry_path
 
 
 def file_date():
@@ -22,73 +27,217 @@ logger = logging.getLogger("fastflix-core")
 log_path = Path(user_data_dir("FastFlix", appauthor=False, roaming=True)) / "logs"
 
 
+@dataclass
+class EncodeSlot:
+    """A single running command, keyed in the worker by (video_uuid, command_uuid)"""
+
+    index: int
+    video_uuid: str
+    command_uuid: str
+    runner: BackgroundRunner
+    log_listener: Optional[QueueListener] = None
+    recorder: Optional[JobRecorder] = None
+    watchdog: Optional[StallWatchdog] = None
+    request: tuple = ()
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.video_uuid, self.command_uuid
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self.runner.logger
+
+
+def stop_file_logging(slot: EncodeSlot):
+    for handler in list(slot.logger.handlers):
+        if isinstance(handler, QueueHandler):
+            slot.logger.removeHandler(handler)
+    if slot.log_listener:
+        slot.log_listener.stop()
+        for handler in slot.log_listener.handlers:
+            handler.close()
+        slot.log_listener = None
+
+
+def slot_process_failed(runner: BackgroundRunner) -> bool:
+    # Check error_detected (set by read_output thread) AND check the
+    # process return code directly.  The read_output daemon thread may
+    # not have run yet when FFmpeg exits very quickly (e.g. VAAPI init
+    # failure on Windows), so we must not rely solely on error_detected.
+    process_failed = (
+        runner.process is not None and runner.process.returncode is not None and runner.process.returncode > 0
+    )
+    return runner.error_detected or process_failed
+
+
 @reusables.log_exception(log="fastflix-core")
-def queue_worker(gui_proc, worker_queue, status_queue, log_queue):
-    runner = BackgroundRunner(log_queue=log_queue)
+def queue_worker(
+    gui_proc,
+    worker_queue,
+    status_queue,
+    log_queue,
+    max_slots: int = 1,
+    stall_timeout: float = 0,
+    stall_retries: int = 0,
+):
+    """
+    Run encode commands sent from the GUI, up to `max_slots` of them at the same time.
+
+    Every running command owns a slot, identified by its (video_uuid, command_uuid) pair, and every status
+    message sent back over the status queue carries that pair so the GUI knows which slot it is about.
+    Execute requests that arrive while every slot is busy wait in line until one frees up.
+    With more than one slot, each slot index is pinned to its own share of the CPU cores and every output line
+    sent to the GUI starts with its slot number, the log window is only cleared when no other slot is running.
+    Every command that ends, however it ends, is recorded in the telemetry store.
+
+    A command that makes no progress for `stall_timeout` seconds is killed, then started again up to
+    `stall_retries` times before it is reported as an error. Both can be changed with a "watchdog" request.
+    """
+    slots: dict[tuple[str, str], EncodeSlot] = {}
+    cpu_sets = slot_cpu_sets(max_slots)
+    waiting: deque = deque()
+    stall_restarts: dict[tuple[str, str], int] = {}
     gui_died = False
-    currently_encoding = False
-    video_uuid = None
-    command_uuid = None
-    command = None
-    work_dir = None
-    log_name = ""
-    shell = False
     priority: Literal["Realtime", "High", "Above Normal", "Normal", "Below Normal", "Idle"] = "Normal"
+    try:
+        telemetry = TelemetryStore(telemetry_path)
+    except Exception:
+        logger.exception("Could not open the encode telemetry store, encodes will not be recorded")
+        telemetry = None
+
+    def free_index() -> int:
+        used = {slot.index for slot in slots.values()}
+        index = 0
+        while index in used:
+            index += 1
+        return index
 
-    def start_command():
-        nonlocal currently_encoding
-        log_queue.put(f"CLEAR_WINDOW:{video_uuid}:{command_uuid}")
-        reusables.remove_file_handlers(logger)
+    def safe_log_put(msg):
+        try:
+            log_queue.put(msg, timeout=1.0)
+        except Full:
+            pass  # GUI likely dead, ignore
+
+    def start_command(request: tuple):
+        video_uuid, command_uuid, command, work_dir, log_name, shell, *details = request
+        index = free_index()
+        runner = BackgroundRunner(
+            log_queue=log_queue,
+            logger_name=f"fastflix-core.slot{index}",
+            video_uuid=video_uuid,
+            command_uuid=command_uuid,
+            log_prefix=f"[{index + 1}] " if max_slots > 1 else "",
+        )
+        slot = EncodeSlot(
+            index=index,
+            video_uuid=video_uuid,
+            command_uuid=command_uuid,
+            runner=runner,
+            recorder=JobRecorder(
+                video_uuid, command_uuid, name=log_name, details=details[0] if details else None, command=command
+            ),
+            watchdog=StallWatchdog(runner, stall_timeout),
+            request=request,
+        )
+        if not slots:
+            # Only a fresh window, the output of slots that are still running stays (each line says its slot)
+            safe_log_put(f"CLEAR_WINDOW:{video_uuid}:{command_uuid}")
+        stop_file_logging(slot)
         new_file_handler = reusables.get_file_handler(
             log_path / sanitize_filename(f"flix_conversion_{log_name[:64]}_{file_date()}.log"),
             level=logging.DEBUG,
             log_format="%(asctime)s - %(message)s",
             encoding="utf-8",
         )
-        logger.addHandler(new_file_handler)
-        currently_encoding = True
+        # The output readers only queue the records, the listener thread does the disk writes
+        records = SimpleQueue()
+        slot.logger.addHandler(QueueHandler(records))
+        slot.log_listener = QueueListener(records, new_file_handler, respect_handler_level=True)
+        slot.log_listener.start()
+        slots[slot.key] = slot
+        logger.debug(f"Starting command {command_uuid} of video {video_uuid} in slot {index}")
         runner.start_exec(
             command,
             work_dir=work_dir,
             shell=shell,
+            cpu_affinity=cpu_sets[index] if index < len(cpu_sets) else None,
         )
         runner.change_priority(priority)
 
+    def start_waiting():
+        while waiting and len(slots) < max_slots:
+            start_command(waiting.popleft())
+
+    def record(slot: EncodeSlot, status: str):
+        nonlocal telemetry
+        if not telemetry or not slot.recorder:
+            return
+        try:
+            telemetry.record(slot.recorder, status)
+        except Exception:
+            logger.exception("Could not record encode telemetry, disabling it")
+            telemetry.close()
+            telemetry = None
+
+    def finish_slot(slot: EncodeSlot, status: str):
+        stop_file_logging(slot)
+        record(slot, status)
+        del slots[slot.key]
+        if not slots:
+            safe_log_put("STOP_TIMER")
+
+    def stop_stalled(slot: EncodeSlot):
+        slot.runner.kill(log=False)
+        finish_slot(slot, "stalled")
+        restarts = stall_restarts.get(slot.key, 0)
+        message = f"{t('No progress for')} {int(stall_timeout)}s, {t('stopping stalled command')} {slot.command_uuid}"
+        logger.warning(message)
+        safe_log_put([message])
+        if restarts < stall_retries:
+            stall_restarts[slot.key] = restarts + 1
+            logger.info(f"{t('Restarting command')} {slot.command_uuid} ({restarts + 1}/{stall_retries})")
+            waiting.appendleft(slot.request)
+        else:
+            stall_restarts.pop(slot.key, None)
+            status_queue.put(("error", slot.video_uuid, slot.command_uuid))
+
+    def shut_down():
+        if telemetry:
+            telemetry.close()
+
     while True:
-        if currently_encoding and not runner.is_alive():
-            reusables.remove_file_handlers(logger)
-            try:
-                log_queue.put("STOP_TIMER", timeout=1.0)
-            except Full:
-                pass  # GUI likely dead, ignore
-            currently_encoding = False
-
-            # Check error_detected (set by read_output thread) AND check the
-            # process return code directly.  The read_output daemon thread may
-            # not have run yet when FFmpeg exits very quickly (e.g. VAAPI init
-            # failure on Windows), so we must not rely solely on error_detected.
-            process_failed = (
-                runner.process is not None and runner.process.returncode is not None and runner.process.returncode > 0
-            )
-            if runner.error_detected or process_failed:
-                logger.info(t("Error detected while converting"))
+        for slot in slots.values():
+            slot.recorder.sample(slot.runner.process, slot.runner.progress.latest)
 
-                status_queue.put(("error", video_uuid, command_uuid))
-                if gui_died:
-                    return
-                continue
+        for slot in [x for x in slots.values() if x.watchdog.stalled() and x.runner.is_alive()]:
+            stop_stalled(slot)
+
+        for slot in [x for x in slots.values() if not x.runner.is_alive()]:
+            stall_restarts.pop(slot.key, None)
+            status = "error" if slot_process_failed(slot.runner) else "complete"
+            slot.recorder.event = slot.runner.progress.latest or slot.recorder.event
+            finish_slot(slot, status)
+            if status == "error":
+                logger.info(t("Error detected while converting"))
+            status_queue.put((status, slot.video_uuid, slot.command_uuid))
 
-            status_queue.put(("complete", video_uuid, command_uuid))
-            if gui_died:
+        if gui_died:
+            waiting.clear()
+            if not slots:
+                shut_down()
                 return
+        else:
+            start_waiting()
 
         if not gui_died and not gui_proc.is_alive():
             gui_proc.join()
             gui_died = True
-            if runner.is_alive() or currently_encoding:
+            if slots:
                 logger.info(t("The GUI might have died, but I'm going to keep converting!"))
             else:
                 logger.debug(t("Conversion worker shutting down"))
+                shut_down()
                 return
         try:
             request = worker_queue.get(block=True, timeout=0.05)
@@ -96,46 +245,76 @@ def queue_worker(gui_proc, worker_queue, status_queue, log_queue):
             continue
         except KeyboardInterrupt:
             status_queue.put(("exit",))
+            shut_down()
             return
         else:
             if request[0] == "execute":
-                _, video_uuid, command_uuid, command, work_dir, log_name, shell = request
-                start_command()
+                # Optional eighth item is the job_details dict used for telemetry
+                waiting.append(tuple(request[1:8]))
+                start_waiting()
+
+            if request[0] == "concurrency":
+                max_slots = max(1, int(request[1]))
+                cpu_sets = slot_cpu_sets(max_slots)
+                logger.debug(f"Conversion worker now allows {max_slots} concurrent encode(s)")
+                start_waiting()
+
+            if request[0] == "watchdog":
+                stall_timeout = float(request[1])
+                stall_retries = int(request[2]) if len(request) > 2 else stall_retries
+                for slot in slots.values():
+                    slot.watchdog.timeout = stall_timeout
+                logger.debug(f"Conversion worker stall timeout now {stall_timeout}s with {stall_retries} retries")
 
             if request[0] == "cancel":
+                # Optional second argument limits the cancel to a single video
+                video_filter = request[1] if len(request) > 1 else None
                 logger.debug(t("Cancel has been requested, killing encoding"))
-                runner.kill()
-                currently_encoding = False
-                status_queue.put(("cancelled", video_uuid, command_uuid))
-                try:
-                    log_queue.put("STOP_TIMER", timeout=1.0)
-                except Full:
-                    pass  # GUI likely dead, ignore
+                for slot in list(slots.values()):
+                    if video_filter and slot.video_uuid != video_filter:
+                        continue
+                    slot.runner.kill()
+                    stall_restarts.pop(slot.key, None)
+                    finish_slot(slot, "cancelled")
+                    status_queue.put(("cancelled", slot.video_uuid, slot.command_uuid))
+                for item in list(waiting):
+                    if not video_filter or item[0] == video_filter:
+                        waiting.remove(item)
+                        status_queue.put(("cancelled", item[0], item[1]))
 
             if request[0] == "pause encode":
                 logger.debug(t("Command worker received request to pause current encode"))
-                try:
-                    runner.pause()
-                except Exception:
-                    logger.exception("Could not pause command")
+                for slot in slots.values():
+                    slot.watchdog.paused = True
+                    try:
+                        slot.runner.pause()
+                    except Exception:
+                        logger.exception("Could not pause command")
 
             if request[0] == "resume encode":
                 logger.debug(t("Command worker received request to resume paused encode"))
-                try:
-                    runner.resume()
-                except Exception:
-                    logger.exception("Could not resume command")
+                for slot in slots.values():
+                    slot.watchdog.paused = False
+                    slot.watchdog.reset()
+                    try:
+                        slot.runner.resume()
+                    except Exception:
+                        logger.exception("Could not resume command")
 
             if request[0] == "priority":
                 priority = request[1]
-                if runner.is_alive():
-                    runner.change_priority(priority)
+                for slot in slots.values():
+                    if slot.runner.is_alive():
+                        slot.runner.change_priority(priority)
 
             if request[0] == "shutdown":
                 logger.debug(t("Shutdown signal received from GUI"))
-                if runner.is_alive():
+                waiting.clear()
+                if slots:
                     logger.info(t("Waiting for current encode to finish before shutdown"))
-                    # Don't kill current encode, let it finish
+                    # Don't kill current encodes, let them finish
+                    gui_died = True
                     continue
                 logger.debug(t("Worker shutting down gracefully"))
+                shut_down()
                 return
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+import logging
+from functools import lru_cache
+from pathlib import Path
+from subprocess import PIPE, run, TimeoutExpired
+from typing import Callable, List, Optional, Tuple
+
+from fastflix.encoders.common.attachments import build_attachments
+from fastflix.encoders.common.audio import build_audio
+from fastflix.encoders.common.helpers import (
+    Command,
+    external_subtitle_files,
+    generate_ending,
+    generate_extra_inputs,
+)
+from fastflix.encoders.common.subtitles import build_subtitle
+from fastflix.models.fastflix import FastFlix
+from fastflix.models.video import Video
+from fastflix.progress import progress_args
+
+logger = logging.getLogger("fastflix")
+
+# Encoders that don't scale well past a few cores, MUST match encoder main.name
+chunked_encoders = ("HEVC (x265)", "AV1 (SVT AV1)", "AV1 (AOM)", "AV1 (rav1e)", "VVC")
+
+# Never split closer than this many seconds to a neighbouring split point
+minimum_chunk_seconds = 5
+
+# Length of the sample encode timed for a video the encode history has nothing to predict from
+sample_seconds = 5
+
+
+@lru_cache(maxsize=1024)
+def keyframe_before(ffprobe: str, source: str, stream_index: int, timestamp: float) -> Optional[float]:
+    """
+    Find the keyframe at or just before the timestamp (in the stream's own time base) by letting ffprobe
+    seek there and reading a few packets, instead of scanning the whole file.
+    """
+    try:
+        result = run(
+            [
+                ffprobe,
+                "-v",
+                "error",
+                "-select_streams",
+                str(stream_index),
+                "-read_intervals",
+                f"{timestamp}%+#30",
+                "-show_entries",
+                "packet=pts_time,flags",
+                "-of",
+                "csv=p=0",
+                source,
+            ],
+            stdout=PIPE,
+            stderr=PIPE,
+            encoding="utf-8",
+            timeout=30,
+        )
+    except (OSError, TimeoutExpired):
+        logger.exception(f"Could not look up keyframe near {timestamp}")
+        return None
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.strip().partition(",")
+        if "K" not in flags:
+            continue
+        try:
+            return float(pts_time)
+        except ValueError:
+            continue
+    return None
+
+
+def chunking_unsupported_reason(fastflix: FastFlix, encoder_name: str) -> str:
+    """Return why the current video can't be chunk encoded, or an empty string if it can"""
+    video = fastflix.current_video
+    settings = video.video_settings
+    if encoder_name not in chunked_encoders:
+        return f"{encoder_name} does not support chunked encoding"
+    if not video.work_path:
+        return "no work directory for chunk files"
+    if video.concat:
+        return "concatenated sources are not supported"
+    if getattr(settings.video_encoder_settings, "hdr10plus_metadata", None):
+        return "HDR10+ metadata files are frame based and can not be split"
+    if any(track.burn_in and track.enabled for track in video.subtitle_tracks):
+        return "subtitle burn in is not supported"
+    if settings.chunk_length < minimum_chunk_seconds:
+        return f"chunk length must be at least {minimum_chunk_seconds} seconds"
+    return ""
+
+
+def chunk_boundaries(fastflix: FastFlix, snap_to_keyframes: bool = True) -> List[Tuple[float, float]]:
+    """
+    Split the selected time range into roughly chunk_length sized pieces, moving each split point back to the
+    closest keyframe of the source so every chunk starts on a scene cut the source encoder already picked.
+    That takes an ffprobe per split point, without snap_to_keyframes the even split points are used as they are.
+    Returns an empty list if the range is too short to be worth splitting.
+    """
+    video = fastflix.current_video
+    settings = video.video_settings
+    start = float(settings.start_time or 0)
+    end = float(settings.end_time or video.duration)
+    count = int((end - start) // settings.chunk_length)
+    if count < 2:
+        return []
+
+    # ffprobe reports pts times including the container start time, while -ss on the input does not
+    offset = float((video.format or {}).get("start_time", 0) or 0)
+    points = [start]
+    for i in range(1, count):
+        target = start + i * (end - start) / count
+        keyframe = None
+        if snap_to_keyframes:
+            keyframe = keyframe_before(
+                str(fastflix.config.ffprobe), str(video.source), settings.selected_track, round(target + offset, 3)
+            )
+        point = target if keyframe is None else round(keyframe - offset, 3)
+        if point - points[-1] >= minimum_chunk_seconds and end - point >= minimum_chunk_seconds:
+            points.append(point)
+    points.append(end)
+    if len(points) < 3:
+        return []
+    return list(zip(points, points[1:]))
+
+
+def trimmed_video(video: Video, start: float, end: Optional[float], output_path: Path) -> Video:
+    """Video only copy of a video cut down to start - end, which encodes with exactly the same settings"""
+    trimmed = video.model_copy(deep=True)
+    trimmed.audio_tracks = []
+    trimmed.subtitle_tracks = []
+    trimmed.attachment_tracks = []
+    settings = trimmed.video_settings
+    settings.start_time = start
+    settings.end_time = end
+    settings.fast_seek = True
+    settings.remove_metadata = True
+    settings.copy_chapters = False
+    settings.copy_data = False
+    settings.video_title = ""
+    settings.video_track_title = ""
+    settings.output_path = output_path
+    return trimmed
+
+
+def build_sample(build: Callable, fastflix: FastFlix, seconds: float = sample_seconds) -> Tuple[List[Command], float]:
+    """
+    Commands encoding a few seconds from the middle of the current video with its own settings, to time how fast
+    it goes. Returns the commands and the seconds of video they encode, no commands if it can't be sampled.
+    """
+    video = fastflix.current_video
+    settings = video.video_settings
+    start = float(settings.start_time or 0)
+    end = float(settings.end_time or video.duration or 0)
+    if not video.work_path or video.concat or end <= start:
+        return [], 0
+    length = min(seconds, end - start)
+    sample_start = round(start + (end - start - length) / 2, 3)
+    suffix = Path(settings.output_path).suffix if settings.output_path else ""
+    fastflix.current_video = trimmed_video(
+        video, sample_start, sample_start + length, video.work_path / f"eta_sample{suffix or '.mkv'}"
+    )
+    try:
+        commands = build(fastflix=fastflix) or []
+    except Exception:
+        logger.exception("Could not build the sample encode")
+        commands = []
+    finally:
+        fastflix.current_video = video
+    return commands, length
+
+
+def concat_list_line(path: Path) -> str:
+    escaped = str(path).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+def build_join_command(fastflix: FastFlix, concat_file: Path, chunk_files: List[Path]) -> Command:
+    """
+    Losslessly join the encoded chunks and mux the audio, subtitle and attachment tracks from the source.
+    The chunk list is only written to the work directory when the join runs.
+    """
+    video = fastflix.current_video
+    settings = video.video_settings
+
+    extra_input_files = external_subtitle_files(video.subtitle_tracks)
+
+    # Always seek on the inputs, an output -ss would also cut into the already trimmed chunks
+    command = [str(fastflix.config.ffmpeg), "-y", *progress_args]
+    if settings.start_time:
+        command.extend(["-ss", str(settings.start_time)])
+    if settings.end_time:
+        command.extend(["-to", str(settings.end_time)])
+    command.extend(["-i", str(video.source)])
+    command.extend(generate_extra_inputs(extra_input_files, start_time=settings.start_time, end_time=settings.end_time))
+    command.extend(["-f", "concat", "-safe", "0", "-i", str(concat_file)])
+
+    if settings.video_title:
+        command.extend(["-metadata", f"title={settings.video_title}"])
+    command.extend(["-map", f"{len(extra_input_files) + 1}:v", "-c:v", "copy"])
+    if settings.video_track_title:
+        command.extend(["-metadata:s:v:0", f"title={settings.video_track_title}"])
+
+    subtitles, _, _ = build_subtitle(video.subtitle_tracks, output_path=settings.output_path)
+    ending, _ = generate_ending(
+        audio=build_audio(video.audio_tracks),
+        subtitles=subtitles,
+        cover=build_attachments(video.attachment_tracks),
+        output_video=settings.output_path,
+        **{**settings.model_dump(), "output_fps": None},
+    )
+    return Command(
+        command=command + ending,
+        name="Join chunks",
+        exe="ffmpeg",
+        files={str(concat_file): "".join(concat_list_line(path) for path in chunk_files)},
+    )
+
+
+def build_chunked(
+    build: Callable, fastflix: FastFlix, encoder_name: str, snap_to_keyframes: bool = False
+) -> List[Command]:
+    """
+    Wrap an encoder's build function to produce chunked commands. Each chunk is built by the encoder itself
+    on a trimmed, video only copy of the current video, so it gets exactly the same settings as a normal encode.
+    The n-th command of every chunk shares a parallel group (so all first passes run before any second pass),
+    followed by a single join command. Falls back to the normal build if the video can't be chunked.
+    Split points are only moved to keyframes with snap_to_keyframes, done once as the video goes in the queue
+    rather than on every settings change.
+    """
+    video = fastflix.current_video
+    if reason := chunking_unsupported_reason(fastflix, encoder_name):
+        logger.info(f"Not using chunked encoding: {reason}")
+        return build(fastflix=fastflix)
+
+    boundaries = chunk_boundaries(fastflix, snap_to_keyframes=snap_to_keyframes)
+    if not boundaries:
+        logger.info("Not using chunked encoding: video is shorter than two chunks")
+        return build(fastflix=fastflix)
+
+    chunk_files = []
+    chunk_commands = []
+    try:
+        for number, (chunk_start, chunk_end) in enumerate(boundaries):
+            # Leave the last chunk open ended so no trailing frames are lost to rounding
+            chunk_video = trimmed_video(
+                video,
+                chunk_start,
+                chunk_end if number < len(boundaries) - 1 else video.video_settings.end_time,
+                video.work_path / f"chunk_{number:04d}.mkv",
+            )
+
+            fastflix.current_video = chunk_video
+            commands = build(fastflix=fastflix)
+            if not commands:
+                return []
+            for command in commands:
+                command.duration = chunk_end - chunk_start
+            chunk_files.append(chunk_video.video_settings.output_path)
+            chunk_commands.append(commands)
+    finally:
+        fastflix.current_video = video
+
+    if len({len(commands) for commands in chunk_commands}) != 1:
+        logger.warning("Not using chunked encoding: chunks did not build the same number of commands")
+        return build(fastflix=fastflix)
+
+    results = []
+    for step in range(len(chunk_commands[0])):
+        for number, commands in enumerate(chunk_commands, start=1):
+            command = commands[step]
+            command.parallel_group = f"chunks_{step}"
+            command.name = f"{command.name.strip()} - chunk {number}/{len(chunk_commands)}"
+            results.append(command)
+    results.append(build_join_command(fastflix, video.work_path / "chunks.txt", chunk_files))
+    return results
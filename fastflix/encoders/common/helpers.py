@@ -13,6 +13,8 @@ from fastflix.encoders.common.attachments import build_attachments
 from fastflix.encoders.common.audio import build_audio
 from fastflix.encoders.common.subtitles import build_subtitle
 from fastflix.models.fastflix import FastFlix
+from fastflix.progress import progress_args
+from fastflix.scheduler import job_thread_budget
 from fastflix.shared import sanitize, quoted_path
 
 null = "/dev/null"
@@ -29,6 +31,12 @@ class Command(BaseModel):
     exe: str = None
     shell: bool = False
     uuid: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    # Consecutive commands sharing a group are sent to the worker together and may run at the same time
+    parallel_group: Optional[str] = None
+    # Seconds of video the command encodes, when it is only part of the selected range (a chunk)
+    duration: Optional[float] = None
+    # Files the command reads that are written just before it runs, path to text (the chunk list of a join)
+    files: Optional[dict] = None
 
     def to_list(self) -> List[str]:
         """Convert command to a list suitable for Popen."""
@@ -71,6 +79,8 @@ def generate_ffmpeg_start(
     remove_hdr: bool = True,
     start_extra: Union[List[str], str] = "",
     extra_inputs: Optional[List[str]] = None,
+    threads: int = 0,
+    thread_budget: int = 0,
     **_,
 ) -> List[str]:
     command = [str(ffmpeg)]
@@ -82,6 +92,10 @@ def generate_ffmpeg_start(
         command.extend(["-init_hw_device", "opencl:0.0=ocl", "-filter_hw_device", "ocl"])
 
     command.append("-y")
+    command.extend(progress_args)
+
+    if thread_budget:
+        command.extend(["-filter_threads", str(thread_budget)])
 
     # Time settings for fast seek (before -i)
     if fast_seek:
@@ -131,6 +145,9 @@ def generate_ffmpeg_start(
         command.extend(filters)
 
     command.extend(["-c:v", encoder])
+    # Encoders with their own thread setting add it themselves
+    if thread_budget and not threads:
+        command.extend(["-threads", str(thread_budget)])
     command.extend(["-pix_fmt", pix_fmt])
 
     if maxrate:
@@ -324,6 +341,31 @@ def generate_filters(
     return ["-filter_complex", filter_complex, "-map", "[v]"]
 
 
+def external_subtitle_files(subtitle_tracks) -> List[str]:
+    """Assign file_index to external subtitle tracks and return the unique external file paths in input order"""
+    extra_input_files = []
+    for track in subtitle_tracks:
+        if track.external and track.file_path:
+            if track.file_path not in extra_input_files:
+                extra_input_files.append(track.file_path)
+            track.file_index = extra_input_files.index(track.file_path) + 1
+        else:
+            track.file_index = 0
+    return extra_input_files
+
+
+def generate_extra_inputs(input_files, start_time=0, end_time=None) -> List[str]:
+    """Build the extra -i arguments for additional input files, each seeked to the same range if given"""
+    extra_inputs = []
+    for file_path in input_files:
+        if start_time:
+            extra_inputs.extend(["-ss", str(start_time)])
+        if end_time:
+            extra_inputs.extend(["-to", str(end_time)])
+        extra_inputs.extend(["-i", str(file_path)])
+    return extra_inputs
+
+
 def generate_all(
     fastflix: FastFlix,
     encoder: str,
@@ -338,16 +380,8 @@ def generate_all(
 
     audio_cmd = build_audio(fastflix.current_video.audio_tracks) if audio else []
 
-    # Assign file_index to external subtitle tracks and collect unique external file paths
     subtitle_tracks = fastflix.current_video.subtitle_tracks
-    extra_input_files = []
-    for track in subtitle_tracks:
-        if track.external and track.file_path:
-            if track.file_path not in extra_input_files:
-                extra_input_files.append(track.file_path)
-            track.file_index = extra_input_files.index(track.file_path) + 1
-        else:
-            track.file_index = 0
+    extra_input_files = external_subtitle_files(subtitle_tracks)
 
     subtitles_cmd, burn_in_track, burn_in_type = [], None, None
     if subs:
@@ -405,18 +439,13 @@ def generate_all(
         **fastflix.current_video.video_settings.model_dump(),
     )
 
-    # Build extra -i arguments for external subtitle files
     # When fast seek is used, -ss/-to before -i only apply to the next input.
     # External inputs need their own -ss/-to to stay in sync with the seeked video.
     vs = fastflix.current_video.video_settings
-    extra_inputs = []
-    for file_path in extra_input_files:
-        if vs.fast_seek:
-            if vs.start_time:
-                extra_inputs.extend(["-ss", str(vs.start_time)])
-            if vs.end_time:
-                extra_inputs.extend(["-to", str(vs.end_time)])
-        extra_inputs.extend(["-i", str(file_path)])
+    if vs.fast_seek:
+        extra_inputs = generate_extra_inputs(extra_input_files, start_time=vs.start_time, end_time=vs.end_time)
+    else:
+        extra_inputs = generate_extra_inputs(extra_input_files)
 
     beginning = generate_ffmpeg_start(
         source=fastflix.current_video.source,
@@ -428,6 +457,7 @@ def generate_all(
         ffmpeg_version=fastflix.ffmpeg_version,
         start_extra=start_extra,
         extra_inputs=extra_inputs if extra_inputs else None,
+        thread_budget=job_thread_budget(fastflix.config),
         **fastflix.current_video.video_settings.model_dump(),
         **settings.model_dump(),
     )
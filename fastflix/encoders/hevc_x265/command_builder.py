@@ -5,6 +5,7 @@ import shlex
 from fastflix.encoders.common.helpers import Command, generate_all, null
 from fastflix.models.encode import x265Settings
 from fastflix.models.fastflix import FastFlix
+from fastflix.scheduler import job_thread_budget
 
 x265_valid_color_primaries = [
     "bt709",
@@ -77,6 +78,14 @@ color_matrix_mapping = {"bt2020_ncl": "bt2020nc", "bt2020_cl": "bt2020c"}
 chromaloc_mapping = {"left": 0, "center": 1, "topleft": 2, "top": 3, "bottomleft": 4, "bottom": 5}
 
 
+def budget_frame_threads(threads: int) -> int:
+    """Same steps x265 uses to pick frame threads from the core count, applied to the job's thread budget"""
+    for cores, frame_threads in ((32, 6), (16, 5), (8, 3), (4, 2)):
+        if threads >= cores:
+            return frame_threads
+    return 1
+
+
 def build(fastflix: FastFlix):
     settings: x265Settings = fastflix.current_video.video_settings.video_encoder_settings
 
@@ -95,7 +104,12 @@ def build(fastflix: FastFlix):
     x265_params.append(f"{'' if settings.intra_smoothing else 'no-'}strong-intra-smoothing=1")
     x265_params.append(f"bframes={settings.bframes}")
     x265_params.append(f"b-adapt={settings.b_adapt}")
-    x265_params.append(f"frame-threads={settings.frame_threads}")
+    frame_threads = settings.frame_threads
+    if thread_budget := job_thread_budget(fastflix.config):
+        frame_threads = frame_threads or budget_frame_threads(thread_budget)
+        if not any(param.startswith("pools=") for param in x265_params):
+            x265_params.append(f"pools={thread_budget}")
+    x265_params.append(f"frame-threads={frame_threads}")
 
     if not fastflix.current_video.video_settings.remove_hdr:
         if fastflix.current_video.video_settings.color_primaries:
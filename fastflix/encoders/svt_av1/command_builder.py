@@ -10,6 +10,7 @@ import reusables
 from fastflix.encoders.common.helpers import Command, generate_all, generate_color_details, null
 from fastflix.models.encode import SVTAV1Settings
 from fastflix.models.fastflix import FastFlix
+from fastflix.scheduler import job_thread_budget
 
 logger = logging.getLogger("fastflix")
 
@@ -42,6 +43,10 @@ def build(fastflix: FastFlix):
             f"scd={1 if settings.scene_detection else 0}",
         ]
     )
+    if (thread_budget := job_thread_budget(fastflix.config)) and not any(
+        param.startswith("lp=") for param in svtav1_params
+    ):
+        svtav1_params.append(f"lp={thread_budget}")
 
     if not fastflix.current_video.video_settings.remove_hdr:
         if (
@@ -51,6 +51,19 @@ def separate_app_process(worker_queue, status_queue, log_queue, portable_mode=Fa
 def startup_options():
     options = sys.argv[1:]
 
+    if options and options[0] == "run-queue":
+        from fastflix.cli import run_queue_cli
+
+        return run_queue_cli(options[1:])
+    if options and options[0] in ("farm-server", "farm-worker"):
+        from fastflix.farm import run_farm_server_cli, run_farm_worker_cli
+
+        return (run_farm_server_cli if options[0] == "farm-server" else run_farm_worker_cli)(options[1:])
+    if options and options[0] == "telemetry":
+        from fastflix.telemetry import run_telemetry_cli
+
+        return run_telemetry_cli(options[1:])
+
     if "--test" in options:
         try:
             pass
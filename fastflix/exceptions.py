@@ -17,5 +17,13 @@ class FastFlixError(FlixError):
     """Generic FastFlixError"""
 
 
+class QueueInUse(FastFlixError):
+    """Another FastFlix process is already running this queue file"""
+
+    def __init__(self, message: str, owner: str = ""):
+        super().__init__(message)
+        self.owner = owner
+
+
 class FastFlixInternalException(FastFlixError):
     """This should always be caught and never seen by user"""
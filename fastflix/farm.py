@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""
+Encode farm, lets other machines that see the same files (a shared NAS) take videos from a FastFlix queue.
+
+The queue side runs a FarmServer, every encoding box runs a FarmWorker connected to it over TCP. Messages are
+single line JSON objects, each request from the worker gets exactly one reply:
+
+    hello     {worker, token}                 -> ok | denied
+    lease     {}                              -> job {lease, video, work_dir, commands, lease_timeout}
+                                                 (each command {uuid, name, command, shell, files})
+                                                 | wait | finished
+    heartbeat {lease}                         -> ok | cancel (lease expired or was taken back)
+    progress  {lease, command, <ProgressEvent fields>} -> ok | cancel
+    status    {lease, command, status}        -> ok | cancel
+    done      {lease, success}                -> ok
+
+A worker leases one video at a time and has to keep sending heartbeats or progress. When it stops (crashed,
+lost network, hung) the lease times out and the video goes back in line for the next worker.
+Finished chunks are only skipped when the video goes back to the worker that made them, as they sit in its
+work_dir, unless the server is told every worker sees the same work_dir (shared_work_dir).
+Like the headless runner, nothing here may import PySide6.
+"""
+
+import argparse
+import hmac
+import json
+import logging
+import platform
+import socket
+import socketserver
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Callable, Optional
+
+from fastflix.command_runner import BackgroundRunner, StallWatchdog
+from fastflix.conversion_worker import slot_process_failed
+from fastflix.exceptions import QueueInUse
+from fastflix.ff_queue import (
+    claim_queue,
+    get_queue,
+    release_queue,
+    resumable_commands,
+    save_queue,
+    write_command_files,
+)
+from fastflix.models.video import Video
+from fastflix.progress import ProgressEvent
+
+__all__ = ["FarmServer", "FarmWorker", "run_farm_server_cli", "run_farm_worker_cli"]
+
+logger = logging.getLogger("fastflix-core")
+
+default_port = 5830
+
+
+@dataclass
+class Lease:
+    video_uuid: str
+    worker: str
+    timeout: float
+    lease_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    expires: float = 0.0
+
+    def renew(self):
+        self.expires = time.monotonic() + self.timeout
+
+
+class FarmRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        farm: FarmServer = self.server.farm
+        worker = f"{self.client_address[0]}:{self.client_address[1]}"
+        authorized = not farm.token
+        for raw in self.rfile:
+            try:
+                message = json.loads(raw)
+                if message.get("type") == "hello":
+                    worker = str(message.get("worker") or worker)
+                    authorized = not farm.token or hmac.compare_digest(str(message.get("token", "")), farm.token)
+                    reply = {"type": "ok" if authorized else "denied"}
+                elif not authorized:
+                    reply = {"type": "denied"}
+                else:
+                    reply = farm.handle(worker, message)
+            except Exception as err:
+                logger.exception(f"Bad farm request from {worker}")
+                reply = {"type": "error", "message": str(err)}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            if reply["type"] == "denied":
+                return
+
+
+class ThreadingFarmServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FarmServer:
+    """
+    Hands out the ready videos of a queue to farm workers and tracks them the same way the GUI does,
+    through video.status (running while leased, completed_commands so a re-leased video skips finished chunks).
+    A video that fails is put back in line up to retries times before it is marked as an error.
+    Everything that happens is passed to on_event(event, **fields).
+    """
+
+    def __init__(
+        self,
+        queue: list[Video],
+        host: str = "127.0.0.1",
+        port: int = default_port,
+        lease_timeout: float = 60,
+        token: str = "",
+        on_event: Optional[Callable] = None,
+        retries: int = 0,
+        shared_work_dir: bool = False,
+    ):
+        self.queue = queue
+        self.lease_timeout = lease_timeout
+        self.token = token
+        self.retries = retries
+        self.shared_work_dir = shared_work_dir
+        # Worker whose work_dir has the finished commands of a video, by video uuid
+        self.chunk_owners: dict[str, str] = {}
+        self.failures: dict[str, int] = {}
+        self.on_event = on_event or (lambda event, **fields: None)
+        self.leases: dict[str, Lease] = {}
+        self.lock = Lock()
+        self.stopped = Event()
+        self.server = ThreadingFarmServer((host, port), FarmRequestHandler)
+        self.server.farm = self
+        self.threads = []
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def start(self):
+        self.threads = [
+            Thread(target=self.server.serve_forever, daemon=True),
+            Thread(target=self.reap_leases, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def finished(self) -> bool:
+        with self.lock:
+            return not self.leases and not any(video.status.ready for video in self.queue)
+
+    def find_video(self, video_uuid: str) -> Optional[Video]:
+        for video in self.queue:
+            if video.uuid == video_uuid:
+                return video
+        return None
+
+    def reap_leases(self):
+        while not self.stopped.wait(min(1.0, self.lease_timeout / 4)):
+            self.expire_leases()
+
+    def notify(self, events: list[tuple[str, dict]]):
+        """
+        Pass events on to on_event, called after the lock is released so a slow handler (saving the queue)
+        never holds up the other workers, and a failing one doesn't break the request or the reaper.
+        """
+        for event, fields in events:
+            try:
+                self.on_event(event, **fields)
+            except Exception:
+                logger.exception(f"Farm event handler failed on {event}")
+
+    def expire_leases(self):
+        now = time.monotonic()
+        events = []
+        with self.lock:
+            for lease in [lease for lease in self.leases.values() if lease.expires < now]:
+                del self.leases[lease.lease_id]
+                video = self.find_video(lease.video_uuid)
+                if video:
+                    # Back in line, chunks it already finished are not sent again if it can still reach them
+                    video.status.running = False
+                    video.status.running_commands = []
+                logger.warning(f"Lease on video {lease.video_uuid} by {lease.worker} timed out")
+                events.append(("lease_expired", dict(video=lease.video_uuid, worker=lease.worker)))
+        self.notify(events)
+
+    def handle(self, worker: str, message: dict) -> dict:
+        events = []
+        try:
+            if message.get("type") == "lease":
+                return self.lease(worker, events)
+            with self.lock:
+                return self.update_lease(worker, message, events)
+        finally:
+            self.notify(events)
+
+    def update_lease(self, worker: str, message: dict, events: list) -> dict:
+        """Everything but a new lease, call with the lock held"""
+        kind = message.get("type")
+        lease = self.leases.get(message.get("lease", ""))
+        if not lease:
+            return {"type": "cancel"}
+        lease.renew()
+        video = self.find_video(lease.video_uuid)
+
+        if kind == "heartbeat":
+            return {"type": "ok"}
+        if kind == "progress":
+            fields = {k: v for k, v in message.items() if k not in ("type", "lease")}
+            events.append(("progress", dict(video=lease.video_uuid, worker=worker, **fields)))
+            return {"type": "ok"}
+        if kind == "status":
+            command_uuid = message["command"]
+            if message["status"] == "complete" and command_uuid not in video.status.completed_commands:
+                video.status.completed_commands.append(command_uuid)
+                video.status.current_command = len(video.status.completed_commands)
+                self.chunk_owners[video.uuid] = lease.worker
+            events.append((message["status"], dict(video=lease.video_uuid, command=command_uuid, worker=worker)))
+            return {"type": "ok"}
+        if kind == "done":
+            del self.leases[lease.lease_id]
+            video.status.running = False
+            video.status.running_commands = []
+            if message.get("success"):
+                video.status.complete = True
+                video.status.success = True
+                events.append(("video_complete", dict(video=video.uuid, worker=worker)))
+            else:
+                failures = self.failures[video.uuid] = self.failures.get(video.uuid, 0) + 1
+                if failures <= self.retries:
+                    events.append(("video_retry", dict(video=video.uuid, worker=worker, attempt=failures)))
+                else:
+                    video.status.error = True
+                    events.append(("video_error", dict(video=video.uuid, worker=worker)))
+            return {"type": "ok"}
+        return {"type": "error", "message": f"Unknown request {kind}"}
+
+    def lease(self, worker: str, events: list) -> dict:
+        with self.lock:
+            for video in self.queue:
+                if not video.status.ready:
+                    continue
+                if not self.shared_work_dir and self.chunk_owners.get(video.uuid) != worker:
+                    # The finished chunks are in another machine's work_dir (or wherever the queue was saved)
+                    video.status.completed_commands = []
+                    video.status.current_command = 0
+                completed = set(video.status.completed_commands)
+                commands = [
+                    {
+                        "uuid": command.uuid,
+                        "name": command.name,
+                        "command": command.command,
+                        "shell": command.shell,
+                        "files": getattr(command, "files", None),
+                    }
+                    for command in video.video_settings.conversion_commands
+                    if command.uuid not in completed
+                ]
+                lease = Lease(video_uuid=video.uuid, worker=worker, timeout=self.lease_timeout)
+                lease.renew()
+                self.leases[lease.lease_id] = lease
+                video.status.running = True
+                video.status.running_commands = [command["uuid"] for command in commands]
+                events.append(("leased", dict(video=video.uuid, worker=worker)))
+                return {
+                    "type": "job",
+                    "lease": lease.lease_id,
+                    "video": video.uuid,
+                    "work_dir": str(video.work_path),
+                    "commands": commands,
+                    "lease_timeout": self.lease_timeout,
+                }
+            if self.leases:
+                return {"type": "wait"}
+            return {"type": "finished"}
+
+
+class FarmConnection:
+    def __init__(self, host: str, port: int, timeout: float = 30):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile("rwb")
+
+    def request(self, message_type: str, **fields) -> dict:
+        self.file.write(json.dumps({"type": message_type, **fields}).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Farm server closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class FarmWorker:
+    """
+    Leases videos from a FarmServer one at a time and runs their commands in order with BackgroundRunner,
+    reporting each command's result and the ffmpeg progress events back while it works.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = default_port,
+        worker_id: str = "",
+        token: str = "",
+        poll_interval: float = 5,
+        stall_timeout: float = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.worker_id = worker_id or f"{platform.node()}-{uuid.uuid4().hex[:6]}"
+        self.token = token
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.stopped = Event()
+        self.connection: Optional[FarmConnection] = None
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self) -> int:
+        """Work until the server has nothing left, returns how many videos failed on this worker"""
+        failures = 0
+        self.connection = FarmConnection(self.host, self.port)
+        try:
+            if self.connection.request("hello", worker=self.worker_id, token=self.token)["type"] != "ok":
+                raise PermissionError("Farm server refused this worker, check the token")
+            while not self.stopped.is_set():
+                job = self.connection.request("lease")
+                if job["type"] == "finished":
+                    break
+                if job["type"] != "job":
+                    self.stopped.wait(self.poll_interval)
+                    continue
+                success = self.run_job(job)
+                failures += not success
+                self.connection.request("done", lease=job["lease"], success=success)
+        finally:
+            self.connection.close()
+        return failures
+
+    def run_job(self, job: dict) -> bool:
+        logger.info(f"Leased video {job['video']} with {len(job['commands'])} command(s)")
+        heartbeat_interval = max(job["lease_timeout"] / 3, 0.1)
+        for command in job["commands"]:
+            log_queue = Queue()
+            runner = BackgroundRunner(log_queue, video_uuid=job["video"], command_uuid=command["uuid"])
+            write_command_files(command.get("files"))
+            runner.start_exec(command["command"], work_dir=job["work_dir"], shell=command["shell"])
+            watchdog = StallWatchdog(runner, self.stall_timeout)
+            last_report = time.monotonic()
+            while runner.is_alive():
+                reply = None
+                for event in self.progress_events(log_queue):
+                    reply = self.send_progress(job["lease"], event)
+                    last_report = time.monotonic()
+                if reply is None and time.monotonic() - last_report > heartbeat_interval:
+                    reply = self.connection.request("heartbeat", lease=job["lease"])
+                    last_report = time.monotonic()
+                if (reply and reply["type"] == "cancel") or self.stopped.is_set():
+                    logger.warning(f"Stopping video {job['video']}, the lease was cancelled")
+                    runner.kill()
+                    return False
+                if watchdog.stalled():
+                    # Reported as an error, the server puts the video back in line while it has retries left
+                    logger.warning(f"No progress for {self.stall_timeout}s, stopping stalled command {command['uuid']}")
+                    runner.kill()
+                    runner.error_detected = True
+                    break
+                time.sleep(0.1)
+            for event in self.progress_events(log_queue):
+                self.send_progress(job["lease"], event)
+
+            status = "error" if slot_process_failed(runner) else "complete"
+            reply = self.connection.request("status", lease=job["lease"], command=command["uuid"], status=status)
+            if status == "error" or reply["type"] != "ok":
+                return False
+        return True
+
+    def send_progress(self, lease: str, event: ProgressEvent) -> dict:
+        fields = asdict(event)
+        del fields["video_uuid"]
+        fields["command"] = fields.pop("command_uuid")
+        return self.connection.request("progress", lease=lease, **fields)
+
+    @staticmethod
+    def progress_events(log_queue: Queue):
+        while True:
+            try:
+                message = log_queue.get_nowait()
+            except Empty:
+                return
+            if isinstance(message, ProgressEvent):
+                yield message
+
+
+def _address(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    if not host:
+        return value, default_port
+    return host, int(port)
+
+
+def run_farm_server_cli(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="fastflix farm-server",
+        description="Share a saved FastFlix queue with farm workers. Events are written to stdout as JSON lines.",
+    )
+    parser.add_argument("queue_file", type=Path, help="queue .yaml file saved from FastFlix")
+    parser.add_argument("--listen", default=f"127.0.0.1:{default_port}", help="host:port to listen on")
+    parser.add_argument("--lease-timeout", type=float, default=60, help="seconds without news before a lease ends")
+    parser.add_argument("--token", default="", help="shared secret workers have to send")
+    parser.add_argument("--retries", type=int, default=0, help="times a failed video is put back in line")
+    parser.add_argument(
+        "--shared-work-dir",
+        action="store_true",
+        help="every worker sees the work folders at the same path, so any of them can pick up finished chunks",
+    )
+    options = parser.parse_args(args)
+
+    if not options.queue_file.exists():
+        print(f"Queue file {options.queue_file} does not exist", file=sys.stderr)
+        return 2
+    try:
+        claim_queue(options.queue_file, "farm-server")
+    except QueueInUse as err:
+        print(err, file=sys.stderr)
+        return 2
+    try:
+        return serve_queue(options)
+    finally:
+        release_queue(options.queue_file)
+
+
+def serve_queue(options: argparse.Namespace) -> int:
+    queue = get_queue(options.queue_file)
+    for video in queue:
+        if not video.status.complete:
+            video.status.clear_for_resume(resumable_commands(video))
+
+    def on_event(event, **fields):
+        print(json.dumps({"event": event, "time": round(time.time(), 3), **fields}), flush=True)
+        if event != "progress":
+            save_queue(queue, options.queue_file)
+
+    host, port = _address(options.listen)
+    farm = FarmServer(
+        queue,
+        host=host,
+        port=port,
+        lease_timeout=options.lease_timeout,
+        token=options.token,
+        retries=options.retries,
+        shared_work_dir=options.shared_work_dir,
+    )
+    farm.on_event = on_event
+    farm.start()
+    try:
+        while not farm.finished:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        farm.stop()
+        save_queue(queue, options.queue_file)
+    return 1 if any(video.status.error for video in queue) else 0
+
+
+def run_farm_worker_cli(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="fastflix farm-worker", description="Encode videos from a farm server")
+    parser.add_argument("server", help="host:port of the farm server")
+    parser.add_argument("--name", default="", help="worker name shown on the server")
+    parser.add_argument("--token", default="", help="shared secret of the farm server")
+    parser.add_argument(
+        "--stall-timeout", type=float, default=600, help="seconds without progress before a command is stopped"
+    )
+    options = parser.parse_args(args)
+
+    logger.addHandler(logging.StreamHandler(sys.stderr))
+    logger.setLevel(logging.INFO)
+    host, port = _address(options.server)
+    worker = FarmWorker(host, port, worker_id=options.name, token=options.token, stall_timeout=options.stall_timeout)
+    try:
+        return 1 if worker.run() else 0
+    except KeyboardInterrupt:
+        return 130
+    except (OSError, PermissionError) as err:
+        print(f"Farm worker stopped: {err}", file=sys.stderr)
+        return 2
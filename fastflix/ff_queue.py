@@ -12,13 +12,16 @@ from pathlib import Path
 from queue import Queue, Empty
 from typing import Optional
 
+import psutil
 from box import Box, BoxError
 from ruamel.yaml import YAMLError
 
+from fastflix.exceptions import QueueInUse
 from fastflix.models.video import Video, VideoSettings, Status, Crop
 from fastflix.models.encode import AttachmentTrack
 from fastflix.models.encode import setting_types
 from fastflix.models.config import Config
+from fastflix.telemetry import command_output
 
 logger = logging.getLogger("fastflix")
 
@@ -90,6 +93,45 @@ def queue_file_lock(queue_file: Path, timeout: float = 30.0):
                 pass
 
 
+def claim_queue(queue_file: Path, owner: str):
+    """
+    Mark a queue file as run by this process for as long as it is open (the GUI, run-queue or farm-server).
+    Each of them rewrites the whole file with its own view of the queue, so only one may have it at a time.
+    Raises QueueInUse while another live process has it, a claim left behind by a dead one is taken over.
+    """
+    owner_file = Path(queue_file).with_suffix(".owner")
+    for _ in range(2):
+        try:
+            fd = os.open(str(owner_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                current = Box.from_json(filename=owner_file)
+            except (BoxError, ValueError, OSError):
+                current = Box(pid=0, owner="")
+            if current.get("pid") == os.getpid():
+                return
+            if psutil.pid_exists(current.get("pid") or 0):
+                raise QueueInUse(
+                    f"{queue_file} is in use by {current.get('owner')} (pid {current.get('pid')})", current.get("owner")
+                )
+            logger.warning(f"Taking over queue {queue_file} from a process that is gone")
+            owner_file.unlink(missing_ok=True)
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(Box(pid=os.getpid(), owner=owner).to_json())
+        return
+    raise QueueInUse(f"Could not claim {queue_file}")
+
+
+def release_queue(queue_file: Path):
+    owner_file = Path(queue_file).with_suffix(".owner")
+    try:
+        if Box.from_json(filename=owner_file).get("pid") == os.getpid():
+            owner_file.unlink()
+    except (BoxError, ValueError, OSError):
+        pass
+
+
 class AsyncQueueSaver:
     """
     Background thread for saving queue to disk without blocking the GUI.
@@ -287,6 +329,83 @@ def get_queue(queue_file: Path) -> list[Video]:
     return queue
 
 
+def resumable_commands(video: Video) -> list[str]:
+    """
+    Completed chunk commands of a video that don't have to run again. A chunk is only kept when every one of its
+    commands finished and the chunk it wrote is still in the work directory, a two pass chunk that only got
+    through its first pass starts over as its pass log may be gone. Everything else (normal encodes, the join)
+    is always run again from the start.
+    """
+    # The n-th command of every parallel group belongs to the n-th chunk
+    chunks: dict[int, list] = {}
+    positions: dict[str, int] = {}
+    for command in video.video_settings.conversion_commands:
+        if group := getattr(command, "parallel_group", None):
+            position = positions[group] = positions.get(group, -1) + 1
+            chunks.setdefault(position, []).append(command)
+
+    completed = set(video.status.completed_commands)
+    resumable = set()
+    for commands in chunks.values():
+        if not all(command.uuid in completed for command in commands):
+            continue
+        output = command_output(commands[-1].command)
+        if output and not Path(output).exists():
+            continue
+        resumable.update(command.uuid for command in commands)
+    return [command.uuid for command in video.video_settings.conversion_commands if command.uuid in resumable]
+
+
+def pending_commands(video: Video) -> list:
+    """Commands of the video still to run, chunks finished before a crash or cancel are skipped"""
+    completed = set(video.status.completed_commands)
+    return [command for command in video.video_settings.conversion_commands if command.uuid not in completed]
+
+
+def next_commands(video: Video) -> list:
+    """The next command of the video to run, or the whole parallel group (chunked encodes) it starts"""
+    commands = pending_commands(video)
+    group = getattr(commands[0], "parallel_group", None) if commands else None
+    if not group:
+        return commands[:1]
+    for end, command in enumerate(commands):
+        if getattr(command, "parallel_group", None) != group:
+            return commands[:end]
+    return commands
+
+
+def write_command_files(files: Optional[dict]):
+    """Write the files a command reads (the chunk list of a join) into place, right before it runs"""
+    for path, text in (files or {}).items():
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(text, encoding="utf-8")
+
+
+def execute_requests(video: Video, details: Optional[dict] = None) -> list[tuple]:
+    """
+    Conversion worker "execute" requests for the next commands of the video, which are marked as its running ones.
+    Shared by the GUI and the headless queue runner so both send work the same way.
+    """
+    commands = next_commands(video)
+    for command in commands:
+        write_command_files(getattr(command, "files", None))
+    video.status.running_commands = [command.uuid for command in commands]
+    video.status.running = True
+    return [
+        (
+            "execute",
+            video.uuid,
+            command.uuid,
+            command.command,
+            str(video.work_path),
+            video.video_settings.video_title or video.video_settings.output_path.stem,
+            command.shell,
+            details,
+        )
+        for command in commands
+    ]
+
+
 def save_queue(
     queue: list[Video],
     queue_file: Path,
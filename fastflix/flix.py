@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
-import json
 import logging
+import math
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from subprocess import PIPE, CompletedProcess, Popen, TimeoutExpired, run, check_output
-from typing import List, Tuple, Union
+from threading import Event, Timer
+from subprocess import DEVNULL, PIPE, CompletedProcess, Popen, TimeoutExpired, run, check_output
+from typing import List, Optional, Tuple, Union
 from packaging import version
 import shlex
 
@@ -16,6 +18,7 @@ from fastflix.exceptions import FlixError
 from fastflix.language import t
 from fastflix.models.config import Config
 from fastflix.models.fastflix_app import FastFlixApp
+from fastflix.probe_cache import probe_cache
 
 here = os.path.abspath(os.path.dirname(__file__))
 re_tff = re.compile(r"TFF:\s+(\d+)")
@@ -26,6 +29,9 @@ logger = logging.getLogger("fastflix")
 
 HDR10_parser_version = None
 
+# Frames of an HEVC stream hdr10plus_tool gets to look at for HDR10+ metadata
+hdr10_plus_scan_frames = 100
+
 ffmpeg_valid_color_primaries = [
     "bt709",
     "bt470m",
@@ -198,11 +204,25 @@ def ffprobe_configuration(app, config: Config, **_):
     app.fastflix.ffprobe_version = version
 
 
-def probe(app: FastFlixApp, file: Path) -> Box:
+def cache_version(app: FastFlixApp) -> str:
+    """Probe cache entries are only good for the ffprobe that made them"""
+    return app.fastflix.ffprobe_version or str(app.fastflix.config.ffprobe)
+
+
+def probe(app: FastFlixApp, file: Path, use_cache: bool = True) -> Box:
     """
     Run FFprobe on a file
     ffprobe -v quiet -loglevel panic -print_format json -show_format -show_streams
+
+    Results are kept in the on disk probe cache until the file changes.
     """
+    cache = probe_cache(app.fastflix.data_path) if use_cache else None
+    key = None
+    if cache is not None:
+        key = cache.key(clean_file_string(file), cache_version(app))
+        if cached := cache.get(key):
+            return Box.from_json(cached)
+
     command = [
         f"{app.fastflix.config.ffprobe}",
         "-v",
@@ -223,10 +243,13 @@ def probe(app: FastFlixApp, file: Path) -> Box:
         raise FlixError(f"No output from FFprobe, not a known video type. stderr: {result.stderr}")
 
     try:
-        return Box.from_json(result.stdout)
+        data = Box.from_json(result.stdout)
     except BoxError:
         logger.error(f"Could not read output: {result.stdout} - {result.stderr}")
         raise FlixError(result.stderr)
+    if cache is not None:
+        cache.put(key, file, result.stdout)
+    return data
 
 
 def get_all_concat_items(file):
@@ -256,12 +279,14 @@ def get_concat_item(file, location=0):
     return all_items[item_num]
 
 
-def parse(app: FastFlixApp, **_):
+def parse(app: FastFlixApp, probe_data: Optional[Box] = None, **_):
+    """Fill in the current video's streams and format, from probe_data when the source was already probed"""
     source = app.fastflix.current_video.source
     if source.name.lower().endswith("txt"):
         source = get_concat_item(source)
         app.fastflix.current_video.concat = True
-    data = probe(app, source)
+        probe_data = None
+    data = probe_data or probe(app, source)
     if "streams" not in data:
         raise FlixError(f"Not a video file, FFprobe output: {data}")
     streams = Box({"video": [], "audio": [], "subtitle": [], "attachment": [], "data": []})
@@ -291,52 +316,50 @@ def parse(app: FastFlixApp, **_):
     app.fastflix.current_video.duration = float(data.format.get("duration", 0))
 
 
+# Seconds to copy out one cover attachment
+cover_timeout = 5
+
+
 def extract_attachments(app: FastFlixApp, **_):
     if app.fastflix.config.disable_cover_extraction:
         return
+    covers = {}
     for track in app.fastflix.current_video.streams.attachment:
         filename = track.get("tags", {}).get("filename", "")
         if filename.rsplit(".", 1)[0] in ("cover", "small_cover", "cover_land", "small_cover_land"):
-            extract_attachment(
-                app.fastflix.config.ffmpeg,
-                app.fastflix.current_video.source,
-                track.index,
-                app.fastflix.current_video.work_path,
-                filename,
-            )
+            covers[track.index] = filename
+    if covers:
+        extract_covers(
+            app.fastflix.config.ffmpeg,
+            app.fastflix.current_video.source,
+            covers,
+            app.fastflix.current_video.work_path,
+        )
 
 
-def extract_attachment(ffmpeg: Path, source: Path, stream: int, work_dir: Path, file_name: str):
+def extract_covers(ffmpeg: Path, source: Path, covers: dict[int, str], work_dir: Path):
+    """
+    Copy out every cover attachment (stream index to file name) with a single FFmpeg,
+    which gets the same cover_timeout for each cover it writes as separate runs would.
+    """
+    command = [f"{ffmpeg}", "-y", "-i", clean_file_string(source)]
+    for stream, file_name in covers.items():
+        command.extend(["-map", f"0:{stream}", "-c", "copy", "-vframes", "1", clean_file_string(file_name)])
     try:
-        execute(
-            [
-                f"{ffmpeg}",
-                "-y",
-                "-i",
-                clean_file_string(source),
-                "-map",
-                f"0:{stream}",
-                "-c",
-                "copy",
-                "-vframes",
-                "1",
-                clean_file_string(file_name),
-            ],
-            work_dir=work_dir,
-            timeout=5,
-        )
+        execute(command, work_dir=work_dir, timeout=cover_timeout * len(covers))
     except TimeoutExpired:
-        logger.warning(f"WARNING Timeout while extracting cover file {file_name}")
+        logger.warning(f"WARNING Timeout while extracting cover files {', '.join(covers.values())}")
 
 
 def generate_thumbnail_command(
     config: Config,
     source: Path,
-    output: Path,
     filters: list[str] | str,
     start_time: float = 0,
     input_track: int = 0,
+    image_codec: str = "mjpeg",
 ) -> list[str]:
+    """Single frame written to stdout as one image_codec picture, so it can be read straight into a QImage"""
     command = [str(config.ffmpeg)]
 
     # Trim from start this many seconds
@@ -358,29 +381,74 @@ def generate_thumbnail_command(
 
     command += [
         "-an",
-        "-y",
         "-map_metadata",
         "-1",
         "-strict",
         "unofficial",
         "-frames:v",
         "1",
-        clean_file_string(output),
+        "-f",
+        "image2pipe",
+        "-c:v",
+        image_codec,
+        "-",
     ]
 
     return command
 
 
-def get_auto_crop(
+def generate_filmstrip_command(
     config: Config,
     source: Path,
-    video_width: int,
-    video_height: int,
-    input_track: int,
-    start_time: float,
-    result_list: List,
-    **_,
-):
+    duration: float,
+    input_track: int = 0,
+    frames: int = 10,
+    width: int = 160,
+) -> list[str]:
+    """
+    One FFmpeg run that decodes only the keyframes, keeps the first one every duration / frames seconds
+    and tiles them side by side into a single image written to stdout.
+    """
+    interval = max(duration / frames, 0.001)
+    return [
+        str(config.ffmpeg),
+        "-loglevel",
+        "warning",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        clean_file_string(source),
+        "-map",
+        f"0:{input_track}",
+        "-an",
+        "-sn",
+        "-dn",
+        "-vf",
+        f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})',scale={width}:-2,tile={frames}x1",
+        "-frames:v",
+        "1",
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "mjpeg",
+        "-q:v",
+        "3",
+        "-",
+    ]
+
+
+def crop_sample_times(duration: float, start_time: float, end_time: float, points: int) -> List[int]:
+    """Evenly spread seek points for crop detection between the start time (or 10% in) and the end time"""
+    start_pos = start_time or duration // 10
+    end_pos = end_time if 0 < end_time < duration else duration
+    blocks = max(1, math.ceil((end_pos - start_pos) / (points + 1)))
+    return [x for x in range(int(start_pos), int(end_pos), blocks) if x < end_pos][:points]
+
+
+def crop_sample(
+    config: Config, source: Path, input_track: int, start_time: float
+) -> Union[Tuple[int, int, int, int], None]:
+    """Width, height, x and y of the picture in the ten frames from start_time, as found by cropdetect"""
     output = execute(
         [
             f"{config.ffmpeg}",
@@ -401,25 +469,77 @@ def get_auto_crop(
             "-",
         ]
     )
+    # cropdetect grows its box over every frame it has seen, so the last line covers all ten
+    found = None
+    for line in (output.stderr or "").splitlines():
+        if line.startswith("[Parsed_cropdetect") and "crop=" in line:
+            try:
+                found = tuple(int(x) for x in line.rsplit("crop=", 1)[1].split(":"))
+            except ValueError:
+                logger.debug(f"Could not parse cropdetect line: {line}")
+    return found if found and len(found) == 4 else None
 
-    width, height, x_crop, y_crop = None, None, None, None
-    if not output.stderr:
-        return 0, 0, 0, 0
 
-    for line in output.stderr.splitlines():
-        if line.startswith("[Parsed_cropdetect"):
-            w, h, x, y = [int(x) for x in line.rsplit("=")[1].split(":")]
-            if (not x_crop or (x_crop and x > x_crop)) and (not width or (width and w < width)):
-                width = w
-                x_crop = x
-            if (not height or (height and h < height)) and (not y_crop or (y_crop and y > y_crop)):
-                height = h
-                y_crop = y
+def aggregate_crop(
+    samples: List[Tuple[int, int, int, int]], video_width: int, video_height: int
+) -> Union[List[int], None]:
+    """
+    Right, bottom, left and top crop that holds for every sample.
+
+    Each edge is cropped only as far as every sample allows, so a bright scene that reaches into a bar
+    wins over darker ones that would cut into the picture. Samples that are almost entirely black, like
+    fades, say nothing about where the picture ends and are left out unless there is nothing else.
+    """
+    crops = []
+    for width, height, x, y in samples:
+        if width <= 0 or height <= 0:
+            continue
+        crops.append([max(0, video_width - width - x), max(0, video_height - height - y), max(0, x), max(0, y)])
+    if not crops:
+        return None
+    lit = [crop for crop in crops if crop[0] + crop[2] <= video_width * 0.9 and crop[1] + crop[3] <= video_height * 0.9]
+    return [min(edge) for edge in zip(*(lit or crops))]
 
-    if None in (width, height, x_crop, y_crop):
-        return 0, 0, 0, 0
 
-    result_list.append([video_width - width - x_crop, video_height - height - y_crop, x_crop, y_crop])
+def get_auto_crop(
+    app: FastFlixApp,
+    config: Config,
+    source: Path,
+    video_width: int,
+    video_height: int,
+    input_track: int,
+    start_time: float,
+    end_time: float,
+    result_list: List,
+    **_,
+):
+    """
+    Crop detection over config.crop_detect_points seek points, all sampled at the same time.
+    The outcome is kept with the probe data of the source for its track and time range.
+    """
+    times = crop_sample_times(app.fastflix.current_video.duration, start_time, end_time, config.crop_detect_points)
+    if not times:
+        return
+
+    cache = probe_cache(app.fastflix.data_path)
+    key = cache.key(clean_file_string(source), cache_version(app)) if cache is not None else None
+    detail = f"crop:{input_track}:{times[0]}:{end_time}:{len(times)}"
+    if key and (cached := cache.get_detail(key, detail)):
+        result_list.append([int(x) for x in cached.split(",")])
+        return
+
+    with ThreadPoolExecutor(max_workers=min(len(times), 4), thread_name_prefix="crop") as pool:
+        samples = [
+            sample
+            for sample in pool.map(lambda x: crop_sample(config, source, input_track, x), times)
+            if sample is not None
+        ]
+    crop = aggregate_crop(samples, video_width, video_height)
+    if not crop:
+        return
+    if key:
+        cache.put_detail(key, detail, ",".join(str(x) for x in crop))
+    result_list.append(crop)
 
 
 def detect_interlaced(app: FastFlixApp, config: Config, source: Path, **_):
@@ -537,69 +657,90 @@ def convert_mastering_display(data: Box) -> Tuple[Box, str]:
     return master_display, cll
 
 
-def parse_hdr_details(app: FastFlixApp, **_):
-    streams = app.fastflix.current_video.streams
-    video_track = app.fastflix.current_video.video_settings.selected_track
-    if streams and streams.video:
-        for video_stream in streams.video:
-            if video_stream["index"] == video_track and video_stream.get("side_data_list"):
-                try:
-                    master_display, cll = convert_mastering_display(video_stream)
-                except FlixError as err:
-                    logger.error(str(err))
-                except Exception:
-                    logger.exception(f"Unexpected error while processing master-display from {video_stream}")
-                else:
-                    if master_display:
-                        app.fastflix.current_video.hdr10_streams.append(
-                            Box(index=video_stream.index, master_display=master_display, cll=cll)
-                        )
-                        continue
+def first_video_frames(app: FastFlixApp, video_streams: List[Box]) -> dict[int, Box]:
+    """
+    Colors and side data of the first frame of each video stream, keyed by stream index.
+    A single ffprobe reads them all, any stream it didn't get to (the packets of another came first) gets its own.
+    """
+    frames = {}
 
+    def read(select: str, packets: int, index: int = None):
+        try:
             result = execute(
                 [
                     f"{app.fastflix.config.ffprobe}",
                     "-loglevel",
                     "panic",
                     "-select_streams",
-                    f"{video_stream.index}",
+                    select,
                     "-print_format",
                     "json",
                     "-show_frames",
                     "-read_intervals",
-                    "%+#1",
+                    f"%+#{packets}",
                     "-show_entries",
-                    "frame=color_space,color_primaries,color_transfer,side_data_list,pix_fmt",
+                    "frame=stream_index,color_space,color_primaries,color_transfer,side_data_list,pix_fmt",
                     clean_file_string(app.fastflix.current_video.source),
-                ]
+                ],
+                timeout=30,
+            )
+        except TimeoutExpired:
+            logger.warning(f"Timeout while reading the first frame of {app.fastflix.current_video.source}")
+            return
+        try:
+            data = Box.from_json(result.stdout, default_box=True, default_box_attr="")
+        except BoxError:
+            # Could not parse details
+            logger.error(
+                "COULD NOT PARSE FFPROBE HDR METADATA, PLEASE OPEN ISSUE WITH THESE DETAILS:"
+                f"\nSTDOUT: {result.stdout}\nSTDERR: {result.stderr}"
             )
+            return
+        for frame in data.get("frames", []):
+            frames.setdefault(frame.get("stream_index") if index is None else index, frame)
 
-            try:
-                data = Box.from_json(result.stdout, default_box=True, default_box_attr="")
-            except BoxError:
-                # Could not parse details
-                logger.error(
-                    "COULD NOT PARSE FFPROBE HDR METADATA, PLEASE OPEN ISSUE WITH THESE DETAILS:"
-                    f"\nSTDOUT: {result.stdout}\nSTDERR: {result.stderr}"
-                )
-                continue
-            if "frames" not in data or not len(data.frames):
-                continue
-            data = data.frames[0]
-            if not data.get("side_data_list"):
+    if not video_streams:
+        return frames
+    # Capital V leaves out cover art, which would otherwise use up the packets
+    read("V", len(video_streams))
+    for stream in video_streams:
+        if stream.index not in frames:
+            read(f"{stream.index}", 1, index=stream.index)
+    return frames
+
+
+def hdr10_details(data: Box, index: int) -> Union[Box, None]:
+    """HDR10 mastering display and light level of a stream, from its own or its first frame's side data"""
+    try:
+        master_display, cll = convert_mastering_display(data)
+    except FlixError as err:
+        logger.error(str(err))
+    except Exception:
+        logger.exception(f"Unexpected error while processing master-display from {data}")
+    else:
+        if master_display:
+            return Box(index=index, master_display=master_display, cll=cll)
+    return None
+
+
+def parse_hdr_details(app: FastFlixApp, frames: dict[int, Box] = None, **_):
+    streams = app.fastflix.current_video.streams
+    video_track = app.fastflix.current_video.video_settings.selected_track
+    if not streams or not streams.video:
+        return
+    for video_stream in streams.video:
+        if video_stream["index"] == video_track and video_stream.get("side_data_list"):
+            if details := hdr10_details(video_stream, video_stream.index):
+                app.fastflix.current_video.hdr10_streams.append(details)
                 continue
 
-            try:
-                master_display, cll = convert_mastering_display(data)
-            except FlixError as err:
-                logger.error(str(err))
-            except Exception:
-                logger.exception(f"Unexpected error while processing master-display from {streams.video[0]}")
-            else:
-                if master_display:
-                    app.fastflix.current_video.hdr10_streams.append(
-                        Box(index=video_stream.index, master_display=master_display, cll=cll)
-                    )
+        if frames is None:
+            frames = first_video_frames(app, streams.video)
+        frame = frames.get(video_stream.index)
+        if not frame or not frame.get("side_data_list"):
+            continue
+        if details := hdr10_details(frame, video_stream.index):
+            app.fastflix.current_video.hdr10_streams.append(details)
 
 
 def get_hdr10_parser_version(config: Config) -> version:
@@ -614,51 +755,45 @@ def get_hdr10_parser_version(config: Config) -> version:
     return HDR10_parser_version
 
 
-def _detect_hdr10_plus_ffprobe(app: FastFlixApp, config: Config, stream) -> bool:
-    """Detect HDR10+ in a stream using ffprobe frame side data. Works with any codec."""
-    logger.debug(f"Checking for hdr10+ via ffprobe in stream {stream.index}")
-    try:
-        result = execute(
-            [
-                str(config.ffprobe),
-                "-show_frames",
-                "-read_intervals",
-                "%+#1",
-                "-select_streams",
-                f"v:{stream.index}",
-                "-show_entries",
-                "frame=side_data_list",
-                "-of",
-                "json",
-                clean_file_string(app.fastflix.current_video.source),
-            ],
-            timeout=30,
-        )
-        if result.returncode != 0:
-            return False
-        data = json.loads(result.stdout)
-        for frame in data.get("frames", []):
-            for side_data in frame.get("side_data_list", []):
-                if "HDR10+" in side_data.get("side_data_type", ""):
-                    return True
-    except Exception:
-        logger.exception(f"Unexpected error during ffprobe HDR10+ detection for stream {stream.index}")
-    return False
+def frame_has_hdr10_plus(frame: Union[Box, None]) -> bool:
+    """HDR10+ dynamic metadata shows up in the frame side data with any codec"""
+    if not frame:
+        return False
+    return any("HDR10+" in side_data.get("side_data_type", "") for side_data in frame.get("side_data_list", []))
+
+
+def uses_hdr10_plus_tool(config: Config, stream: Box) -> bool:
+    return bool(config.hdr10plus_parser and config.hdr10plus_parser.exists()) and stream.get("codec_name") == "hevc"
 
 
 def _detect_hdr10_plus_tool(app: FastFlixApp, config: Config, stream) -> bool:
-    """Detect HDR10+ in an HEVC stream using hdr10plus_tool."""
+    """
+    Detect HDR10+ in an HEVC stream using hdr10plus_tool.
+
+    Only the first hdr10_plus_scan_frames frames are handed over, as the metadata is carried from the very first
+    frame when it's there at all, and both processes are stopped as soon as the tool gives its verdict.
+    The verdict is kept with the probe data of the file.
+    """
+    source = app.fastflix.current_video.source
+    cache = probe_cache(app.fastflix.data_path)
+    key = cache.key(clean_file_string(source), cache_version(app)) if cache is not None else None
+    detail = f"hdr10plus:{stream.index}"
+    if key and (cached := cache.get_detail(key, detail)) is not None:
+        return cached == "1"
+
     logger.debug(f"Checking for hdr10+ via hdr10plus_tool in stream {stream.index}")
     process = Popen(
         [
             str(config.ffmpeg),
             "-y",
             "-i",
-            clean_file_string(app.fastflix.current_video.source),
+            clean_file_string(source),
             "-map",
             f"0:{stream.index}",
             "-loglevel",
             "panic",
+            "-frames:v",
+            f"{hdr10_plus_scan_frames}",
             "-c:v",
             "copy",
             "-bsf:v",
@@ -668,7 +803,7 @@ def _detect_hdr10_plus_tool(app: FastFlixApp, config: Config, stream) -> bool:
             "-",
         ],
         stdout=PIPE,
-        stderr=PIPE,
+        stderr=DEVNULL,
         stdin=PIPE,  # FFmpeg can try to read stdin and wrecks havoc
     )
 
@@ -680,32 +815,90 @@ def _detect_hdr10_plus_tool(app: FastFlixApp, config: Config, stream) -> bool:
     process_two = Popen(
         hdr10_parser_command,
         stdout=PIPE,
-        stderr=PIPE,
+        stderr=DEVNULL,
         stdin=process.stdout,
         encoding="utf-8",
     )
+    # Only the tool reads from FFmpeg now, so FFmpeg is told if it goes away
+    process.stdout.close()
+
+    timed_out = Event()
+
+    def stop():
+        for proc in (process, process_two):
+            if proc.poll() is None:
+                proc.kill()
+
+    def timeout():
+        timed_out.set()
+        stop()
 
+    timer = Timer(60, timeout)
+    timer.start()
+    found = False
+    stopped = []
     try:
-        stdout, stderr = process_two.communicate()
+        for line in process_two.stdout:
+            if "Dynamic HDR10+ metadata detected." in line:
+                found = True
+                break
     except Exception:
         logger.exception(f"Unexpected error while trying to detect HDR10+ metadata in stream {stream.index}")
         return False
-    return "Dynamic HDR10+ metadata detected." in stdout
-
-
-def detect_hdr10_plus(app: FastFlixApp, config: Config, **_):
-    has_hdr10plus_tool = config.hdr10plus_parser and config.hdr10plus_parser.exists()
-
-    hdr10plus_streams = []
-
-    for stream in app.fastflix.current_video.streams.video:
-        codec = stream.get("codec_name", "")
-        if has_hdr10plus_tool and codec == "hevc":
-            if _detect_hdr10_plus_tool(app, config, stream):
-                hdr10plus_streams.append(stream.index)
-        else:
-            if _detect_hdr10_plus_ffprobe(app, config, stream):
-                hdr10plus_streams.append(stream.index)
+    finally:
+        timer.cancel()
+        if not found and not timed_out.is_set():
+            # The tool has closed its output, let it exit on its own so its status says if it finished the check
+            try:
+                process_two.wait(timeout=5)
+            except TimeoutExpired:
+                pass
+        stopped = [proc for proc in (process, process_two) if proc.poll() is None]
+        stop()
+        process.wait()
+        process_two.wait()
+        process_two.stdout.close()
+
+    if timed_out.is_set() and not found:
+        logger.warning(f"Timeout while checking stream {stream.index} for HDR10+ metadata")
+    elif key and (found or all(proc in stopped or proc.returncode == 0 for proc in (process, process_two))):
+        # A no is only kept when both ran cleanly, a crash or read error shouldn't mark the file for good
+        cache.put_detail(key, detail, "1" if found else "0")
+    return found
+
+
+def analyze_video(app: FastFlixApp, config: Config, source: Path = None, probe_data: Optional[Box] = None, **_):
+    """
+    Everything there is to know about a newly opened video, probe_data saves probing it again.
 
-    if hdr10plus_streams:
-        app.fastflix.current_video.hdr10_plus = hdr10plus_streams
+    The probe has to come first as the rest work from its streams, after that the cover extraction,
+    hdr10plus_tool and interlace detection run alongside the one ffprobe that reads the first frame
+    of every video stream, which the HDR10 and HDR10+ checks then share.
+    """
+    parse(app, probe_data=probe_data)
+    video_streams = app.fastflix.current_video.streams.video
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="analysis") as pool:
+        steps = [pool.submit(extract_attachments, app)]
+        if source and not config.disable_deinterlace_check:
+            steps.append(pool.submit(detect_interlaced, app, config, source=source))
+        tool_checks = {
+            stream.index: pool.submit(_detect_hdr10_plus_tool, app, config, stream)
+            for stream in video_streams
+            if uses_hdr10_plus_tool(config, stream)
+        }
+
+        frames = first_video_frames(app, video_streams)
+        parse_hdr_details(app, frames=frames)
+        hdr10plus_streams = [
+            stream.index
+            for stream in video_streams
+            if (
+                tool_checks[stream.index].result()
+                if stream.index in tool_checks
+                else frame_has_hdr10_plus(frames.get(stream.index))
+            )
+        ]
+        if hdr10plus_streams:
+            app.fastflix.current_video.hdr10_plus = hdr10plus_streams
+        for step in steps:
+            step.result()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+In process frame server for the previews.
+
+Running FFmpeg for every preview means opening and probing the file, seeking and decoding all over again,
+which is hundreds of milliseconds before a filter has even run. The frame server keeps the source open with
+OpenCV and hands back decoded frames as NumPy arrays, with the crop, scale, rotation and flips done right on
+the array. Anything it can't show the same way (tone mapping, deinterlacing, eq, denoise, burned in
+subtitles) is left to FFmpeg.
+"""
+
+import logging
+import math
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+__all__ = ["FrameServer", "can_serve", "scaled_size", "transform_frame"]
+
+logger = logging.getLogger("fastflix")
+
+# Video settings that change the picture in ways only the FFmpeg filters reproduce
+ffmpeg_only_settings = (
+    "remove_hdr",
+    "deinterlace",
+    "brightness",
+    "contrast",
+    "saturation",
+    "deblock",
+    "denoise",
+    "burn_in_subtitle_track",
+)
+
+
+def can_serve(settings: dict) -> bool:
+    """If a preview with these video settings can come from the frame server"""
+    return not any(settings.get(name) not in (None, False, "", 0) for name in ffmpeg_only_settings)
+
+
+def scaled_size(width: int, height: int, scale: str) -> tuple[int, int]:
+    """
+    Size FFmpeg's scale=w:h would give, for plain numbers only.
+    A negative side keeps the aspect ratio, rounded to a multiple of itself like FFmpeg does.
+    Raises ValueError for expressions, which the caller can hand to FFmpeg instead.
+    """
+    new_width, new_height = (int(x) for x in scale.replace("'", "").split(":")[:2])
+    if new_width <= 0 and new_height <= 0:
+        return width, height
+    if new_width < 0:
+        multiple = -new_width
+        new_width = max(multiple, round(width * new_height / height / multiple) * multiple)
+    elif new_height < 0:
+        multiple = -new_height
+        new_height = max(multiple, round(height * new_width / width / multiple) * multiple)
+    return new_width or width, new_height or height
+
+
+def transform_frame(
+    frame: np.ndarray,
+    crop: Optional[dict] = None,
+    scale: Optional[str] = None,
+    rotate: int = 0,
+    vertical_flip: bool = False,
+    horizontal_flip: bool = False,
+    max_width: int = 0,
+) -> np.ndarray:
+    """Apply the same crop, scale, rotate and flip steps as helpers.generate_filters, in the same order"""
+    if crop:
+        top, left = crop.get("top", 0), crop.get("left", 0)
+        frame = frame[top : top + crop["height"], left : left + crop["width"]]
+    if scale:
+        width, height = scaled_size(frame.shape[1], frame.shape[0], scale)
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    if rotate == 1:
+        frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+    elif rotate == 2:
+        frame = cv2.rotate(frame, cv2.ROTATE_180)
+    elif rotate == 3:
+        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    if vertical_flip:
+        frame = frame[::-1]
+    if horizontal_flip:
+        frame = frame[:, ::-1]
+    if max_width and frame.shape[1] > max_width:
+        height = max(1, math.ceil(frame.shape[0] * max_width / frame.shape[1]))
+        frame = cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(frame)
+
+
+class FrameServer:
+    """
+    Keeps one video stream of a source open for as long as it is the one being previewed.
+    video_stream is the position among the video streams, not the stream index.
+    The source is only opened on first use, so that it happens on the thread making the preview.
+    """
+
+    def __init__(self, source: Union[Path, str], video_stream: int = 0):
+        self.source = Path(source)
+        self.video_stream = video_stream
+        self.lock = Lock()
+        self.capture: Optional[cv2.VideoCapture] = None
+        self.closed = False
+
+    def open_capture(self) -> bool:
+        """Open the source unless that was already tried, with the lock held"""
+        if self.capture is None and not self.closed:
+            # Not every OpenCV build takes a stream to open, which then leaves other tracks to FFmpeg
+            params = [cv2.CAP_PROP_VIDEO_STREAM, self.video_stream] if self.video_stream else []
+            self.capture = cv2.VideoCapture(str(self.source), cv2.CAP_FFMPEG, params)
+            if not self.capture.isOpened():
+                logger.debug(f"Frame server could not open {self.source}, previews will use FFmpeg")
+        return self.capture is not None and self.capture.isOpened()
+
+    @property
+    def opened(self) -> bool:
+        with self.lock:
+            return self.open_capture()
+
+    def frame(self, seconds: float) -> Optional[np.ndarray]:
+        """Decoded BGR frame at the given time, None if it could not be read"""
+        with self.lock:
+            if not self.open_capture():
+                return None
+            self.capture.set(cv2.CAP_PROP_POS_MSEC, max(0.0, seconds or 0.0) * 1000)
+            success, frame = self.capture.read()
+        return frame if success else None
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.capture is not None:
+                self.capture.release()
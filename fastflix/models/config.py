@@ -241,6 +241,11 @@ class Config(BaseModel):
     language: str = "eng"
     logging_level: int = 10
     crop_detect_points: int = 10
+    concurrent_encodes: int = 1
+    gpu_encode_sessions: int = 3
+    stall_timeout: int = 600
+    stall_retries: int = 1
+    thumbnail_cache_size: int = 256
     continue_on_failure: bool = True
     work_path: Path = Path(os.getenv("FF_WORKDIR", user_data_dir("FastFlix", appauthor=False, roaming=True)))
     use_sane_audio: bool = True
@@ -140,6 +140,8 @@ class AdvancedOptions(BaseModel):
     denoise: Optional[str] = None
     denoise_type_index: int = 0
     denoise_strength_index: int = 0
+    chunked_encoding: bool = False
+    chunk_length: int = 60
 
 
 class Profile(BaseModel):
@@ -112,6 +112,8 @@ class VideoSettings(BaseModel):
     contrast: Optional[str] = None
     saturation: Optional[str] = None
     copy_data: bool = False
+    chunked_encoding: bool = False
+    chunk_length: int = 60
     video_encoder_settings: Optional[
         Union[
             x265Settings,
@@ -180,6 +182,9 @@ class Status(BaseModel):
     cancelled: bool = False
     subtitle_fixed: bool = False
     current_command: int = 0
+    running_commands: list[str] = Field(default_factory=list)
+    # Commands that finished, saved in the queue file so chunked encodes can resume after a crash or cancel
+    completed_commands: list[str] = Field(default_factory=list)
 
     @property
     def ready(self) -> bool:
@@ -193,6 +198,15 @@ class Status(BaseModel):
         self.cancelled = False
         self.subtitle_fixed = False
         self.current_command = 0
+        self.running_commands = []
+        self.completed_commands = []
+
+    def clear_for_resume(self, resumable: list[str]):
+        """Reset like clear(), but keep the completed commands that don't need to run again"""
+        completed = [command_uuid for command_uuid in self.completed_commands if command_uuid in resumable]
+        self.clear()
+        self.completed_commands = completed
+        self.current_command = len(completed)
 
 
 class Video(BaseModel):
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of ffprobe results.
+
+Probing a file on a network share can take hundreds of milliseconds, and the same files get probed over and
+over when they are opened, reloaded from the queue or listed by the concat and multiple files windows.
+Results are keyed by the resolved path, size, modification time and ffprobe version, so any change to the
+file (or a new ffprobe) is a miss. The least recently used entries are dropped once there are max_entries,
+along with any details stored for them, like which streams carry HDR10+ metadata.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+__all__ = ["ProbeCache", "probe_cache"]
+
+logger = logging.getLogger("fastflix")
+
+schema = """
+CREATE TABLE IF NOT EXISTS probes (
+    key TEXT PRIMARY KEY,
+    path TEXT,
+    data TEXT,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used);
+CREATE TABLE IF NOT EXISTS details (
+    key TEXT,
+    name TEXT,
+    value TEXT,
+    PRIMARY KEY (key, name)
+);
+"""
+
+
+class ProbeCache:
+    # Only look at the size of the cache every so many new entries
+    evict_every = 50
+
+    def __init__(self, path: Path, max_entries: int = 5000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self.added = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Probes run from worker threads, every use of the connection goes through the lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(schema)
+
+    @staticmethod
+    def key(file: Path, ffprobe_version: str = "") -> Optional[str]:
+        """Identity of a file's current contents, None if it can't be found on disk (URLs, devices)"""
+        try:
+            resolved = Path(file).resolve()
+            stat = resolved.stat()
+        except (OSError, RuntimeError, ValueError):
+            return None
+        if not resolved.is_file():
+            return None
+        identity = f"{resolved}\0{stat.st_size}\0{stat.st_mtime_ns}\0{ffprobe_version}"
+        return hashlib.sha256(identity.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if not key:
+            return None
+        with self.lock:
+            try:
+                row = self.connection.execute("SELECT data FROM probes WHERE key = ?", (key,)).fetchone()
+                if row:
+                    with self.connection:
+                        self.connection.execute("UPDATE probes SET last_used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error:
+                logger.exception("Could not read from the probe cache")
+                return None
+        return row[0] if row else None
+
+    def put(self, key: Optional[str], file: Path, data: str):
+        if not key:
+            return
+        with self.lock:
+            try:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)", (key, str(file), data, time.time())
+                    )
+                self.added += 1
+                if self.added >= self.evict_every:
+                    self.added = 0
+                    self.evict()
+            except sqlite3.Error:
+                logger.exception("Could not write to the probe cache")
+
+    def get_detail(self, key: Optional[str], name: str) -> Optional[str]:
+        """Other findings about a file that are costly to work out again, such as HDR10+ per stream"""
+        if not key:
+            return None
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT value FROM details WHERE key = ? AND name = ?", (key, name)
+                ).fetchone()
+            except sqlite3.Error:
+                logger.exception("Could not read from the probe cache")
+                return None
+        return row[0] if row else None
+
+    def put_detail(self, key: Optional[str], name: str, value: str):
+        if not key:
+            return
+        with self.lock:
+            try:
+                with self.connection:
+                    self.connection.execute("INSERT OR REPLACE INTO details VALUES (?, ?, ?)", (key, name, value))
+            except sqlite3.Error:
+                logger.exception("Could not write to the probe cache")
+
+    def evict(self):
+        """Drop the least recently used entries over max_entries, call with the lock held"""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM probes WHERE key IN (SELECT key FROM probes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.connection.execute("DELETE FROM details WHERE key NOT IN (SELECT key FROM probes)")
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM probes")
+            self.connection.execute("DELETE FROM details")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_caches: dict[Path, ProbeCache] = {}
+_caches_lock = Lock()
+
+
+def probe_cache(data_path: Path) -> Optional[ProbeCache]:
+    """The shared cache stored under the FastFlix data directory, None when it can't be used"""
+    path = Path(data_path) / "probe_cache.sqlite"
+    with _caches_lock:
+        if path not in _caches:
+            try:
+                _caches[path] = ProbeCache(path)
+            except (sqlite3.Error, OSError):
+                logger.exception(f"Could not open the probe cache at {path}")
+                return None
+        return _caches[path]
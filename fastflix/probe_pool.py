@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Probe many files at once on a small thread pool.
+
+ffprobe spends most of its time waiting on the disk (or network share), so running several at the same time
+turns a folder scan from the sum of every probe into little more than the slowest few. Results are handed
+back as they finish, so windows can fill their tables while the rest are still running.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from threading import Condition, Event
+from typing import Iterable, Optional
+
+from box import Box
+
+from fastflix.flix import probe
+
+__all__ = ["ProbePool", "ProbeResult", "video_stream"]
+
+logger = logging.getLogger("fastflix")
+
+
+def default_workers() -> int:
+    return min(8, os.cpu_count() or 4)
+
+
+@dataclass
+class ProbeResult:
+    file: Path
+    data: Optional[Box] = None
+    error: Optional[Exception] = None
+
+
+def video_stream(result: ProbeResult) -> Optional[Box]:
+    """Video stream the folder windows show for a probed file, None if it could not be probed or has none"""
+    if not result.data:
+        return None
+    video = None
+    for stream in result.data.get("streams", []):
+        if stream.codec_type == "video":
+            video = stream
+    return video
+
+
+class ProbePool:
+    """
+    Starts probing every file right away, at most `workers` at a time, in the order given.
+    Use as a context manager so anything still queued is dropped when the caller is done with it.
+    """
+
+    def __init__(self, app, files: Iterable[Path], workers: int = 0):
+        self.app = app
+        self.files = list(files)
+        self.cancelled = Event()
+        self.results: SimpleQueue = SimpleQueue()
+        self.finished_results: dict[Path, ProbeResult] = {}
+        self.condition = Condition()
+        self.received = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers or default_workers(), thread_name_prefix="probe")
+        for file in self.files:
+            self.executor.submit(self.probe, file)
+
+    def __enter__(self) -> "ProbePool":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def probe(self, file: Path):
+        if self.cancelled.is_set():
+            return
+        try:
+            result = ProbeResult(file, data=probe(self.app, file))
+        except Exception as err:
+            logger.debug(f"Could not probe {file}: {err}")
+            result = ProbeResult(file, error=err)
+        with self.condition:
+            self.finished_results[file] = result
+            self.condition.notify_all()
+        self.results.put(result)
+
+    @property
+    def finished(self) -> bool:
+        return self.cancelled.is_set() or self.received >= len(self.files)
+
+    def drain(self, timeout: float = 0.05) -> list[ProbeResult]:
+        """Results that came in since the last call, waiting up to timeout for the first one"""
+        results = []
+        try:
+            results.append(self.results.get(timeout=timeout))
+            while True:
+                results.append(self.results.get_nowait())
+        except Empty:
+            pass
+        self.received += len(results)
+        return results
+
+    def result(self, file: Path, timeout: Optional[float] = None) -> Optional[ProbeResult]:
+        """Wait for one particular file, None if it isn't done within the timeout or the pool was cancelled"""
+        with self.condition:
+            self.condition.wait_for(lambda: file in self.finished_results or self.cancelled.is_set(), timeout=timeout)
+            return self.finished_results.get(file)
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.condition:
+            self.condition.notify_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from typing import Optional
+
+__all__ = ["progress_args", "ProgressEvent", "ProgressParser"]
+
+# Global ffmpeg option adding key=value progress blocks on stderr. The human "frame= ..." stats line is still
+# written for the logs, is_progress_line tells the two apart.
+progress_args = ["-progress", "pipe:2"]
+
+progress_keys = {
+    "frame",
+    "fps",
+    "bitrate",
+    "total_size",
+    "out_time_us",
+    "out_time_ms",
+    "out_time",
+    "dup_frames",
+    "drop_frames",
+    "speed",
+    "progress",
+}
+
+
+@dataclass
+class ProgressEvent:
+    """One complete ffmpeg -progress report, sent from the conversion worker to the GUI instead of raw log text"""
+
+    video_uuid: str = ""
+    command_uuid: str = ""
+    frame: int = 0
+    fps: float = 0.0
+    out_time_us: int = 0
+    bitrate: Optional[float] = None  # kbit/s
+    speed: Optional[float] = None
+    total_size: int = 0  # bytes
+    finished: bool = False
+
+    @property
+    def out_time(self) -> float:
+        return self.out_time_us / 1_000_000
+
+    def summary(self) -> str:
+        bitrate = f"{self.bitrate:.1f}kbits/s" if self.bitrate is not None else "N/A"
+        speed = f"{self.speed:.3g}x" if self.speed is not None else "N/A"
+        return (
+            f"frame={self.frame} fps={self.fps:.2f} size={self.total_size // 1024}KiB "
+            f"time={self.out_time:.2f}s bitrate={bitrate} speed={speed}"
+        )
+
+
+def _number(value: str, cast=float, strip: str = ""):
+    value = value.strip().removesuffix(strip)
+    if not value or value == "N/A":
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        return None
+
+
+class ProgressParser:
+    """Collects the key=value lines ffmpeg writes with -progress and builds an event when each block ends"""
+
+    def __init__(self, video_uuid: str = "", command_uuid: str = ""):
+        self.video_uuid = video_uuid
+        self.command_uuid = command_uuid
+        self.values = {}
+        self.latest: Optional[ProgressEvent] = None
+
+    @staticmethod
+    def is_progress_line(line: str) -> bool:
+        key, sep, value = line.strip().partition("=")
+        if not sep or " " in value:
+            return False
+        return key in progress_keys or (key.startswith("stream_") and key.endswith("_q"))
+
+    def feed(self, line: str) -> Optional[ProgressEvent]:
+        """Store a progress line, returning the finished event on the final "progress=" line of a block"""
+        key, _, value = line.strip().partition("=")
+        if key != "progress":
+            self.values[key] = value
+            return None
+        values, self.values = self.values, {}
+        self.latest = ProgressEvent(
+            video_uuid=self.video_uuid,
+            command_uuid=self.command_uuid,
+            frame=_number(values.get("frame", ""), int) or 0,
+            fps=_number(values.get("fps", "")) or 0.0,
+            out_time_us=max(_number(values.get("out_time_us", ""), int) or 0, 0),
+            bitrate=_number(values.get("bitrate", ""), strip="kbits/s"),
+            speed=_number(values.get("speed", ""), strip="x"),
+            total_size=_number(values.get("total_size", ""), int) or 0,
+            finished=value == "end",
+        )
+        return self.latest
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import logging
+from dataclasses import dataclass
+from typing import List
+
+import psutil
+
+from fastflix.models.config import Config
+from fastflix.models.video import Video
+
+__all__ = ["ResourceEstimate", "ResourceScheduler", "estimate_resources", "job_thread_budget", "slot_cpu_sets"]
+
+logger = logging.getLogger("fastflix")
+
+# Cores and MiB of memory a software encoder uses for 1080p at its default preset
+software_encoders = {
+    "HEVC (x265)": (6, 1500),
+    "AVC (x264)": (4, 800),
+    "AV1 (SVT AV1)": (8, 2500),
+    "AVIF (SVT AV1)": (4, 1000),
+    "AV1 (AOM)": (4, 2000),
+    "AV1 (rav1e)": (4, 1500),
+    "VP9": (3, 800),
+    "VVC": (8, 4000),
+}
+
+# Encoders that run on a GPU / media engine, each job takes one encode session and little CPU
+hardware_encoder_markers = ("NVENC", "NVEncC", "QSVEncC", "VCEEncC", "VAAPI", "Video Toolbox")
+
+# Image and stream copy jobs that barely register
+light_encoders = ("GIF", "GIF (gifski)", "WebP", "Copy", "Modify")
+
+named_presets = {
+    "ultrafast": 0.5,
+    "superfast": 0.6,
+    "veryfast": 0.7,
+    "faster": 0.8,
+    "fast": 0.9,
+    "medium": 1.0,
+    "slow": 1.1,
+    "slower": 1.2,
+    "veryslow": 1.3,
+    "placebo": 1.3,
+}
+
+# Slack allowed on the CPU budget, so a cheap job can still start next to one that claimed most of the cores
+cpu_overcommit = 1.0
+
+
+@dataclass
+class ResourceEstimate:
+    cpu: float = 0.0  # cores
+    memory: int = 0  # MiB
+    gpu_sessions: int = 0
+
+    def __add__(self, other: "ResourceEstimate") -> "ResourceEstimate":
+        return ResourceEstimate(
+            cpu=self.cpu + other.cpu,
+            memory=self.memory + other.memory,
+            gpu_sessions=self.gpu_sessions + other.gpu_sessions,
+        )
+
+    def __sub__(self, other: "ResourceEstimate") -> "ResourceEstimate":
+        return ResourceEstimate(
+            cpu=self.cpu - other.cpu,
+            memory=self.memory - other.memory,
+            gpu_sessions=self.gpu_sessions - other.gpu_sessions,
+        )
+
+    def fits(self, needed: "ResourceEstimate") -> bool:
+        """If the needed resources fit in this (free) budget"""
+        return (
+            needed.cpu <= self.cpu + cpu_overcommit
+            and needed.memory <= self.memory
+            and needed.gpu_sessions <= self.gpu_sessions
+        )
+
+
+def preset_weight(encoder_settings) -> float:
+    """Slower presets keep more threads busy for longer, faster ones tend to bottleneck on a few"""
+    preset = str(getattr(encoder_settings, "preset", "") or "").lower()
+    if preset in named_presets:
+        return named_presets[preset]
+    # SVT AV1, rav1e and VP9 "speed" and AOM "cpu_used" go from slow (0) to fast (8-13)
+    for field, fastest in (("speed", 13), ("cpu_used", 8)):
+        try:
+            speed = int(getattr(encoder_settings, field))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if speed < 0:
+            return 1.0
+        return 1.3 - 0.8 * min(speed, fastest) / fastest
+    return 1.0
+
+
+def estimate_resources(video: Video) -> ResourceEstimate:
+    """Rough resources a queued video will need while encoding, based on its encoder, resolution and preset"""
+    encoder_settings = video.video_settings.video_encoder_settings
+    name = getattr(encoder_settings, "name", "")
+    if name in light_encoders:
+        return ResourceEstimate(cpu=0.5, memory=300)
+    if any(marker in name for marker in hardware_encoder_markers):
+        return ResourceEstimate(cpu=0.5, memory=500, gpu_sessions=1)
+
+    cores, memory = software_encoders.get(name, (4, 1000))
+    try:
+        pixels = video.width * video.height
+    except Exception:
+        pixels = 0
+    scale = min(max(pixels / (1920 * 1080), 0.25), 4) if pixels else 1
+    total_cores = psutil.cpu_count() or 1
+    return ResourceEstimate(
+        cpu=round(min(cores * scale * preset_weight(encoder_settings), total_cores), 1),
+        memory=int(memory * scale),
+    )
+
+
+class ResourceScheduler:
+    """
+    Decides which ready queue items can start now. Every running item claims its estimated resources,
+    new items are only admitted while the CPU, memory and GPU session budgets still have room for them,
+    with the live system load from psutil taking the place of our estimates when it is higher.
+    """
+
+    def __init__(self, config: Config, memory_reserve: int = 1024):
+        self.config = config
+        self.memory_reserve = memory_reserve  # MiB always left for the rest of the system
+        psutil.cpu_percent(interval=None)  # First call only sets the baseline
+
+    def free_resources(self, running: List[Video]) -> ResourceEstimate:
+        claimed = sum((estimate_resources(video) for video in running), ResourceEstimate())
+
+        cores = psutil.cpu_count() or 1
+        busy = psutil.cpu_percent(interval=None) / 100 * cores
+        memory = psutil.virtual_memory()
+        return ResourceEstimate(
+            cpu=cores - max(claimed.cpu, busy),
+            memory=min(memory.available // 2**20, memory.total // 2**20 - claimed.memory) - self.memory_reserve,
+            gpu_sessions=self.config.gpu_encode_sessions - claimed.gpu_sessions,
+        )
+
+    def admit(self, ready: List[Video], running: List[Video]) -> List[Video]:
+        """Ready videos that can start now, in queue order, skipping any that don't fit yet"""
+        free_jobs = max(1, self.config.concurrent_encodes) - len(running)
+        if free_jobs <= 0 or not ready:
+            return []
+
+        free = self.free_resources(running)
+        admitted = []
+        for video in ready:
+            if len(admitted) >= free_jobs:
+                break
+            needed = estimate_resources(video)
+            # Something always has to run, even if it is bigger than the whole budget
+            if not running and not admitted:
+                admitted.append(video)
+            elif free.fits(needed):
+                admitted.append(video)
+            else:
+                logger.debug(f"Holding back video {video.uuid}, needs {needed}, free {free}")
+                continue
+            free = free - needed
+        return admitted
+
+
+def usable_cores() -> List[int]:
+    """Logical CPUs this process may run on"""
+    try:
+        return sorted(psutil.Process().cpu_affinity())
+    except (AttributeError, psutil.Error, OSError):
+        # cpu_affinity is not available on macOS
+        return list(range(psutil.cpu_count() or 1))
+
+
+def slot_cpu_sets(slots: int) -> List[List[int]]:
+    """
+    Split the usable cores into one contiguous set per worker slot, so concurrent encodes each get their own
+    cores instead of all of them fighting over every core. Empty when there is nothing worth pinning.
+    """
+    cores = usable_cores()
+    if slots <= 1 or slots > len(cores):
+        return []
+    size = len(cores) // slots
+    cpu_sets = [cores[i * size : (i + 1) * size] for i in range(slots)]
+    for i, core in enumerate(cores[size * slots :]):
+        cpu_sets[i].append(core)
+    return cpu_sets
+
+
+def job_thread_budget(config: Config) -> int:
+    """Threads each encode should use when several run at once, 0 to let the encoder decide for itself"""
+    if not config or config.concurrent_encodes <= 1:
+        return 0
+    return max(1, len(usable_cores()) // config.concurrent_encodes)
@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+Encode telemetry, a SQLite record of every command the conversion worker runs.
+
+The worker keeps a JobRecorder per running command, which samples the latest ffmpeg progress and the process
+CPU / memory use every few seconds, and writes one row plus the downsampled samples to the store when the
+command ends. The query side (queue panel, `fastflix telemetry`) opens the same database read only.
+Nothing here may import PySide6.
+"""
+
+import argparse
+import json
+import logging
+import shlex
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import psutil
+from platformdirs import user_data_dir
+
+from fastflix.models.video import Video
+from fastflix.progress import ProgressEvent
+
+__all__ = ["EtaPredictor", "JobRecorder", "TelemetryStore", "job_details", "run_telemetry_cli", "telemetry_path"]
+
+logger = logging.getLogger("fastflix-core")
+
+telemetry_path = Path(user_data_dir("FastFlix", appauthor=False, roaming=True)) / "telemetry.sqlite"
+
+# Seconds between samples, doubled every time a job fills max_samples so long encodes stay small
+sample_interval = 5.0
+max_samples = 720
+
+schema = """
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_uuid TEXT,
+    command_uuid TEXT,
+    name TEXT,
+    encoder TEXT,
+    preset TEXT,
+    quality TEXT,
+    profile TEXT,
+    width INTEGER,
+    height INTEGER,
+    frame_rate REAL,
+    duration REAL,
+    commands INTEGER,
+    started REAL,
+    wall_time REAL,
+    frames INTEGER,
+    avg_fps REAL,
+    peak_fps REAL,
+    speed REAL,
+    output_size INTEGER,
+    avg_cpu REAL,
+    peak_memory INTEGER,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS commands_encoder ON commands (encoder, preset);
+CREATE INDEX IF NOT EXISTS commands_video ON commands (video_uuid);
+CREATE TABLE IF NOT EXISTS samples (
+    command_id INTEGER REFERENCES commands (id) ON DELETE CASCADE,
+    elapsed REAL,
+    frame INTEGER,
+    fps REAL,
+    speed REAL,
+    out_time REAL,
+    cpu REAL,
+    memory INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_command ON samples (command_id);
+"""
+
+
+def parse_frame_rate(value) -> float:
+    """ffprobe style "24000/1001" or plain number frame rates, 0 if unknown"""
+    try:
+        if isinstance(value, str) and "/" in value:
+            over, under = value.split("/", 1)
+            return float(over) / float(under) if float(under) else 0.0
+        return float(value or 0)
+    except ValueError:
+        return 0.0
+
+
+def first_setting(encoder_settings, options: tuple[str, ...]) -> str:
+    for option in options:
+        if value := getattr(encoder_settings, option, None):
+            return str(value)
+    return ""
+
+
+def job_details(video: Video, profile: str = "") -> dict:
+    """What the worker can't tell from a command line alone, sent along with every execute request"""
+    settings = video.video_settings
+    encoder_settings = settings.video_encoder_settings
+    try:
+        width, height, frame_rate = video.width, video.height, settings.output_fps or video.frame_rate
+    except Exception:
+        width, height, frame_rate = 0, 0, 0
+    return {
+        "encoder": getattr(encoder_settings, "name", ""),
+        "preset": first_setting(encoder_settings, ("preset", "speed", "cpu_used")),
+        "quality": first_setting(encoder_settings, ("crf", "qp", "cqp", "q", "quality", "bitrate")),
+        "profile": profile,
+        "width": width,
+        "height": height,
+        "frame_rate": round(parse_frame_rate(frame_rate), 3),
+        "duration": float((settings.end_time or video.duration or 0) - (settings.start_time or 0)),
+        "commands": len(settings.conversion_commands),
+        "output": str(settings.output_path or ""),
+    }
+
+
+def command_output(command: Union[list, str, None]) -> str:
+    """The file a command writes, its last argument, blank when that can't be a file (pipes, null outputs)"""
+    if isinstance(command, str):
+        try:
+            command = shlex.split(command)
+        except ValueError:
+            return ""
+    if not command:
+        return ""
+    output = str(command[-1]).strip("'\"")
+    if output in ("-", "NUL", "/dev/null") or output.startswith("-"):
+        return ""
+    return output
+
+
+class JobRecorder:
+    """Collects the telemetry of one running command"""
+
+    def __init__(
+        self,
+        video_uuid: str,
+        command_uuid: str,
+        name: str = "",
+        details: Optional[dict] = None,
+        command: Union[list, str, None] = None,
+    ):
+        self.video_uuid = video_uuid
+        self.command_uuid = command_uuid
+        self.name = name
+        self.details = details or {}
+        self.output = command_output(command)
+        self.started = time.time()
+        self.started_monotonic = time.monotonic()
+        self.interval = sample_interval
+        self.last_sample = None
+        self.samples: list[tuple] = []
+        self.peak_fps = 0.0
+        self.peak_memory = 0
+        self.cpu_total = 0.0
+        self.cpu_count = 0
+        self.event: Optional[ProgressEvent] = None
+        self.processes: dict[int, psutil.Process] = {}
+
+    def process_usage(self, process) -> tuple[float, int]:
+        """CPU percent and resident memory of the command and anything it started (shell commands)"""
+        if process is None:
+            return 0.0, 0
+        cpu, memory = 0.0, 0
+        try:
+            current = [process, *process.children(recursive=True)]
+        except psutil.Error:
+            return 0.0, 0
+        for proc in current:
+            # Keep the same Process objects around, cpu_percent compares against the previous call
+            proc = self.processes.setdefault(proc.pid, proc)
+            try:
+                cpu += proc.cpu_percent(interval=None)
+                memory += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return cpu, memory
+
+    def sample(self, process, event: Optional[ProgressEvent]):
+        now = time.monotonic()
+        if self.last_sample and now - self.last_sample[0] < self.interval:
+            return
+        cpu, memory = self.process_usage(process)
+        if event:
+            self.event = event
+        frame = self.event.frame if self.event else 0
+        if self.last_sample and now > self.last_sample[0]:
+            self.peak_fps = max(self.peak_fps, (frame - self.last_sample[1]) / (now - self.last_sample[0]))
+        self.last_sample = (now, frame)
+        self.peak_memory = max(self.peak_memory, memory)
+        if self.samples or cpu:
+            # The very first cpu_percent reading of a process is always 0
+            self.cpu_total += cpu
+            self.cpu_count += 1
+        self.samples.append(
+            (
+                round(now - self.started_monotonic, 2),
+                frame,
+                self.event.fps if self.event else 0.0,
+                self.event.speed if self.event else None,
+                self.event.out_time if self.event else 0.0,
+                round(cpu, 1),
+                memory,
+            )
+        )
+        if len(self.samples) >= max_samples:
+            self.samples = self.samples[::2]
+            self.interval *= 2
+
+    def result(self, status: str) -> dict:
+        wall_time = time.monotonic() - self.started_monotonic
+        frames = self.event.frame if self.event else 0
+        # What FFmpeg reported writing is this command's own output (a chunk, a first pass to null).
+        # Only the command that writes the final output, and finished doing so, can be measured on disk.
+        output_size = self.event.total_size if self.event else 0
+        final_output = self.details.get("output")
+        if status == "complete" and final_output and self.output and Path(self.output) == Path(final_output):
+            try:
+                output_size = Path(final_output).stat().st_size
+            except OSError:
+                pass
+        return {
+            "video_uuid": self.video_uuid,
+            "command_uuid": self.command_uuid,
+            "name": self.name,
+            "encoder": self.details.get("encoder", ""),
+            "preset": self.details.get("preset", ""),
+            "quality": self.details.get("quality", ""),
+            "profile": self.details.get("profile", ""),
+            "width": self.details.get("width", 0),
+            "height": self.details.get("height", 0),
+            "frame_rate": self.details.get("frame_rate", 0),
+            "duration": self.details.get("duration", 0),
+            "commands": self.details.get("commands", 0),
+            "started": self.started,
+            "wall_time": round(wall_time, 2),
+            "frames": frames,
+            "avg_fps": round(frames / wall_time, 2) if wall_time else 0,
+            "peak_fps": round(self.peak_fps, 2),
+            "speed": self.event.speed if self.event else None,
+            "output_size": output_size,
+            "avg_cpu": round(self.cpu_total / self.cpu_count, 1) if self.cpu_count else 0,
+            "peak_memory": self.peak_memory,
+            "status": status,
+        }
+
+
+class TelemetryStore:
+    def __init__(self, path: Optional[Path] = None, read_only: bool = False):
+        self.path = Path(path or telemetry_path)
+        if read_only:
+            self.connection = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript(schema)
+        self.connection.row_factory = sqlite3.Row
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, recorder: JobRecorder, status: str) -> int:
+        row = recorder.result(status)
+        with self.connection:
+            cursor = self.connection.execute(
+                f"INSERT INTO commands ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", list(row.values())
+            )
+            self.connection.executemany(
+                "INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(cursor.lastrowid, *sample) for sample in recorder.samples],
+            )
+        return cursor.lastrowid
+
+    def history(self, encoder: str = "", profile: str = "", limit: int = 50) -> list[dict]:
+        """Most recent commands, newest first"""
+        query, params = "SELECT * FROM commands", []
+        filters = []
+        if encoder:
+            filters.append("encoder = ?")
+            params.append(encoder)
+        if profile:
+            filters.append("profile = ?")
+            params.append(profile)
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        query += " ORDER BY started DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+    def throughput(self, encoder: str = "") -> list[dict]:
+        """Average throughput of the successful commands per encoder and preset, busiest first"""
+        query = (
+            "SELECT encoder, preset, COUNT(*) AS jobs, AVG(avg_fps) AS avg_fps, MAX(peak_fps) AS peak_fps, "
+            "AVG(speed) AS speed, AVG(wall_time) AS wall_time, SUM(wall_time) AS total_time, "
+            "AVG(avg_cpu) AS avg_cpu, MAX(peak_memory) AS peak_memory "
+            "FROM commands WHERE status = 'complete' AND frames > 0"
+        )
+        params = []
+        if encoder:
+            query += " AND encoder = ?"
+            params.append(encoder)
+        query += " GROUP BY encoder, preset ORDER BY jobs DESC"
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+    def video_runs(self, limit: int = 2000) -> list[dict]:
+        """
+        Whole videos whose every command completed, newest first. Elapsed is the wall time from the first
+        command starting to the last one ending, or the summed command times if the video was resumed later.
+        """
+        query = (
+            "SELECT video_uuid, MAX(encoder) AS encoder, MAX(preset) AS preset, MAX(quality) AS quality, "
+            "MAX(width) AS width, MAX(height) AS height, MAX(frame_rate) AS frame_rate, MAX(duration) AS duration, "
+            "MIN(SUM(wall_time), MAX(started + wall_time) - MIN(started)) AS elapsed, MAX(started) AS finished "
+            "FROM commands WHERE status = 'complete' GROUP BY video_uuid "
+            "HAVING COUNT(DISTINCT command_uuid) >= MAX(commands) AND MAX(duration) > 0 "
+            "ORDER BY finished DESC LIMIT ?"
+        )
+        return [dict(row) for row in self.connection.execute(query, (limit,))]
+
+    def samples(self, command_id: int) -> list[dict]:
+        return [
+            dict(row)
+            for row in self.connection.execute(
+                "SELECT elapsed, frame, fps, speed, out_time, cpu, memory FROM samples WHERE command_id = ? "
+                "ORDER BY elapsed",
+                (command_id,),
+            )
+        ]
+
+
+standard_heights = (480, 576, 720, 1080, 1440, 2160, 4320)
+
+
+def work_units(details: dict) -> float:
+    """Pixels to encode, guessing 1080p at 25 fps for whatever the details don't say"""
+    pixels = (details.get("width") or 0) * (details.get("height") or 0) or 1920 * 1080
+    return (details.get("duration") or 0) * (details.get("frame_rate") or 25) * pixels
+
+
+def match_keys(details: dict) -> list[tuple]:
+    """From the most to the least specific, the runs a video can be compared to"""
+    encoder, preset, quality = details.get("encoder", ""), details.get("preset", ""), details.get("quality", "")
+    height = min(standard_heights, key=lambda standard: abs(standard - (details.get("height") or 1080)))
+    return [
+        (encoder, preset, quality, height, round(details.get("frame_rate") or 0)),
+        (encoder, preset, quality),
+        (encoder, preset),
+        (encoder,),
+    ]
+
+
+class EtaPredictor:
+    """
+    Predicts the wall time a queued video will take from the recorded runs of similar videos. Runs are
+    compared by their cost, wall seconds per encoded pixel, so a 4K encode can be predicted from 1080p ones
+    of the same encoder and preset. With no history at all, the live speed of a running encode with the same
+    settings is used instead, or else the time a short sample encode of the video took (see add_sample).
+    """
+
+    recent_runs = 15
+
+    def __init__(self, runs: Optional[list[dict]] = None):
+        self.history: dict[tuple, list[float]] = {}
+        self.live: dict[tuple, dict[str, float]] = {}
+        self.samples: dict[tuple, dict[str, float]] = {}
+        # Goes up whenever predictions may have changed, so callers know when to stop reusing theirs
+        self.generation = 0
+        for run in runs or []:
+            self.add_run(run)
+
+    def refresh(self, path: Optional[Path] = None):
+        """Reload the finished runs from the telemetry store, after another video completed"""
+        path = Path(path or telemetry_path)
+        if not path.exists():
+            return
+        try:
+            store = TelemetryStore(path, read_only=True)
+        except sqlite3.Error:
+            logger.exception("Could not open the encode telemetry store")
+            return
+        try:
+            runs = store.video_runs()
+        except sqlite3.Error:
+            logger.exception("Could not read encode history")
+            return
+        finally:
+            store.close()
+        self.history = {}
+        for run in runs:
+            self.add_run(run)
+        self.generation += 1
+
+    def add_run(self, run: dict):
+        """Runs are expected newest first, only the most recent few of each kind are kept"""
+        units = work_units(run)
+        if not units or not run.get("elapsed"):
+            return
+        for key in match_keys(run):
+            costs = self.history.setdefault(key, [])
+            if len(costs) < self.recent_runs:
+                costs.append(run["elapsed"] / units)
+
+    def observe(self, video: Video, speed: Optional[float]):
+        """Live speed (media seconds per second) of a running command of this video"""
+        if not speed or speed <= 0:
+            return
+        details = job_details(video)
+        details["duration"] = 1
+        units = work_units(details)
+        for key in match_keys(details):
+            samples = self.live.setdefault(key, {})
+            if video.uuid not in samples:
+                self.generation += 1
+            samples[video.uuid] = 1 / speed / units
+
+    def add_sample(self, video: Video, elapsed: float, duration: float):
+        """Wall seconds a sample encode of duration seconds of the video took"""
+        details = job_details(video)
+        details["duration"] = duration
+        units = work_units(details)
+        if not units or elapsed <= 0:
+            return
+        for key in match_keys(details):
+            self.samples.setdefault(key, {})[video.uuid] = elapsed / units
+        self.generation += 1
+
+    def predict(self, video: Video) -> Optional[float]:
+        """Predicted wall seconds to encode the video, None when there is nothing to go by"""
+        details = job_details(video)
+        units = work_units(details)
+        if not units:
+            return None
+        for source in (self.history, self.live, self.samples):
+            for key in match_keys(details):
+                if costs := source.get(key):
+                    return statistics.median(costs if isinstance(costs, list) else costs.values()) * units
+        return None
+
+    def queue_eta(
+        self, videos: list[Video], slots: int = 1, predict: Optional[Callable[[Video], Optional[float]]] = None
+    ) -> tuple[float, int]:
+        """Predicted wall seconds for every video still ready to encode, and how many could not be predicted"""
+        predict = predict or self.predict
+        total, unknown = 0.0, 0
+        for video in videos:
+            if not video.status.ready:
+                continue
+            if (predicted := predict(video)) is None:
+                unknown += 1
+            else:
+                total += predicted
+        return total / max(1, slots), unknown
+
+
+def run_telemetry_cli(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="fastflix telemetry", description="Show encode throughput history")
+    parser.add_argument("--encoder", default="", help='only this encoder, e.g. "HEVC (x265)"')
+    parser.add_argument("--history", type=int, default=0, help="list this many recent commands instead")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    options = parser.parse_args(args)
+
+    if not telemetry_path.exists():
+        print("No encodes have been recorded yet")
+        return 0
+    store = TelemetryStore(read_only=True)
+    try:
+        if options.history:
+            rows = store.history(encoder=options.encoder, limit=options.history)
+            columns = ("encoder", "preset", "name", "wall_time", "avg_fps", "speed", "avg_cpu", "status")
+        else:
+            rows = store.throughput(encoder=options.encoder)
+            columns = ("encoder", "preset", "jobs", "avg_fps", "peak_fps", "speed", "avg_cpu", "total_time")
+    finally:
+        store.close()
+
+    if options.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    table = [columns] + [
+        tuple(f"{row[column]:.2f}" if isinstance(row[column], float) else str(row[column]) for column in columns)
+        for row in rows
+    ]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)))
+    return 0
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of rendered preview images.
+
+Stepping back and forth between slider positions, or turning a setting off and on again, asks for previews
+that were already made. Images are kept by the identity of the source file (path, size, modification
+time), the track, the time in the video and the exact filter string they were made with, so any change to
+one of those is a different image. The most recent ones stay in memory, the rest go to files under the
+work path that are dropped least recently used first once they add up to max_size bytes.
+"""
+
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Union
+
+from fastflix.probe_cache import ProbeCache
+
+__all__ = ["ThumbnailCache"]
+
+logger = logging.getLogger("fastflix")
+
+
+class ThumbnailCache:
+    # Bytes of images kept in memory on top of the ones on disk
+    memory_limit = 32 * 2**20
+
+    def __init__(self, path: Path, max_size: int):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.lock = Lock()
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_size = 0
+        self.disk_size: Optional[int] = None
+
+    @staticmethod
+    def key(source: Path, track: int, timestamp: Optional[float], filters: Union[list, str]) -> Optional[str]:
+        """None for sources that aren't a file on disk, which are never cached"""
+        identity = ProbeCache.key(source)
+        if not identity:
+            return None
+        filter_text = filters if isinstance(filters, str) else "\0".join(str(x) for x in filters)
+        image = f"{identity}\0{track}\0{float(timestamp or 0):.3f}\0{filter_text}"
+        return hashlib.sha256(image.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+    def file(self, key: str) -> Path:
+        return self.path / f"{key}.img"
+
+    def __contains__(self, key: Optional[str]) -> bool:
+        if not key or not self.max_size:
+            return False
+        with self.lock:
+            return key in self.memory or self.file(key).exists()
+
+    def get(self, key: Optional[str]) -> Optional[bytes]:
+        if not key or not self.max_size:
+            return None
+        file = self.file(key)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                data = self.memory[key]
+            else:
+                try:
+                    data = file.read_bytes()
+                except OSError:
+                    return None
+                self.remember(key, data)
+            try:
+                # The modification time is what the least recently used eviction goes by
+                os.utime(file)
+            except OSError:
+                pass
+            return data
+
+    def put(self, key: Optional[str], data: bytes):
+        if not key or not data or not self.max_size:
+            return
+        with self.lock:
+            self.remember(key, data)
+            file = self.file(key)
+            temp_file = file.with_suffix(".tmp")
+            try:
+                replaced = file.stat().st_size
+            except OSError:
+                replaced = 0
+            try:
+                self.path.mkdir(parents=True, exist_ok=True)
+                temp_file.write_bytes(data)
+                temp_file.replace(file)
+            except OSError:
+                logger.warning(f"Could not save preview to the thumbnail cache at {self.path}")
+                return
+            if self.disk_size is None:
+                self.disk_size = sum(entry.stat().st_size for entry in self.path.glob("*.img"))
+            else:
+                self.disk_size += len(data) - replaced
+            if self.disk_size > self.max_size:
+                self.evict()
+
+    def remember(self, key: str, data: bytes):
+        """Keep in memory, call with the lock held"""
+        if key in self.memory:
+            self.memory_size -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_limit and len(self.memory) > 1:
+            _, dropped = self.memory.popitem(last=False)
+            self.memory_size -= len(dropped)
+
+    def evict(self):
+        """Delete the least recently used files until there is a bit of room, call with the lock held"""
+        entries = []
+        for entry in self.path.glob("*.img"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+        self.disk_size = sum(size for _, size, _ in entries)
+        target = self.max_size * 0.9
+        for _, size, entry in entries:
+            if self.disk_size <= target:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            self.disk_size -= size
+            dropped = self.memory.pop(entry.stem, None)
+            if dropped is not None:
+                self.memory_size -= len(dropped)
+
+    def resize(self, max_size: int):
+        with self.lock:
+            self.max_size = max_size
+            if self.disk_size is None or self.disk_size > max_size:
+                self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_size = 0
+            for entry in self.path.glob("*.img"):
+                entry.unlink(missing_ok=True)
+            self.disk_size = 0
@@ -3,16 +3,28 @@
 import importlib.util
 import logging
 import os
+import time
+from collections import deque
+from dataclasses import dataclass
 from pathlib import Path
-from subprocess import PIPE, STDOUT, Popen, run, check_output
+from subprocess import DEVNULL, PIPE, STDOUT, Popen, run, check_output
+from threading import Condition, Event
+from typing import Optional, Union
 from packaging import version
 
-from PySide6 import QtCore
+import cv2
+import psutil
+from PySide6 import QtCore, QtGui
 from ffmpeg_normalize import FFmpegNormalize
 
+from fastflix.command_runner import priority_levels
+from fastflix.flix import generate_thumbnail_command
+from fastflix.frame_server import FrameServer, transform_frame
 from fastflix.language import t
 from fastflix.models.fastflix_app import FastFlixApp
 from fastflix.shared import clean_file_string
+from fastflix.telemetry import command_output
+from fastflix.thumbnail_cache import ThumbnailCache
 
 logger = logging.getLogger("fastflix")
 
@@ -30,34 +42,397 @@ def _format_command(command):
     return " ".join(parts)
 
 
-__all__ = ["ThumbnailCreator", "ExtractSubtitleSRT", "ExtractHDR10"]
+__all__ = [
+    "ThumbnailCreator",
+    "FramePreviewCreator",
+    "PreviewJob",
+    "ThumbnailPrefetcher",
+    "FilmstripCreator",
+    "frame_to_image",
+    "ExtractSubtitleSRT",
+    "ExtractHDR10",
+]
+
+
+@dataclass
+class PreviewJob:
+    """Everything it takes to make one preview image, transforms is None when only FFmpeg can make it"""
+
+    source: Path
+    track: int
+    video_stream: int
+    start_time: Optional[Union[float, int]]
+    filters: Union[list, str]
+    key: Optional[str]
+    transforms: Optional[dict] = None
 
 
 class ThumbnailCreator(QtCore.QThread):
-    def __init__(self, main, command=""):
+    """
+    Runs the FFmpeg command for one preview request and reads the image it writes to stdout.
+    The image goes to main.preview_frame_ready(request, image), failures to main.thumbnail_complete(request, status).
+    Cancelling kills the FFmpeg process and nothing is reported.
+    """
+
+    def __init__(self, main, command="", cache: ThumbnailCache = None, key: str = None, request: int = 0):
         super().__init__(main)
         self.main = main
         self.command = command
+        self.cache = cache
+        self.key = key
+        self.request = request
+        self.cancelled = Event()
+        self.process = None
+
+    def cancel(self):
+        self.cancelled.set()
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
 
     def run(self):
         self.main.thread_logging_signal.emit(f"DEBUG:{t('Generating thumbnail')}: {_format_command(self.command)}")
-        result = run(self.command, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        if result.returncode > 0:
-            if "No such filter: 'zscale'" in result.stdout.decode(encoding="utf-8", errors="ignore"):
+        self.process = Popen(self.command, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        if self.cancelled.is_set():
+            self.process.kill()
+        data, output = self.process.communicate()
+        if self.cancelled.is_set():
+            return
+        image = QtGui.QImage.fromData(data) if self.process.returncode == 0 and data else QtGui.QImage()
+        if image.isNull():
+            if "No such filter: 'zscale'" in output.decode(encoding="utf-8", errors="ignore"):
                 self.main.thread_logging_signal.emit(
                     "ERROR:Could not generate thumbnail because you are using an outdated FFmpeg! "
                     "Please use FFmpeg 4.3+ built against the latest zimg libraries. "
                     "Static builds available at https://ffmpeg.org/download.html "
                 )
-            if "OpenCL mapping not usable" in result.stdout.decode(encoding="utf-8", errors="ignore"):
+            if "OpenCL mapping not usable" in output.decode(encoding="utf-8", errors="ignore"):
                 self.main.thread_logging_signal.emit("ERROR trying to use OpenCL for thumbnail generation")
-                self.main.thumbnail_complete.emit(2)
+                self.main.thumbnail_complete.emit(self.request, 2)
             else:
-                self.main.thread_logging_signal.emit(f"ERROR:{t('Could not generate thumbnail')}: {result.stdout}")
+                self.main.thread_logging_signal.emit(f"ERROR:{t('Could not generate thumbnail')}: {output}")
 
-            self.main.thumbnail_complete.emit(0)
+            self.main.thumbnail_complete.emit(self.request, 0)
         else:
-            self.main.thumbnail_complete.emit(1)
+            if self.cache is not None and self.key:
+                self.cache.put(self.key, data)
+            self.main.preview_frame_ready.emit(self.request, image)
+
+
+def frame_to_image(frame) -> QtGui.QImage:
+    """QImage of a BGR frame from the frame server, copied so it no longer needs the array"""
+    height, width = frame.shape[:2]
+    return QtGui.QImage(frame.data, width, height, frame.strides[0], QtGui.QImage.Format_BGR888).copy()
+
+
+class FramePreviewCreator(QtCore.QThread):
+    """Same job as ThumbnailCreator for previews the frame server can make, without starting FFmpeg"""
+
+    def __init__(
+        self,
+        main,
+        server: FrameServer,
+        seconds: float,
+        transforms: dict,
+        cache: ThumbnailCache = None,
+        key: str = None,
+        request: int = 0,
+    ):
+        super().__init__(main)
+        self.main = main
+        self.server = server
+        self.seconds = seconds
+        self.transforms = transforms
+        self.cache = cache
+        self.key = key
+        self.request = request
+        self.cancelled = Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            frame = self.server.frame(self.seconds)
+            if self.cancelled.is_set():
+                return
+            if frame is None:
+                self.main.thread_logging_signal.emit(f"DEBUG:Frame server could not read {self.server.source}")
+                self.main.thumbnail_complete.emit(self.request, 3)
+                return
+            frame = transform_frame(frame, **self.transforms)
+            if self.cache is not None and self.key:
+                success, encoded = cv2.imencode(".jpg", frame)
+                if success:
+                    self.cache.put(self.key, encoded.tobytes())
+            if not self.cancelled.is_set():
+                self.main.preview_frame_ready.emit(self.request, frame_to_image(frame))
+        except Exception as err:
+            self.main.thread_logging_signal.emit(f"WARNING:Frame server preview failed: {err}")
+            self.main.thumbnail_complete.emit(self.request, 3)
+
+
+class ThumbnailPrefetcher(QtCore.QThread):
+    """
+    Makes the previews for the slider positions around the current one ahead of time and puts them
+    straight into the thumbnail cache, one at a time and at the lowest priority.
+    Cancelling kills the FFmpeg it is waiting on, if any.
+    """
+
+    def __init__(self, main, jobs: list[PreviewJob], cache: ThumbnailCache, config):
+        super().__init__(main)
+        self.jobs = jobs
+        self.cache = cache
+        self.config = config
+        self.cancelled = Event()
+        self.process = None
+
+    def cancel(self):
+        self.cancelled.set()
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def run(self):
+        server = None
+        try:
+            for job in self.jobs:
+                if self.cancelled.is_set():
+                    return
+                if job.key in self.cache:
+                    continue
+                data = None
+                if job.transforms is not None:
+                    if server is None:
+                        server = FrameServer(job.source, job.video_stream)
+                    data = self.frame_server_image(server, job)
+                if data is None:
+                    data = self.ffmpeg_image(job)
+                if data and not self.cancelled.is_set():
+                    self.cache.put(job.key, data)
+        except Exception:
+            logger.exception("Could not prefetch previews")
+        finally:
+            if server is not None:
+                server.close()
+
+    @staticmethod
+    def frame_server_image(server: FrameServer, job: PreviewJob) -> Optional[bytes]:
+        frame = server.frame(job.start_time or 0) if server.opened else None
+        if frame is None:
+            return None
+        success, encoded = cv2.imencode(".jpg", transform_frame(frame, **job.transforms))
+        return encoded.tobytes() if success else None
+
+    def ffmpeg_image(self, job: PreviewJob) -> Optional[bytes]:
+        command = generate_thumbnail_command(
+            config=self.config,
+            source=job.source,
+            filters=job.filters,
+            start_time=job.start_time,
+            input_track=job.track,
+        )
+        try:
+            self.process = Popen(command, stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+            try:
+                psutil.Process(self.process.pid).nice(priority_levels["Idle"])
+            except psutil.Error:
+                pass
+            if self.cancelled.is_set():
+                self.process.kill()
+            data, _ = self.process.communicate()
+            if self.process.returncode != 0 or self.cancelled.is_set():
+                return None
+            return data
+        except OSError:
+            return None
+        finally:
+            self.process = None
+
+
+class FilmstripCreator(QtCore.QThread):
+    """
+    Makes filmstrips one at a time from a queue of (key, command) jobs, putting them into the thumbnail cache
+    and emitting main.filmstrip_ready, with a null image on failure. Jobs that are discarded or cancelled while
+    their FFmpeg is running are killed and report nothing.
+    """
+
+    def __init__(self, main):
+        super().__init__(main)
+        self.main = main
+        self.jobs: deque[tuple[str, list[str], ThumbnailCache]] = deque()
+        self.current: Optional[str] = None
+        self.process = None
+        self.cancelled = Event()
+        self.condition = Condition()
+
+    def add(self, key: str, command: list[str], cache: ThumbnailCache, first: bool = False):
+        """Queue a filmstrip unless it is already being made, first moves it ahead of the others"""
+        with self.condition:
+            queued = any(job[0] == key for job in self.jobs)
+            if key == self.current or (queued and not first):
+                return
+            if queued:
+                self.jobs = deque(job for job in self.jobs if job[0] != key)
+            if first:
+                self.jobs.appendleft((key, command, cache))
+            else:
+                self.jobs.append((key, command, cache))
+            self.condition.notify()
+
+    def discard(self, key: Optional[str]):
+        with self.condition:
+            self.jobs = deque(job for job in self.jobs if job[0] != key)
+            if key is not None and key == self.current:
+                self.current = None
+                self.kill()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled.set()
+            self.jobs.clear()
+            self.current = None
+            self.kill()
+            self.condition.notify()
+
+    def kill(self):
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def next_job(self) -> Optional[tuple[str, list[str], ThumbnailCache]]:
+        with self.condition:
+            while not self.jobs and not self.cancelled.is_set():
+                self.condition.wait()
+            if self.cancelled.is_set():
+                return None
+            job = self.jobs.popleft()
+            self.current = job[0]
+            return job
+
+    def run(self):
+        while job := self.next_job():
+            key, command, cache = job
+            data = self.filmstrip(command)
+            with self.condition:
+                if self.current != key:
+                    continue
+                self.current = None
+            image = QtGui.QImage.fromData(data) if data else QtGui.QImage()
+            if not image.isNull():
+                cache.put(key, data)
+            self.main.filmstrip_ready.emit(key, image)
+
+    def filmstrip(self, command: list[str]) -> bytes:
+        logger.debug(f"Generating filmstrip: {_format_command(command)}")
+        try:
+            with self.condition:
+                process = self.process = Popen(command, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+                if self.current is None:
+                    process.kill()
+            data, error = process.communicate()
+        except OSError:
+            logger.exception("Could not run FFmpeg for the filmstrip")
+            return b""
+        finally:
+            self.process = None
+        if process.returncode != 0:
+            if self.current is not None:
+                logger.warning(f"Could not generate filmstrip: {error.decode('utf-8', errors='ignore')}")
+            return b""
+        return data
+
+
+class EtaSampler(QtCore.QThread):
+    """
+    Times short sample encodes of queued videos the encode history can't predict, one at a time, and emits
+    main.eta_sample_ready with the video's uuid, the wall seconds taken (0 on failure) and the seconds encoded.
+    The sample's files are removed afterwards. Clearing it drops the waiting samples and kills the running one.
+    """
+
+    def __init__(self, main):
+        super().__init__(main)
+        self.main = main
+        self.jobs: deque[tuple[tuple, str, list, float, Path]] = deque()
+        self.current: Optional[str] = None
+        self.current_key: Optional[tuple] = None
+        self.process = None
+        self.cancelled = Event()
+        self.condition = Condition()
+
+    def add(self, key: tuple, video_uuid: str, commands: list, duration: float, work_dir: Path):
+        """Queue a sample, unless one of a video with the same settings (key) is already waiting or running"""
+        with self.condition:
+            if key == self.current_key or any(job[0] == key for job in self.jobs):
+                return
+            self.jobs.append((key, video_uuid, commands, duration, work_dir))
+            self.condition.notify()
+
+    def clear(self):
+        with self.condition:
+            self.jobs.clear()
+            self.current = self.current_key = None
+            self.kill()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled.set()
+            self.condition.notify()
+        self.clear()
+
+    def kill(self):
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def next_job(self) -> Optional[tuple[tuple, str, list, float, Path]]:
+        with self.condition:
+            while not self.jobs and not self.cancelled.is_set():
+                self.condition.wait()
+            if self.cancelled.is_set():
+                return None
+            job = self.jobs.popleft()
+            self.current_key, self.current = job[0], job[1]
+            return job
+
+    def run(self):
+        while job := self.next_job():
+            _, video_uuid, commands, duration, work_dir = job
+            start = time.monotonic()
+            success = all(self.sample(video_uuid, command, work_dir) for command in commands)
+            elapsed = time.monotonic() - start
+            # Only ever what the sample wrote into the work directory
+            for command in commands:
+                output = Path(work_dir, command_output(command.command))
+                if output.is_relative_to(work_dir) and output.is_file():
+                    output.unlink()
+            with self.condition:
+                if self.current != video_uuid:
+                    continue
+                self.current = self.current_key = None
+            self.main.eta_sample_ready.emit(video_uuid, elapsed if success else 0.0, duration)
+
+    def sample(self, video_uuid: str, command, work_dir: Path) -> bool:
+        logger.debug(f"Sample encode: {command.to_string()}")
+        try:
+            work_dir.mkdir(parents=True, exist_ok=True)
+            with self.condition:
+                if self.current != video_uuid:
+                    return False
+                self.process = Popen(
+                    command.command if command.shell else command.to_list(),
+                    shell=command.shell,
+                    cwd=work_dir,
+                    stdin=PIPE,
+                    stdout=DEVNULL,
+                    stderr=DEVNULL,
+                )
+            return self.process.wait() == 0
+        except OSError:
+            logger.exception("Could not run the sample encode")
+            return False
+        finally:
+            self.process = None
 
 
 class ExtractSubtitleSRT(QtCore.QThread):
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import logging
+from pathlib import Path
+from typing import Optional
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from fastflix.language import t
+from fastflix.thumbnail_cache import ThumbnailCache
+from fastflix.ui_scale import scaler
+
+__all__ = ["Filmstrip", "filmstrip_cache_key", "filmstrip_frame", "filmstrip_frames"]
+
+logger = logging.getLogger("fastflix")
+
+# Evenly spaced frames in a filmstrip
+filmstrip_frames = 10
+
+
+def filmstrip_cache_key(source: Path, track: int) -> Optional[str]:
+    """Thumbnail cache key of the filmstrip for a source and track"""
+    return ThumbnailCache.key(source, track, None, f"filmstrip:{filmstrip_frames}")
+
+
+def filmstrip_frame(strip: QtGui.QImage, index: int, frames: int = filmstrip_frames) -> QtGui.QImage:
+    """One frame out of a filmstrip image"""
+    width = strip.width() // frames
+    index = max(0, min(index, frames - 1))
+    return strip.copy(index * width, 0, width, strip.height())
+
+
+class Filmstrip(QtWidgets.QLabel):
+    """Strip of frames across the whole video, clicking on it emits where in the video (0 to 1) was clicked"""
+
+    seek = QtCore.Signal(float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.strip: Optional[QtGui.QPixmap] = None
+        self.setAlignment(QtCore.Qt.AlignCenter)
+        self.setFixedHeight(scaler.scale(40))
+        self.setSizePolicy(QtWidgets.QSizePolicy.Policy.Ignored, QtWidgets.QSizePolicy.Policy.Fixed)
+        self.setCursor(QtGui.QCursor(QtCore.Qt.CursorShape.PointingHandCursor))
+        self.setToolTip(t("Click to preview that point in the video"))
+
+    def set_strip(self, image: QtGui.QImage):
+        self.strip = QtGui.QPixmap.fromImage(image) if not image.isNull() else None
+        self.update_scaled_strip()
+
+    def clear(self):
+        self.strip = None
+        super().clear()
+
+    def update_scaled_strip(self):
+        if self.strip is None:
+            super().clear()
+            return
+        self.setPixmap(
+            self.strip.scaled(
+                self.size(),
+                QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                QtCore.Qt.TransformationMode.SmoothTransformation,
+            )
+        )
+
+    def resizeEvent(self, event):
+        self.update_scaled_strip()
+        super().resizeEvent(event)
+
+    def mousePressEvent(self, event):
+        pixmap = self.pixmap()
+        if self.strip is None or pixmap.isNull():
+            return
+        left = (self.width() - pixmap.width()) / 2
+        position = (event.position().x() - left) / max(pixmap.width(), 1)
+        if 0 <= position <= 1:
+            self.seek.emit(position)
@@ -2,7 +2,6 @@
 # -*- coding: utf-8 -*-
 import datetime
 import logging
-import math
 import os
 import random
 import secrets
@@ -12,7 +11,7 @@ from collections import namedtuple
 from datetime import timedelta
 from pathlib import Path
 from queue import Empty
-from typing import Tuple, Union, Optional
+from typing import Optional, Tuple, Union
 
 import importlib.resources
 import reusables
@@ -21,23 +20,28 @@ from pydantic import ConfigDict, BaseModel, Field
 from PySide6 import QtCore, QtGui, QtWidgets
 
 from fastflix.encoders.common import helpers
+from fastflix.encoders.common.chunking import build_chunked, build_sample
 from fastflix.exceptions import FastFlixInternalException, FlixError
+from fastflix.ff_queue import execute_requests, pending_commands, save_queue_async
 from fastflix.ui_scale import scaler
 from fastflix.ui_constants import WIDTHS, HEIGHTS, ICONS
 from fastflix.ui_styles import ONYX_COLORS, get_onyx_combobox_style, get_onyx_button_style
+from fastflix.frame_server import FrameServer, can_serve, scaled_size
 from fastflix.flix import (
-    detect_hdr10_plus,
-    detect_interlaced,
+    analyze_video,
     extract_attachments,
+    generate_filmstrip_command,
     generate_thumbnail_command,
     get_auto_crop,
-    parse,
-    parse_hdr_details,
     get_concat_item,
 )
 from fastflix.language import t
 from fastflix.models.fastflix_app import FastFlixApp
 from fastflix.models.video import Status, Video, VideoSettings, Crop
+from fastflix.probe_pool import ProbePool
+from fastflix.scheduler import ResourceScheduler
+from fastflix.thumbnail_cache import ThumbnailCache
+from fastflix.telemetry import EtaPredictor, job_details, match_keys
 from fastflix.resources import (
     get_icon,
     group_box_style,
@@ -54,7 +58,15 @@ from fastflix.shared import (
     get_filesafe_datetime,
 )
 from fastflix.windows_tools import prevent_sleep_mode, allow_sleep_mode
-from fastflix.widgets.background_tasks import ThumbnailCreator
+from fastflix.widgets.background_tasks import (
+    EtaSampler,
+    FilmstripCreator,
+    FramePreviewCreator,
+    PreviewJob,
+    ThumbnailCreator,
+    ThumbnailPrefetcher,
+)
+from fastflix.widgets.filmstrip import Filmstrip, filmstrip_cache_key, filmstrip_frames
 from fastflix.widgets.progress_bar import ProgressBar, Task
 from fastflix.widgets.video_options import VideoOptions
 from fastflix.widgets.windows.large_preview import LargePreview
@@ -67,12 +79,17 @@ only_int = QtGui.QIntValidator()
 
 Request = namedtuple(
     "Request",
-    ["request", "video_uuid", "command_uuid", "command", "work_dir", "log_name", "shell"],
-    defaults=[None, None, None, None, None, False],
+    ["request", "video_uuid", "command_uuid", "command", "work_dir", "log_name", "shell", "details"],
+    defaults=[None, None, None, None, None, False, None],
 )
 
 Response = namedtuple("Response", ["status", "video_uuid", "command_uuid"])
 
+# Slider positions either side of the current one to have previews ready for
+preview_prefetch_steps = 3
+# How long settings have to stay the same before a preview that isn't cached is made
+preview_debounce_ms = 150
+
 resolutions = {
     t("Auto"): {"method": "auto"},
     t("Long Edge"): {"method": "long edge"},
@@ -131,6 +148,7 @@ class MainWidgets(BaseModel):
     chapters: QtWidgets.QCheckBox = None
     fast_time: QtWidgets.QComboBox = None
     preview: QtWidgets.QLabel = None
+    filmstrip: Filmstrip = None
     convert_to: QtWidgets.QComboBox = None
     convert_button: QtWidgets.QPushButton = None
     deinterlace: QtWidgets.QCheckBox = None
@@ -164,7 +182,10 @@ class MainWidgets(BaseModel):
 
 class Main(QtWidgets.QWidget):
     completed = QtCore.Signal(int)
-    thumbnail_complete = QtCore.Signal(int)
+    thumbnail_complete = QtCore.Signal(int, int)
+    preview_frame_ready = QtCore.Signal(int, QtGui.QImage)
+    filmstrip_ready = QtCore.Signal(str, QtGui.QImage)
+    eta_sample_ready = QtCore.Signal(str, float, float)
     close_event = QtCore.Signal()
     status_update_signal = QtCore.Signal(tuple)
     thread_logging_signal = QtCore.Signal(str)
@@ -180,13 +201,29 @@ class Main(QtWidgets.QWidget):
         self.loading_video = True
         self.scale_updating = False
         self.last_thumb_hash = ""
+        self.frame_server: Optional[FrameServer] = None
+        # Source and video stream pairs OpenCV failed to read, their previews always come from FFmpeg
+        self.ffmpeg_only_previews: set[tuple[Path, int]] = set()
+        self.prefetcher: Optional[ThumbnailPrefetcher] = None
         self.page_updating = False
         self.previous_encoder_no_audio = False
 
         self.large_preview = LargePreview(self)
 
+        self.stopped_on_error = False
+        self.scheduler = ResourceScheduler(self.app.fastflix.config)
+        self.eta_predictor = EtaPredictor()
+        self.eta_predictor.refresh()
+        # Sample encodes for what the history can't predict, only while nothing else is encoding
+        self.eta_sampler = EtaSampler(self)
+        self.eta_sampler.start(QtCore.QThread.LowPriority)
+
         self.notifier = Notifier(self, self.app, self.app.fastflix.status_queue)
         self.notifier.start()
+        self.app.fastflix.worker_queue.put(["concurrency", self.app.fastflix.config.concurrent_encodes])
+        self.app.fastflix.worker_queue.put(
+            ["watchdog", self.app.fastflix.config.stall_timeout, self.app.fastflix.config.stall_retries]
+        )
 
         self.input_defaults = Box(scale=None, crop=None)
         self.initial_duration = 0
@@ -254,7 +291,24 @@ class Main(QtWidgets.QWidget):
 
         self.buttons = []
 
-        self.thumb_file = Path(self.app.fastflix.config.work_path, "thumbnail_preview.jpg")
+        self.thumbnail_cache = ThumbnailCache(
+            Path(self.app.fastflix.config.work_path, "thumbnail_cache"),
+            self.app.fastflix.config.thumbnail_cache_size * 2**20,
+        )
+        # Filmstrips are made one at a time, the ones that failed this session are not tried again
+        self.filmstrip_worker = FilmstripCreator(self)
+        self.filmstrip_worker.start(QtCore.QThread.LowPriority)
+        self.failed_filmstrips: set[str] = set()
+        self.filmstrip_key: Optional[str] = None
+
+        # The one preview job slot, results of any earlier request number are thrown away
+        self.preview_request = 0
+        self.preview_worker: Optional[Union[ThumbnailCreator, FramePreviewCreator]] = None
+        self.pending_preview: Optional[PreviewJob] = None
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(preview_debounce_ms)
+        self.preview_timer.timeout.connect(self.start_preview_job)
 
         self.video_options = VideoOptions(
             self,
@@ -266,6 +320,9 @@ class Main(QtWidgets.QWidget):
         # self.cancelled.connect(self.conversion_cancelled)
         self.close_event.connect(self.close)
         self.thumbnail_complete.connect(self.thumbnail_generated)
+        self.preview_frame_ready.connect(self.preview_frame_generated)
+        self.filmstrip_ready.connect(self.filmstrip_generated)
+        self.eta_sample_ready.connect(self.eta_sample_generated)
         self.status_update_signal.connect(self.status_update)
         self.thread_logging_signal.connect(self.thread_logger)
         self.encoding_worker = None
@@ -531,7 +588,14 @@ class Main(QtWidgets.QWidget):
             logger.info("Resuming FFmpeg conversion")
 
     def config_update(self):
-        self.thumb_file = Path(self.app.fastflix.config.work_path, "thumbnail_preview.jpg")
+        self.app.fastflix.worker_queue.put(["concurrency", self.app.fastflix.config.concurrent_encodes])
+        self.app.fastflix.worker_queue.put(
+            ["watchdog", self.app.fastflix.config.stall_timeout, self.app.fastflix.config.stall_retries]
+        )
+        cache_path = Path(self.app.fastflix.config.work_path, "thumbnail_cache")
+        if self.thumbnail_cache.path != cache_path:
+            self.thumbnail_cache = ThumbnailCache(cache_path, 0)
+        self.thumbnail_cache.resize(self.app.fastflix.config.thumbnail_cache_size * 2**20)
         self.change_output_types()
         self.page_update(build_thumbnail=True)
 
@@ -1377,6 +1441,11 @@ class Main(QtWidgets.QWidget):
         self.widgets.preview = PreviewImage(self)
         container_layout.addWidget(self.widgets.preview)
 
+        self.widgets.filmstrip = Filmstrip()
+        self.widgets.filmstrip.seek.connect(self.filmstrip_seek)
+        self.widgets.filmstrip.hide()
+        container_layout.addWidget(self.widgets.filmstrip)
+
         # Create the slider overlay and position it at the bottom
         self.thumb_time_overlay = self.init_thumb_time_selector()
         self.thumb_time_overlay.setParent(self.preview_container)
@@ -1409,9 +1478,10 @@ class Main(QtWidgets.QWidget):
             container_rect = self.preview_container.rect()
             overlay_height = self.thumb_time_overlay.height()
             margin = scaler.scale(15)
+            strip_height = self.widgets.filmstrip.height() if not self.widgets.filmstrip.isHidden() else 0
             self.thumb_time_overlay.setGeometry(
                 margin,
-                container_rect.height() - overlay_height - margin,
+                container_rect.height() - strip_height - overlay_height - margin,
                 container_rect.width() - (2 * margin),
                 overlay_height,
             )
@@ -1503,23 +1573,28 @@ class Main(QtWidgets.QWidget):
                 nonlocal stop
                 stop = True
 
-            stop_signal.connect(stop_me)
-
             total_items = len(paths)
-            for i, path in enumerate(paths):
-                if stop:
-                    return
-                self.input_video = path
-                self.source_video_path_widget.setText(str(self.input_video))
-                self.video_path_widget.setText(str(self.input_video))
-                try:
-                    self.update_video_info(hide_progress=True)
-                except Exception:
-                    logger.exception(f"Could not load video {self.input_video}")
-                else:
-                    self.page_update(build_thumbnail=False)
-                    self.add_to_queue()
-                signal.emit(int((i / total_items) * 100))
+            # Probe every file at once up front, each video then loads from its probe result
+            with ProbePool(self.app, paths) as pool:
+                stop_signal.connect(stop_me)
+                stop_signal.connect(pool.cancel)
+                for i, path in enumerate(paths):
+                    while not stop and (result := pool.result(path, timeout=0.1)) is None:
+                        signal.emit(int((i / total_items) * 100))
+                    if stop:
+                        return
+                    self.input_video = path
+                    self.source_video_path_widget.setText(str(self.input_video))
+                    self.video_path_widget.setText(str(self.input_video))
+                    try:
+                        # Straight from the pool's probe rather than probing the file a second time
+                        self.update_video_info(hide_progress=True, probe_data=result.data)
+                    except Exception:
+                        logger.exception(f"Could not load video {self.input_video}")
+                    else:
+                        self.page_update(build_thumbnail=False)
+                        self.add_to_queue()
+                    signal.emit(int((i / total_items) * 100))
 
         self.disable_all()
         ProgressBar(self.app, [Task(t("Loading Videos"), open_em, {"paths": paths})], signal_task=True, can_cancel=True)
@@ -1578,54 +1653,27 @@ class Main(QtWidgets.QWidget):
         if not self.input_video or not self.initialized or self.loading_video:
             return
 
-        start_pos = self.start_time or self.app.fastflix.current_video.duration // 10
-
-        blocks = math.ceil(
-            (self.app.fastflix.current_video.duration - start_pos) / (self.app.fastflix.config.crop_detect_points + 1)
-        )
-        if blocks < 1:
-            blocks = 1
-
-        times = [
-            x
-            for x in range(int(start_pos), int(self.app.fastflix.current_video.duration), blocks)
-            if x < self.app.fastflix.current_video.duration
-        ][: self.app.fastflix.config.crop_detect_points]
-
-        if not times:
-            return
-
         self.app.processEvents()
         result_list = []
-        tasks = [
-            Task(
-                f"{t('Auto Crop - Finding black bars at')} {self.number_to_time(x)}",
-                get_auto_crop,
-                dict(
-                    source=self.source_material,
-                    video_width=self.app.fastflix.current_video.width,
-                    video_height=self.app.fastflix.current_video.height,
-                    input_track=self.original_video_track,
-                    start_time=x,
-                    end_time=self.end_time,
-                    result_list=result_list,
-                ),
-            )
-            for x in times
-        ]
-        ProgressBar(self.app, tasks)
+        task = Task(
+            t("Auto Crop - Finding black bars"),
+            get_auto_crop,
+            dict(
+                source=self.source_material,
+                video_width=self.app.fastflix.current_video.width,
+                video_height=self.app.fastflix.current_video.height,
+                input_track=self.original_video_track,
+                start_time=self.start_time,
+                end_time=self.end_time,
+                result_list=result_list,
+            ),
+        )
+        ProgressBar(self.app, [task])
         if not result_list:
             logger.warning("Autocrop did not return crop points, please use a ffmpeg version with cropdetect filter")
             return
 
-        smallest = (self.app.fastflix.current_video.height + self.app.fastflix.current_video.width) * 2
-        selected = result_list[0]
-        for result in result_list:
-            if (total := sum(result)) < smallest:
-                selected = result
-                smallest = total
-
-        r, b, l, tp = selected  # noqa: E741
+        r, b, l, tp = result_list[0]  # noqa: E741
 
         if tp + b > self.app.fastflix.current_video.height * 0.9 or r + l > self.app.fastflix.current_video.width * 0.9:
             logger.warning(
@@ -1727,6 +1775,16 @@ class Main(QtWidgets.QWidget):
         self.loading_video = True
         self.app.fastflix.current_video = None
         self.input_video = None
+        self.cancel_preview()
+        self.stop_prefetch()
+        self.close_frame_server()
+        queued = {
+            filmstrip_cache_key(video.source, video.video_settings.selected_track)
+            for video in self.app.fastflix.conversion_list
+        }
+        if self.filmstrip_key not in queued:
+            self.filmstrip_worker.discard(self.filmstrip_key)
+        self.show_filmstrip(None)
         self.source_video_path_widget.setText("")
         self.video_path_widget.setText(t("No Source Selected"))
         self.output_video_path_widget.setText("")
@@ -1852,7 +1910,7 @@ class Main(QtWidgets.QWidget):
         self.page_update(build_thumbnail=True, force_build_thumbnail=True)
 
     @reusables.log_exception("fastflix", show_traceback=False)
-    def update_video_info(self, hide_progress=False):
+    def update_video_info(self, hide_progress=False, probe_data: Optional[Box] = None):
         self.loading_video = True
         folder, name = self.generate_output_filename
         self.output_video_path_widget.setText(name)
@@ -1861,13 +1919,8 @@ class Main(QtWidgets.QWidget):
         self.output_path_button.setDisabled(False)
         self.app.fastflix.current_video = Video(source=self.input_video, work_path=self.get_temp_work_path())
         tasks = [
-            Task(t("Parse Video details"), parse),
-            Task(t("Extract covers"), extract_attachments),
-            Task(t("Determine HDR details"), parse_hdr_details),
-            Task(t("Detect HDR10+"), detect_hdr10_plus),
+            Task(t("Parse Video details"), analyze_video, dict(source=self.source_material, probe_data=probe_data))
         ]
-        if not self.app.fastflix.config.disable_deinterlace_check:
-            tasks.append(Task(t("Detecting Interlace"), detect_interlaced, dict(source=self.source_material)))
 
         try:
             ProgressBar(self.app, tasks, hidden=hide_progress)
@@ -2074,14 +2127,78 @@ class Main(QtWidgets.QWidget):
 
     @property
     def preview_place(self) -> Union[float, int]:
+        return self.slider_place(self.widgets.thumb_time.value())
+
+    def slider_place(self, value: int) -> Union[float, int]:
+        """Time in the video a preview slider value stands for"""
         ticks = self.app.fastflix.current_video.duration / self.widgets.thumb_time.maximum()
-        return (self.widgets.thumb_time.value() - 1) * ticks
+        return (value - 1) * ticks
 
     @reusables.log_exception("fastflix", show_traceback=False)
     def generate_thumbnail(self):
         if not self.input_video or self.loading_video:
             return
 
+        job = self.thumbnail_job(self.preview_place)
+        self.update_filmstrip()
+        # Whatever preview is still being made is out of date now
+        self.cancel_preview()
+
+        if cached := self.thumbnail_cache.get(job.key):
+            self.preview_frame_generated(self.preview_request, QtGui.QImage.fromData(cached))
+            job = None
+
+        # Wait for changes to settle, dragging a slider or typing a crop asks for a new preview every step
+        self.pending_preview = job
+        self.preview_timer.start()
+
+    def start_preview_job(self):
+        """Make the latest requested preview, in the one preview job slot"""
+        job, self.pending_preview = self.pending_preview, None
+        if not self.input_video or self.loading_video:
+            return
+        self.start_prefetch()
+        if job is None:
+            return
+
+        if job.transforms is not None and (server := self.preview_frame_server()):
+            self.preview_worker = FramePreviewCreator(
+                self,
+                server,
+                job.start_time or 0,
+                job.transforms,
+                cache=self.thumbnail_cache,
+                key=job.key,
+                request=self.preview_request,
+            )
+            self.preview_worker.finished.connect(self.preview_worker.deleteLater)
+            self.preview_worker.start()
+            return
+
+        thumb_command = generate_thumbnail_command(
+            config=self.app.fastflix.config,
+            source=job.source,
+            filters=job.filters,
+            start_time=job.start_time,
+            input_track=job.track,
+        )
+        self.preview_worker = ThumbnailCreator(
+            self, thumb_command, cache=self.thumbnail_cache, key=job.key, request=self.preview_request
+        )
+        self.preview_worker.finished.connect(self.preview_worker.deleteLater)
+        self.preview_worker.start()
+
+    def cancel_preview(self):
+        """Drop the pending preview and stop the one being made, so only a newer request's image is ever shown"""
+        self.preview_timer.stop()
+        self.pending_preview = None
+        self.preview_request += 1
+        if self.preview_worker is not None:
+            self.preview_worker.cancel()
+            self.preview_worker = None
+
+    def thumbnail_job(self, preview_place: Union[float, int]) -> PreviewJob:
+        """The preview at a point in the video with the current settings"""
         settings = self.app.fastflix.current_video.video_settings.model_dump()
 
         if (
@@ -2108,21 +2225,138 @@ class Main(QtWidgets.QWidget):
             enable_opencl=False,
             **settings,
         )
-
-        thumb_command = generate_thumbnail_command(
-            config=self.app.fastflix.config,
-            source=self.source_material,
-            output=self.thumb_file,
+        source = Path(self.source_material)
+        start_time = preview_place if not self.app.fastflix.current_video.concat else None
+        track = self.app.fastflix.current_video.video_settings.selected_track
+        return PreviewJob(
+            source=source,
+            track=track,
+            video_stream=self.preview_video_stream,
+            start_time=start_time,
             filters=filters,
-            start_time=self.preview_place if not self.app.fastflix.current_video.concat else None,
-            input_track=self.app.fastflix.current_video.video_settings.selected_track,
+            key=ThumbnailCache.key(source, track, start_time, filters),
+            transforms=self.frame_server_transforms(settings, use_keyframes),
         )
-        try:
-            self.thumb_file.unlink()
-        except OSError:
-            pass
-        worker = ThumbnailCreator(self, thumb_command)
-        worker.start()
+
+    def frame_server_transforms(self, settings: dict, use_keyframes: bool = False) -> Optional[dict]:
+        """
+        How the frame server should make the preview, None if it can't show these settings.
+        It reads the exact frame, so keyframe previews are left to FFmpeg's select filter.
+        """
+        if use_keyframes or not can_serve(settings):
+            return None
+        scale = self.resolution_custom() if self.resolution_method() == "custom" else None
+        if scale:
+            try:
+                scaled_size(1, 1, scale)
+            except ValueError:
+                return None
+        return dict(
+            crop=settings.get("crop"),
+            scale=scale,
+            rotate=settings.get("rotate", 0),
+            vertical_flip=settings.get("vertical_flip", False),
+            horizontal_flip=settings.get("horizontal_flip", False),
+            max_width=440,
+        )
+
+    def start_prefetch(self):
+        """Fill the thumbnail cache for the slider positions around the current one, nearest first"""
+        self.stop_prefetch()
+        if self.app.fastflix.current_video.concat or not self.thumbnail_cache.max_size:
+            return
+        slider = self.widgets.thumb_time
+        positions = []
+        for step in range(1, preview_prefetch_steps + 1):
+            positions.extend(x for x in (slider.value() + step, slider.value() - step) if slider.minimum() <= x)
+        jobs = [self.thumbnail_job(self.slider_place(x)) for x in positions if x <= slider.maximum()]
+        self.prefetcher = ThumbnailPrefetcher(self, jobs, self.thumbnail_cache, self.app.fastflix.config)
+        self.prefetcher.finished.connect(self.prefetcher.deleteLater)
+        self.prefetcher.start(QtCore.QThread.LowestPriority)
+
+    def stop_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+
+    def update_filmstrip(self):
+        """Show the filmstrip for the source and track being previewed, making it first if it isn't cached"""
+        video = self.app.fastflix.current_video
+        if video.concat:
+            self.show_filmstrip(None)
+            return
+        source, track = Path(self.source_material), video.video_settings.selected_track
+        key = filmstrip_cache_key(source, track)
+        if key and key == self.filmstrip_key:
+            return
+        self.show_filmstrip(None)
+        self.filmstrip_key = self.request_filmstrip(source, track, video.duration, first=True)
+        if cached := self.thumbnail_cache.get(key):
+            self.show_filmstrip(QtGui.QImage.fromData(cached))
+
+    def request_filmstrip(self, source: Path, track: int, duration: float, first: bool = False) -> Optional[str]:
+        """
+        Thumbnail cache key of the filmstrip for a source, which is made in the background if it isn't cached yet.
+        filmstrip_ready is emitted once it is done, first puts it ahead of any other waiting filmstrips.
+        """
+        key = filmstrip_cache_key(source, track)
+        if not key or not duration or key in self.failed_filmstrips or key in self.thumbnail_cache:
+            return key
+        command = generate_filmstrip_command(
+            self.app.fastflix.config, source, duration, input_track=track, frames=filmstrip_frames
+        )
+        self.filmstrip_worker.add(key, command, self.thumbnail_cache, first=first)
+        return key
+
+    def filmstrip_generated(self, key: str, image: QtGui.QImage):
+        if image.isNull():
+            self.failed_filmstrips.add(key)
+        elif key == self.filmstrip_key:
+            self.show_filmstrip(image)
+
+    def show_filmstrip(self, image: Optional[QtGui.QImage]):
+        if image is None or image.isNull():
+            self.filmstrip_key = None
+            self.widgets.filmstrip.clear()
+            self.widgets.filmstrip.hide()
+        else:
+            self.widgets.filmstrip.set_strip(image)
+            self.widgets.filmstrip.show()
+        self.reposition_thumb_overlay()
+
+    def filmstrip_seek(self, position: float):
+        if not self.app.fastflix.current_video or self.loading_video:
+            return
+        slider = self.widgets.thumb_time
+        slider.setValue(round(slider.minimum() + position * (slider.maximum() - slider.minimum())))
+        self.thumb_time_change()
+
+    @property
+    def preview_video_stream(self) -> int:
+        """Position of the previewed track among the video streams"""
+        video = self.app.fastflix.current_video
+        track = video.video_settings.selected_track
+        return next((i for i, stream in enumerate(video.streams.video) if stream.index == track), 0)
+
+    def preview_frame_server(self) -> Optional[FrameServer]:
+        """
+        Frame server for the source and track being previewed, None once OpenCV turned out not to read it.
+        It opens the source on first use, in the preview worker rather than here.
+        """
+        video_stream = self.preview_video_stream
+        source = Path(self.source_material)
+        if (source, video_stream) in self.ffmpeg_only_previews:
+            return None
+        server = self.frame_server
+        if server is None or server.source != source or server.video_stream != video_stream:
+            self.close_frame_server()
+            server = self.frame_server = FrameServer(source, video_stream)
+        return server
+
+    def close_frame_server(self):
+        if self.frame_server is not None:
+            self.frame_server.close()
+            self.frame_server = None
 
     @property
     def source_material(self):
@@ -2139,16 +2373,29 @@ class Main(QtWidgets.QWidget):
             logger.warning(text)
 
     @reusables.log_exception("fastflix", show_traceback=False)
-    def thumbnail_generated(self, status=0):
+    def thumbnail_generated(self, request: int, status=0):
+        if request != self.preview_request:
+            return
+        self.preview_worker = None
         if status == 2:
             self.app.fastflix.opencl_support = False
             self.generate_thumbnail()
             return
-        if status == 0 or not status or not self.thumb_file.exists():
-            self.widgets.preview.setText(t("Error Updating Thumbnail"))
+        if status == 3:
+            # The frame server couldn't read this source after all, FFmpeg takes over the previews for it
+            if self.frame_server is not None:
+                self.ffmpeg_only_previews.add((self.frame_server.source, self.frame_server.video_stream))
+            self.close_frame_server()
+            self.generate_thumbnail()
             return
+        self.widgets.preview.setText(t("Error Updating Thumbnail"))
 
-        pixmap = QtGui.QPixmap(str(self.thumb_file))
+    @reusables.log_exception("fastflix", show_traceback=False)
+    def preview_frame_generated(self, request: int, image: QtGui.QImage):
+        if request != self.preview_request:
+            return
+        self.preview_worker = None
+        pixmap = QtGui.QPixmap.fromImage(image)
         pixmap = pixmap.scaled(420, 260, QtCore.Qt.KeepAspectRatio)
         self.widgets.preview.setPixmap(pixmap)
 
@@ -2198,7 +2445,7 @@ class Main(QtWidgets.QWidget):
 
         self.video_options.get_settings()
 
-    def build_commands(self) -> bool:
+    def build_commands(self, for_queue: bool = False) -> bool:
         if (
             not self.initialized
             or not self.app.fastflix.current_video
@@ -2212,13 +2459,39 @@ class Main(QtWidgets.QWidget):
             error_message(str(err))
             return False
 
-        commands = self.current_encoder.build(fastflix=self.app.fastflix)
+        if self.app.fastflix.current_video.video_settings.chunked_encoding:
+            commands = build_chunked(
+                self.current_encoder.build,
+                self.app.fastflix,
+                self.current_encoder.name,
+                snap_to_keyframes=for_queue,
+            )
+        else:
+            commands = self.current_encoder.build(fastflix=self.app.fastflix)
         if not commands:
             return False
         self.video_options.commands.update_commands(commands)
         self.app.fastflix.current_video.video_settings.conversion_commands = commands
         return True
 
+    def request_eta_sample(self):
+        """Time a short sample encode of the current video when nothing in the encode history can predict it"""
+        video = self.app.fastflix.current_video
+        if self.app.fastflix.currently_encoding or self.eta_predictor.predict(video) is not None:
+            return
+        commands, duration = build_sample(self.current_encoder.build, self.app.fastflix)
+        if commands:
+            key = match_keys(job_details(video))[0]
+            self.eta_sampler.add(key, video.uuid, commands, duration, Path(video.work_path))
+
+    def eta_sample_generated(self, video_uuid: str, elapsed: float, duration: float):
+        video = next((video for video in self.app.fastflix.conversion_list if video.uuid == video_uuid), None)
+        if video is None or not elapsed:
+            return
+        self.eta_predictor.add_sample(video, elapsed, duration)
+        if not self.app.fastflix.currently_encoding:
+            self.video_options.queue.new_source()
+
     def interlace_update(self):
         if self.loading_video:
             return
@@ -2296,6 +2569,13 @@ class Main(QtWidgets.QWidget):
                 shutil.rmtree(self.temp_dir, ignore_errors=True)
             except Exception:
                 pass
+        self.cancel_preview()
+        self.stop_prefetch()
+        self.close_frame_server()
+        self.filmstrip_worker.cancel()
+        self.filmstrip_worker.wait(1000)
+        self.eta_sampler.cancel()
+        self.eta_sampler.wait(1000)
         self.video_options.cleanup()
         self.notifier.request_shutdown()
         self.notifier.wait(1000)  # Wait up to 1 second for graceful shutdown
@@ -2373,20 +2653,17 @@ class Main(QtWidgets.QWidget):
                 if not self.add_to_queue():
                     return
 
-        for video in self.app.fastflix.conversion_list:
-            if video.status.ready:
-                video_to_send: Video = video
-                break
-        else:
+        if not any(video.status.ready for video in self.app.fastflix.conversion_list):
             error_message(t("There are no videos to start converting"))
             return
 
         logger.debug(t("Starting conversion process"))
 
         self.app.fastflix.currently_encoding = True
+        self.stopped_on_error = False
         prevent_sleep_mode()
         self.set_convert_button()
-        self.send_video_request_to_worker_queue(video_to_send)
+        self.dispatch_ready_videos()
         self.disable_all()
         self.video_options.show_status()
 
@@ -2453,6 +2730,11 @@ class Main(QtWidgets.QWidget):
         event.setDropAction(QtCore.Qt.CopyAction)
         event.accept()
 
+        dropped = [Path(clean_file_string(url.toLocalFile())) for url in event.mimeData().urls()]
+        dropped = [path for path in dropped if path.is_file()]
+        if len(dropped) > 1:
+            return self.open_many(dropped)
+
         if self.app.fastflix.current_video:
             discard = yes_no_message(
                 f"{t('There is already a video being processed')}<br>{t('Are you sure you want to discard it?')}",
@@ -2494,57 +2776,70 @@ class Main(QtWidgets.QWidget):
         response = Response(*status_response)
         logger.debug(f"Updating queue from command worker: {response}")
 
-        video_to_send: Optional[Video] = None
-        errored = False
-        same_video = False
-
         for video in self.app.fastflix.conversion_list:
             if response.video_uuid == video.uuid:
-                video.status.running = False
+                if response.command_uuid in video.status.running_commands:
+                    video.status.running_commands.remove(response.command_uuid)
+                video.status.running = bool(video.status.running_commands)
 
                 if response.status == "cancelled":
+                    if video.status.error:
+                        # Remaining commands of a parallel group stopped after one of them failed
+                        if video.status.running:
+                            return
+                        break
+                    first_cancel = not video.status.cancelled
                     video.status.cancelled = True
-                    self.end_encoding()
-                    self.conversion_cancelled(video)
+                    if not self.running_videos():
+                        self.end_encoding()
+                    if first_cancel:
+                        self.conversion_cancelled(video)
                     self.video_options.update_queue()
                     return
 
                 if response.status == "complete":
                     video.status.current_command += 1
-                    if len(video.video_settings.conversion_commands) > video.status.current_command:
-                        same_video = True
-                        video_to_send = video
-                        break
-                    else:
-                        video.status.complete = True
+                    video.status.completed_commands.append(response.command_uuid)
+                    self.save_encoding_progress()
+                    if video.status.running:
+                        # Wait for the rest of the parallel group
+                        return self.video_options.update_queue()
+                    if pending_commands(video):
+                        # Keep working through the commands of this video in the slot it already has
+                        return self.send_video_request_to_worker_queue(video)
+                    video.status.complete = True
+                    self.eta_predictor.refresh()
 
                 if response.status == "error":
                     video.status.error = True
-                    errored = True
+                    if not self.video_options.queue.ignore_errors.isChecked():
+                        self.stopped_on_error = True
+                    if video.status.running:
+                        self.app.fastflix.worker_queue.put(["cancel", video.uuid])
+                        return self.video_options.update_queue()
                 break
 
-        if errored and not self.video_options.queue.ignore_errors.isChecked():
-            self.end_encoding()
-            self.conversion_complete(success=False)
-            return
+        if not self.app.fastflix.conversion_paused and not self.stopped_on_error:
+            self.dispatch_ready_videos()
 
-        if not video_to_send:
-            for video in self.app.fastflix.conversion_list:
-                if video.status.ready:
-                    video_to_send = video
-                    # TODO ensure command int is in command list?
-                    break
+        if self.running_videos():
+            self.app.fastflix.currently_encoding = True
+            self.video_options.update_queue()
+            return
 
-        if not video_to_send:
+        if self.stopped_on_error:
+            self.stopped_on_error = False
             self.end_encoding()
-            self.conversion_complete(success=True)
+            self.conversion_complete(success=False)
             return
 
-        self.app.fastflix.currently_encoding = True
-        if not same_video and self.app.fastflix.conversion_paused:
+        if self.app.fastflix.conversion_paused and any(
+            video.status.ready for video in self.app.fastflix.conversion_list
+        ):
             return self.end_encoding()
 
-        self.send_video_request_to_worker_queue(video_to_send)
+        self.end_encoding()
+        self.conversion_complete(success=True)
 
     def end_encoding(self):
         self.app.fastflix.currently_encoding = False
@@ -2553,40 +2848,45 @@ class Main(QtWidgets.QWidget):
         self.video_options.update_queue()
         self.set_convert_button()
 
+    def running_videos(self) -> list[Video]:
+        return [video for video in self.app.fastflix.conversion_list if video.status.running]
+
+    def dispatch_ready_videos(self) -> int:
+        """Send the ready videos the scheduler has room for to the worker, returns how many were sent"""
+        ready = [video for video in self.app.fastflix.conversion_list if video.status.ready]
+        admitted = self.scheduler.admit(ready, self.running_videos())
+        for video in admitted:
+            self.send_video_request_to_worker_queue(video)
+        return len(admitted)
+
     def send_next_video(self) -> bool:
-        if not self.app.fastflix.currently_encoding:
-            for video in self.app.fastflix.conversion_list:
-                if video.status.ready:
-                    video.status.running = True
-                    self.send_video_request_to_worker_queue(video)
-                    self.app.fastflix.currently_encoding = True
-                    prevent_sleep_mode()
-                    self.set_convert_button()
-                    return True
+        sent = self.dispatch_ready_videos()
+        if sent or self.running_videos():
+            self.app.fastflix.currently_encoding = True
+            prevent_sleep_mode()
+            self.set_convert_button()
+            return sent > 0
         self.app.fastflix.currently_encoding = False
         allow_sleep_mode()
         self.set_convert_button()
         return False
 
+    def save_encoding_progress(self):
+        # The queue is normally only saved on reorder, which is skipped while encoding
+        save_queue_async(self.app.fastflix.conversion_list, self.app.fastflix.queue_path, self.app.fastflix.config)
+
     def send_video_request_to_worker_queue(self, video: Video):
-        command = video.video_settings.conversion_commands[video.status.current_command]
         self.app.fastflix.currently_encoding = True
         prevent_sleep_mode()
+        # Samples would only slow the real encodes down and be slowed down by them
+        self.eta_sampler.clear()
 
         # logger.info(f"Sending video {video.uuid} command {command.uuid} called from {inspect.stack()}")
 
-        self.app.fastflix.worker_queue.put(
-            Request(
-                request="execute",
-                video_uuid=video.uuid,
-                command_uuid=command.uuid,
-                command=command.command,
-                work_dir=str(video.work_path),
-                log_name=video.video_settings.video_title or video.video_settings.output_path.stem,
-                shell=command.shell,
-            )
-        )
-        video.status.running = True
+        # The next command, or the whole parallel group at once for chunked encodes
+        details = job_details(video, profile=self.app.fastflix.config.selected_profile)
+        for request in execute_requests(video, details):
+            self.app.fastflix.worker_queue.put(Request(*request))
         self.video_options.update_queue()
 
     def find_video(self, uuid) -> Video:
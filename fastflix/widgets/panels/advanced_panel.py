@@ -59,6 +59,7 @@ denoise_presets = {
 }
 
 vsync = ["auto", "passthrough", "cfr", "vfr", "drop"]
+chunk_lengths = ["30", "60", "120", "300", "600"]
 tone_map_items = ["none", "clip", "linear", "gamma", "reinhard", "hable", "mobius"]
 
 
@@ -109,6 +110,8 @@ class AdvancedPanel(QtWidgets.QWidget):
         self.add_spacer()
         self.init_vbv()
         self.add_spacer()
+        self.init_chunked_encoding()
+        self.add_spacer()
         self.layout.setRowStretch(self.last_row, True)
         self.init_hw_message()
         self.init_titles()
@@ -347,6 +350,42 @@ class AdvancedPanel(QtWidgets.QWidget):
         self.layout.addWidget(self.bufsize_widget, self.last_row, 4)
         self.layout.addWidget(QtWidgets.QLabel(t("Both must have values to be enabled")), self.last_row, 5, 1, 2)
 
+    def init_chunked_encoding(self):
+        self.last_row += 1
+        self.chunked_encoding_widget = QtWidgets.QCheckBox(t("Encode in parallel chunks"))
+        self.chunked_encoding_widget.setToolTip(
+            t("Split the video at keyframes and encode the pieces at the same time, then join them back together")
+            + "\n"
+            + t("Chunks share the Concurrent Encodes slots from Settings")
+            + "\n"
+            + t("Finished chunks are kept, so a crashed or cancelled encode resumes where it left off")
+        )
+        self.chunked_encoding_widget.toggled.connect(self.page_update)
+
+        self.chunk_length_widget = QtWidgets.QComboBox()
+        self.chunk_length_widget.addItems(chunk_lengths)
+        self.chunk_length_widget.setCurrentText("60")
+        self.chunk_length_widget.currentIndexChanged.connect(self.page_update)
+
+        self.add_row_label(t("Chunked Encoding"), self.last_row)
+        self.layout.addWidget(self.chunked_encoding_widget, self.last_row, 1, 1, 2)
+        self.layout.addWidget(
+            QtWidgets.QLabel(f"{t('Chunk Length')} (s)"), self.last_row, 3, alignment=QtCore.Qt.AlignRight
+        )
+        self.layout.addWidget(self.chunk_length_widget, self.last_row, 4)
+        self.chunk_note = QtWidgets.QLabel()
+        self.layout.addWidget(self.chunk_note, self.last_row, 5, 1, 2)
+        self.update_chunk_note()
+
+    def update_chunk_note(self):
+        """Chunks only run at the same time with more than one concurrent encode slot, say so when there is one"""
+        if self.chunked_encoding_widget.isChecked() and self.app.fastflix.config.concurrent_encodes <= 1:
+            self.chunk_note.setText(t("Set Concurrent Encodes in Settings above 1 to encode chunks at the same time"))
+            self.chunk_note.setStyleSheet("color: orange")
+        else:
+            self.chunk_note.setText("x265, SVT AV1, AOM, rav1e, VVC")
+            self.chunk_note.setStyleSheet("")
+
     # def vbv_check_changed(self):
     #     self.bufsize_widget.setEnabled(self.vbv_checkbox.isChecked())
     #     self.maxrate_widget.setEnabled(self.vbv_checkbox.isChecked())
@@ -463,6 +502,10 @@ class AdvancedPanel(QtWidgets.QWidget):
             self.app.fastflix.current_video.video_settings.maxrate = None
             self.app.fastflix.current_video.video_settings.bufsize = None
 
+        self.app.fastflix.current_video.video_settings.chunked_encoding = self.chunked_encoding_widget.isChecked()
+        self.update_chunk_note()
+        self.app.fastflix.current_video.video_settings.chunk_length = int(self.chunk_length_widget.currentText())
+
         self.updating = False
 
     def get_settings(self):
@@ -524,6 +567,8 @@ class AdvancedPanel(QtWidgets.QWidget):
             denoise=denoise,
             denoise_type_index=self.denoise_type_widget.currentIndex(),
             denoise_strength_index=self.denoise_strength_widget.currentIndex(),
+            chunked_encoding=self.chunked_encoding_widget.isChecked(),
+            chunk_length=int(self.chunk_length_widget.currentText()),
             # first_pass_filters=self.first_filters.text() or None,
             # second_pass_filters=self.second_filters.text() or None,
         )
@@ -641,6 +686,9 @@ class AdvancedPanel(QtWidgets.QWidget):
             if settings.video_track_title:
                 self.video_track_title.setText(settings.video_track_title)
 
+            self.chunked_encoding_widget.setChecked(settings.chunked_encoding)
+            self.chunk_length_widget.setCurrentText(str(settings.chunk_length))
+
         else:
             self.video_speed_widget.setCurrentIndex(
                 list(video_speeds.values()).index(self.app.fastflix.config.advanced_opt("video_speed"))
@@ -686,6 +734,9 @@ class AdvancedPanel(QtWidgets.QWidget):
             self.saturation_widget.setText(self.app.fastflix.config.advanced_opt("saturation") or "")
             self.contrast_widget.setText(self.app.fastflix.config.advanced_opt("contrast") or "")
 
+            self.chunked_encoding_widget.setChecked(self.app.fastflix.config.advanced_opt("chunked_encoding", False))
+            self.chunk_length_widget.setCurrentText(str(self.app.fastflix.config.advanced_opt("chunk_length", 60)))
+
             self.hdr_settings()
             # self.video_title.setText("")
             # self.video_track_title.setText("")
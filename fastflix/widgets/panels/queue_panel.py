@@ -3,10 +3,12 @@
 
 import copy
 import sys
+from datetime import timedelta
 import logging
 import os
 from pathlib import Path
 import gc
+from typing import Optional
 
 from platformdirs import user_data_dir
 import reusables
@@ -16,11 +18,13 @@ from PySide6 import QtCore, QtGui, QtWidgets
 from fastflix.language import t
 from fastflix.models.fastflix_app import FastFlixApp
 from fastflix.models.video import Video
-from fastflix.ff_queue import get_queue, save_queue, save_queue_async
+from fastflix.ff_queue import get_queue, resumable_commands, save_queue, save_queue_async
 from fastflix.resources import get_icon, get_bool_env
-from fastflix.shared import no_border, open_folder, yes_no_message, message, error_message
+from fastflix.shared import no_border, open_folder, yes_no_message, message, error_message, timedelta_to_str
 from fastflix.ui_scale import scaler
+from fastflix.widgets.filmstrip import filmstrip_cache_key, filmstrip_frame, filmstrip_frames
 from fastflix.widgets.panels.abstract_list import FlixList
+from fastflix.widgets.windows.encode_history import EncodeHistory
 from fastflix.exceptions import FastFlixInternalException
 from fastflix.windows_tools import allow_sleep_mode, prevent_sleep_mode
 from fastflix.command_runner import BackgroundRunner
@@ -85,6 +89,20 @@ class EncodeItem(QtWidgets.QTabWidget):
         )
         title.setFixedWidth(300)
 
+        # A frame from the middle of the source's filmstrip, once there is one, only with the thumbnail cache on.
+        # The queue asks for it once the item is on screen (or just added), see request_preview
+        self.preview = QtWidgets.QLabel()
+        self.preview.setFixedSize(scaler.scale_size(64, 36))
+        self.filmstrip_key = None
+        if not video.concat and self.parent.main.thumbnail_cache.max_size:
+            if video.uuid not in self.parent.filmstrip_keys:
+                self.parent.filmstrip_keys[video.uuid] = filmstrip_cache_key(
+                    video.source, video.video_settings.selected_track
+                )
+            self.filmstrip_key = self.parent.filmstrip_keys[video.uuid]
+            if pixmap := self.parent.previews.get(self.filmstrip_key):
+                self.preview.setPixmap(pixmap)
+
         settings = Box(copy.deepcopy(video.video_settings.model_dump()))
         # settings.output_path = str(settings.output_path)
         # for i, o in enumerate(video.attachment_tracks):
@@ -127,6 +145,10 @@ class EncodeItem(QtWidgets.QTabWidget):
         elif video.status.cancelled:
             status = t("Cancelled")
             add_retry = True
+        if video.status.ready:
+            predicted = self.parent.predicted(video)
+            if predicted is not None:
+                status = f"{status} (~{timedelta_to_str(timedelta(seconds=int(predicted)))})"
 
         if not self.video.status.running:
             self.widgets.cancel_button.clicked.connect(lambda: self.parent.remove_item(self.video))
@@ -142,7 +164,10 @@ class EncodeItem(QtWidgets.QTabWidget):
         grid = QtWidgets.QGridLayout()
         grid.addLayout(self.init_move_buttons(), 0, 0)
         # grid.addWidget(self.widgets.track_number, 0, 1)
-        grid.addWidget(title, 0, 1, 1, 3)
+        title_layout = QtWidgets.QHBoxLayout()
+        title_layout.addWidget(self.preview)
+        title_layout.addWidget(title)
+        grid.addLayout(title_layout, 0, 1, 1, 3)
         grid.addWidget(QtWidgets.QLabel(f"{video.video_settings.video_encoder_settings.name}"), 0, 4)
         grid.addWidget(
             QtWidgets.QLabel(f"{t('Audio Tracks')}: {len([1 for x in video.audio_tracks if x.enabled])}"), 0, 5
@@ -185,6 +210,30 @@ class EncodeItem(QtWidgets.QTabWidget):
         layout.addWidget(self.widgets.down_button)
         return layout
 
+    def request_preview(self):
+        """Show the cached filmstrip frame, or have the filmstrip made, the first time the item is needed"""
+        key = self.filmstrip_key
+        if not key or key in self.parent.previews or key in self.parent.requested_previews:
+            return
+        self.parent.requested_previews.add(key)
+        self.parent.main.request_filmstrip(
+            self.video.source, self.video.video_settings.selected_track, self.video.duration
+        )
+        if cached := self.parent.main.thumbnail_cache.get(key):
+            self.set_preview(QtGui.QImage.fromData(cached))
+
+    def set_preview(self, filmstrip: QtGui.QImage):
+        if filmstrip.isNull():
+            return
+        frame = filmstrip_frame(filmstrip, filmstrip_frames // 2)
+        pixmap = QtGui.QPixmap.fromImage(frame).scaled(
+            self.preview.size(),
+            QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+            QtCore.Qt.TransformationMode.SmoothTransformation,
+        )
+        self.parent.previews[self.filmstrip_key] = pixmap
+        self.preview.setPixmap(pixmap)
+
     def set_first(self, first=True):
         self.first = first
 
@@ -220,6 +269,14 @@ class EncodingQueue(FlixList):
     def __init__(self, parent, app: FastFlixApp):
         self.main = parent.main
         self.app = app
+        # Kept while the list is rebuilt: filmstrip keys and predicted encode times by video uuid,
+        # preview frames (and the filmstrips already asked for) by filmstrip key
+        self.filmstrip_keys: dict[str, Optional[str]] = {}
+        self.predictions: dict[str, Optional[float]] = {}
+        self.predictions_generation = -1
+        self.previews: dict[str, QtGui.QPixmap] = {}
+        self.requested_previews: set[str] = set()
+        self.seen_videos: set[str] = set()
         self.encode_paused = False
         self.encoding = False
         self.after_done_action = None
@@ -236,6 +293,20 @@ class EncodingQueue(FlixList):
         self.load_queue_button.clicked.connect(self.manually_load_queue)
         self.load_queue_button.setFixedWidth(110)
 
+        self.history_button = QtWidgets.QPushButton(t("Encode History"))
+        self.history_button.clicked.connect(self.show_history)
+        self.history_button.setToolTip(t("Throughput of past encodes, by encoder and preset"))
+        self.history_button.setFixedWidth(120)
+        self.history_window = None
+
+        self.shortest_first_button = QtWidgets.QPushButton(t("Shortest First"))
+        self.shortest_first_button.clicked.connect(self.sort_shortest_first)
+        self.shortest_first_button.setToolTip(t("Order the waiting items by their predicted encode time"))
+        self.shortest_first_button.setFixedWidth(120)
+
+        self.queue_eta_label = QtWidgets.QLabel()
+        self.queue_eta_label.setToolTip(t("Predicted time to encode everything waiting in the queue"))
+
         self.priority_widget = QtWidgets.QComboBox()
         self.priority_widget.addItems(
             ([] if reusables.win_based else ["Realtime"]) + ["High", "Above Normal", "Normal", "Below Normal", "Idle"]
@@ -295,6 +366,9 @@ class EncodingQueue(FlixList):
 
         top_layout.addWidget(self.load_queue_button, QtCore.Qt.AlignRight)
         top_layout.addWidget(self.save_queue_button, QtCore.Qt.AlignRight)
+        top_layout.addWidget(self.history_button, QtCore.Qt.AlignRight)
+        top_layout.addWidget(self.shortest_first_button, QtCore.Qt.AlignRight)
+        top_layout.addWidget(self.queue_eta_label, QtCore.Qt.AlignRight)
         top_layout.addStretch(1)
         top_layout.addWidget(priority_label, QtCore.Qt.AlignRight)
         top_layout.addWidget(self.priority_widget, QtCore.Qt.AlignRight)
@@ -307,6 +381,8 @@ class EncodingQueue(FlixList):
         top_layout.addWidget(self.clear_queue, QtCore.Qt.AlignRight)
 
         super().__init__(app, parent, t("Queue"), "queue", top_row_layout=top_layout)
+        self.main.filmstrip_ready.connect(self.filmstrip_generated)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.request_visible_previews)
         try:
             self.queue_startup_check()
         except Exception:
@@ -320,10 +396,12 @@ class EncodingQueue(FlixList):
             if video.status.complete:
                 remove_vids.append(video)
             else:
-                video.status.clear()
+                video.status.clear_for_resume(resumable_commands(video))
 
         for video in remove_vids:
             new_queue.remove(video)
+        # Recovered items only get their previews made once they are scrolled to
+        self.seen_videos.update(video.uuid for video in new_queue)
 
         if queue_file:
             self.app.fastflix.conversion_list = new_queue
@@ -380,6 +458,44 @@ class EncodingQueue(FlixList):
             if is_yes:
                 self.queue_startup_check(filename)
 
+    def show_history(self):
+        self.history_window = EncodeHistory()
+        self.history_window.show()
+
+    def sort_shortest_first(self):
+        if self.app.fastflix.currently_encoding:
+            return
+        started = [video for video in self.app.fastflix.conversion_list if not video.status.ready]
+        waiting = [video for video in self.app.fastflix.conversion_list if video.status.ready]
+        # Videos without a prediction go last, in the order they were in
+        predicted = {video.uuid: self.predicted(video) for video in waiting}
+        waiting.sort(key=lambda video: (predicted[video.uuid] is None, predicted[video.uuid] or 0))
+        self.app.fastflix.conversion_list = started + waiting
+        self.new_source()
+
+    def predicted(self, video: Video) -> Optional[float]:
+        """Predicted encode time of a queued video, worked out again only once the predictor learned more"""
+        predictor = self.main.eta_predictor
+        if self.predictions_generation != predictor.generation:
+            self.predictions = {}
+            self.predictions_generation = predictor.generation
+        if video.uuid not in self.predictions:
+            self.predictions[video.uuid] = predictor.predict(video)
+        return self.predictions[video.uuid]
+
+    def update_queue_eta(self):
+        total, unknown = self.main.eta_predictor.queue_eta(
+            self.app.fastflix.conversion_list,
+            slots=self.app.fastflix.config.concurrent_encodes,
+            predict=self.predicted,
+        )
+        if not total:
+            self.queue_eta_label.setText("")
+            return
+        self.queue_eta_label.setText(
+            f"{t('Queue ETA')}: {timedelta_to_str(timedelta(seconds=int(total)))}{'+' if unknown else ''}"
+        )
+
     def reorder(self, update=True):
         if self.app.fastflix.currently_encoding:
             # TODO error?
@@ -409,13 +525,40 @@ class EncodingQueue(FlixList):
 
         self.tracks = []
 
+        # Forget videos that left the queue, one that comes back (edited) gets looked at again
+        queued = {video.uuid for video in self.app.fastflix.conversion_list}
+        self.filmstrip_keys = {uuid: key for uuid, key in self.filmstrip_keys.items() if uuid in queued}
+        self.predictions = {uuid: predicted for uuid, predicted in self.predictions.items() if uuid in queued}
+        self.seen_videos &= queued
+
         for i, video in enumerate(self.app.fastflix.conversion_list, start=1):
             self.tracks.append(EncodeItem(self, video, index=i))
+        self.update_queue_eta()
         if self.tracks:
             self.tracks[0].widgets.up_button.setDisabled(True)
             self.tracks[-1].widgets.down_button.setDisabled(True)
         super()._new_source(self.tracks)
 
+        for track in self.tracks:
+            if track.video.uuid not in self.seen_videos:
+                self.seen_videos.add(track.video.uuid)
+                track.request_preview()
+        # Once the new list is laid out
+        QtCore.QTimer.singleShot(0, self.request_visible_previews)
+
+    def request_visible_previews(self):
+        if not self.isVisible():
+            return
+        top = self.scroll_area.verticalScrollBar().value()
+        bottom = top + self.scroll_area.viewport().height()
+        for track in self.tracks:
+            if track.y() < bottom and track.y() + track.height() > top:
+                track.request_preview()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.request_visible_previews()
+
         # snapshot = tracemalloc.take_snapshot()
         # top_stats = snapshot.statistics('lineno')
         #
@@ -423,6 +566,11 @@ class EncodingQueue(FlixList):
         # for stat in top_stats[:20]:
         #     print(stat)
 
+    def filmstrip_generated(self, key: str, image: QtGui.QImage):
+        for item in self.tracks:
+            if item.filmstrip_key == key:
+                item.set_preview(image)
+
     def clear_complete(self):
         for queued_item in self.tracks:
             if queued_item.video.status.complete:
@@ -518,7 +666,7 @@ class EncodingQueue(FlixList):
     def retry_video(self, current_video):
         for i, video in enumerate(self.app.fastflix.conversion_list):
             if video.uuid == current_video.uuid:
-                video.status.clear()
+                video.status.clear_for_resume(resumable_commands(video))
                 break
         else:
             logger.error(f"Can't find video {current_video.uuid} in queue to update its status")
@@ -537,7 +685,7 @@ class EncodingQueue(FlixList):
         if not self.main.encoding_checks():
             return False
 
-        if not self.main.build_commands():
+        if not self.main.build_commands(for_queue=True):
             return False
 
         for video in self.app.fastflix.conversion_list:
@@ -555,6 +703,7 @@ class EncodingQueue(FlixList):
         # return
 
         self.app.fastflix.conversion_list.append(copy.deepcopy(self.app.fastflix.current_video))
+        self.main.request_eta_sample()
         self.new_source()
         # No explicit save needed - new_source() triggers reorder() which saves the queue
 
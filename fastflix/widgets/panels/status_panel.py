@@ -2,28 +2,36 @@
 # -*- coding: utf-8 -*-
 import datetime
 import logging
+import re
 import time
+from array import array
 from datetime import timedelta
-from typing import Optional
+from pathlib import Path
+from typing import List, Optional
 
 from queue import Empty
 
-from PySide6 import QtCore, QtWidgets
+from PySide6 import QtCore, QtGui, QtWidgets
 
 from fastflix.exceptions import FlixError
 from fastflix.language import t
 from fastflix.models.fastflix_app import FastFlixApp
 from fastflix.models.encode import GifskiSettings
 from fastflix.models.video import Video
+from fastflix.progress import ProgressEvent
 from fastflix.shared import time_to_number, timedelta_to_str
 
 logger = logging.getLogger("fastflix")
 
+# "[2] " in front of every output line of an encode, when more than one can run at once
+slot_prefix = re.compile(r"^\[\d+\] ")
+
 
 class StatusPanel(QtWidgets.QWidget):
     speed = QtCore.Signal(str)
     bitrate = QtCore.Signal(str)
     nvencc_signal = QtCore.Signal(str)
+    progress_signal = QtCore.Signal(object)
     tick_signal = QtCore.Signal()
 
     def __init__(self, parent, app: FastFlixApp):
@@ -32,6 +40,8 @@ class StatusPanel(QtWidgets.QWidget):
         self.main = parent.main
         self.current_video: Optional[Video] = None
         self.started_at = None
+        # Newest progress of every running command, by (video uuid, command uuid)
+        self.progress: dict[tuple[str, str], ProgressEvent] = {}
 
         self.ticker_thread = ElapsedTimeTicker(self, self.tick_signal)
         self.ticker_thread.start()
@@ -44,6 +54,9 @@ class StatusPanel(QtWidgets.QWidget):
         self.eta_label = QtWidgets.QLabel(f"{t('Time Left')}: N/A")
         self.eta_label.setToolTip(t("Estimated time left for current command"))
         self.eta_label.setStyleSheet("QLabel{margin-right:50px}")
+        self.queue_eta_label = QtWidgets.QLabel(f"{t('Queue Left')}: N/A")
+        self.queue_eta_label.setToolTip(t("Estimated time left for the whole queue, from past encodes"))
+        self.queue_eta_label.setStyleSheet("QLabel{margin-right:50px}")
         self.time_elapsed_label = QtWidgets.QLabel(f"{t('Time Elapsed')}: N/A")
         self.time_elapsed_label.setStyleSheet("QLabel{margin-right:50px}")
         self.size_label = QtWidgets.QLabel(f"{t('Size Estimate')}: N/A")
@@ -53,6 +66,7 @@ class StatusPanel(QtWidgets.QWidget):
         h_box.addWidget(QtWidgets.QLabel(t("Encoder Output")), alignment=QtCore.Qt.AlignLeft)
         h_box.addStretch(1)
         h_box.addWidget(self.eta_label)
+        h_box.addWidget(self.queue_eta_label)
         h_box.addWidget(self.time_elapsed_label)
         h_box.addWidget(self.size_label)
         h_box.addStretch(1)
@@ -67,6 +81,7 @@ class StatusPanel(QtWidgets.QWidget):
         self.speed.connect(self.update_speed)
         self.bitrate.connect(self.update_bitrate)
         self.nvencc_signal.connect(self.update_nvencc)
+        self.progress_signal.connect(self.update_progress)
         self.main.status_update_signal.connect(self.on_status_update)
         self.tick_signal.connect(self.update_time_elapsed)
 
@@ -75,6 +90,9 @@ class StatusPanel(QtWidgets.QWidget):
         self.inner_widget.log_updater.wait(1000)  # Wait up to 1 second for graceful shutdown
         if self.inner_widget.log_updater.isRunning():
             self.inner_widget.log_updater.terminate()
+        if self.inner_widget.history is not None:
+            self.inner_widget.history.close()
+            self.inner_widget.history = None
         self.ticker_thread.stop_signal.emit()
         self.ticker_thread.terminate()
 
@@ -86,6 +104,9 @@ class StatusPanel(QtWidgets.QWidget):
         ) - self.current_video.video_settings.start_time
 
     def update_speed(self, combined):
+        # Stats lines only count while no command reports -progress events (GIF and modify commands)
+        if self.running_progress():
+            return
         if not combined:
             self.eta_label.setText(f"{t('Time Left')}: N/A")
             return
@@ -112,6 +133,8 @@ class StatusPanel(QtWidgets.QWidget):
             self.eta_label.setText(f"{t('Time Left')}: {timedelta_to_str(data)}")
 
     def update_bitrate(self, bitrate):
+        if self.running_progress():
+            return
         if not bitrate or bitrate.strip() == "N/A":
             self.size_label.setText(f"{t('Size Estimate')}: N/A")
             return
@@ -142,6 +165,81 @@ class StatusPanel(QtWidgets.QWidget):
             elif section.startswith("est out size"):
                 self.size_label.setText(f"{t('Size Estimate')}: {section.rsplit(maxsplit=1)[1]}")
 
+    def command_length(self, video: Video, command_uuid: str) -> float:
+        """Seconds of video a command encodes, its own chunk or the whole selected range"""
+        for command in video.video_settings.conversion_commands:
+            if command.uuid == command_uuid and getattr(command, "duration", None):
+                return command.duration
+        return self.video_length(video)
+
+    def running_progress(self) -> list[tuple[Video, float, ProgressEvent]]:
+        """Video, length and newest progress of every command still running, forgetting the ones that ended"""
+        running = {}
+        for video in self.app.fastflix.conversion_list:
+            for command_uuid in video.status.running_commands:
+                running[(video.uuid, command_uuid)] = video
+        self.progress = {key: event for key, event in self.progress.items() if key in running}
+        return [
+            (running[key], self.command_length(running[key], key[1]), event) for key, event in self.progress.items()
+        ]
+
+    def update_progress(self, event: ProgressEvent):
+        """
+        Combine the progress of everything running (parallel slots and chunks): the time left is that of the
+        slowest command, the size estimate adds up each running video's own estimate.
+        """
+        if not event.out_time:
+            return
+        self.progress[(event.video_uuid, event.command_uuid)] = event
+        progress = self.running_progress()
+        if not progress:
+            return
+
+        remaining = [
+            max(length - command_event.out_time, 0) / command_event.speed
+            for _, length, command_event in progress
+            if command_event.speed and command_event.speed > 0.0001
+        ]
+        if remaining:
+            current_left = timedelta(seconds=int(max(remaining)))
+            self.eta_label.setText(f"{t('Time Left')}: {timedelta_to_str(current_left)}")
+            self.update_queue_eta(current_left.total_seconds())
+        else:
+            self.eta_label.setText(f"{t('Time Left')}: N/A")
+
+        videos = {video.uuid: video for video, _, _ in progress}
+        size_eta = 0.0
+        for video in videos.values():
+            commands = [(length, command_event) for running, length, command_event in progress if running is video]
+            # Chunks of a video encode side by side, together they are as fast as their speeds added up
+            self.main.eta_predictor.observe(video, sum(command_event.speed or 0 for _, command_event in commands))
+            done = sum(command_event.out_time for _, command_event in commands)
+            if all(command_event.total_size for _, command_event in commands):
+                written = sum(command_event.total_size for _, command_event in commands)
+                size_eta += written * (self.video_length(video) / done) / 1_000_000
+            elif all(command_event.bitrate for _, command_event in commands):
+                bitrate = sum(command_event.bitrate * command_event.out_time for _, command_event in commands) / done
+                size_eta += (self.video_length(video) * bitrate) / 8000
+        if size_eta:
+            self.size_label.setText(f"{t('Size Estimate')}: {size_eta:.2f}MB")
+
+    @staticmethod
+    def video_length(video: Video) -> float:
+        return (video.video_settings.end_time or video.duration) - video.video_settings.start_time
+
+    def update_queue_eta(self, current_left: float = 0):
+        """Time left on the current encode plus the predicted time of everything still waiting in the queue"""
+        waiting, unknown = self.main.eta_predictor.queue_eta(
+            self.app.fastflix.conversion_list,
+            slots=self.app.fastflix.config.concurrent_encodes,
+            predict=self.main.video_options.queue.predicted,
+        )
+        if unknown and not waiting:
+            self.queue_eta_label.setText(f"{t('Queue Left')}: N/A")
+            return
+        total = timedelta_to_str(timedelta(seconds=int(current_left + waiting)))
+        self.queue_eta_label.setText(f"{t('Queue Left')}: {total}{'+' if unknown else ''}")
+
     def update_time_elapsed(self):
         now = datetime.datetime.now(datetime.timezone.utc)
 
@@ -166,11 +264,52 @@ class StatusPanel(QtWidgets.QWidget):
         super().close()
 
 
-class Logs(QtWidgets.QTextBrowser):
+class LogHistory:
+    """
+    Full copy of the encoder output shown in the log window, kept on disk so the window itself only has to
+    hold the newest lines. Line offsets are kept in memory so any older section can be read back directly.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = open(path, "w+b")
+        self.offsets = array("Q")
+        self.end = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, lines: List[str]):
+        self.file.seek(self.end)
+        for line in lines:
+            self.offsets.append(self.end)
+            self.end += self.file.write(f"{line}\n".encode("utf-8", errors="replace"))
+
+    def read(self, start: int, stop: int) -> List[str]:
+        """Lines from start up to (not including) stop"""
+        start, stop = max(start, 0), min(stop, len(self.offsets))
+        if start >= stop:
+            return []
+        self.file.seek(self.offsets[start])
+        end = self.offsets[stop] if stop < len(self.offsets) else self.end
+        return self.file.read(end - self.offsets[start]).decode("utf-8", errors="replace").splitlines()
+
+    def close(self):
+        self.file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class Logs(QtWidgets.QPlainTextEdit):
     log_signal = QtCore.Signal(str)
+    log_batch_signal = QtCore.Signal(list)
     clear_window = QtCore.Signal(str)
     timer_signal = QtCore.Signal(str)
 
+    # Lines kept in the window while following the output, older ones are only on disk
+    max_lines = 2000
+    # Lines read back from disk each time the top of the window is reached
+    page_lines = 500
+
     def __init__(self, parent, app: FastFlixApp, main, log_queue):
         super(Logs, self).__init__(parent)
         self.parent = parent
@@ -178,18 +317,48 @@ class Logs(QtWidgets.QTextBrowser):
         self.main = main
         self.status_panel = parent
         self.current_video = None
+        self.history: Optional[LogHistory] = None
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(self.max_lines)
         self.log_signal.connect(self.update_text)
+        self.log_batch_signal.connect(self.update_batch)
         self.clear_window.connect(self.blank)
         self.timer_signal.connect(self.timer_update)
+        self.verticalScrollBar().valueChanged.connect(self.scrolled)
 
         self.log_updater = LogUpdater(self, log_queue)
         self.log_updater.start()
 
-    def update_text(self, msg):
-        if self.status_panel.hide_nal.isChecked() and msg.endswith(("NAL unit 62", "NAL unit 63")):
+    def hidden(self, msg) -> bool:
+        if not self.status_panel.hide_nal.isChecked():
+            return False
+        msg = slot_prefix.sub("", msg)
+        return msg.endswith(("NAL unit 62", "NAL unit 63")) or msg.lstrip().startswith("Last message repeated")
+
+    def add_lines(self, lines: List[str]):
+        if self.history is not None:
+            self.history.add(lines)
+        self.appendPlainText("\n".join(lines))
+
+    def update_batch(self, lines):
+        lines = [line for line in lines if not self.hidden(line)]
+        if not lines:
             return
-        if self.status_panel.hide_nal.isChecked() and msg.lstrip().startswith("Last message repeated"):
+        # Batches hold at most one status line, only it needs to update the labels
+        for line in reversed(lines):
+            line = slot_prefix.sub("", line)
+            if line.startswith("frame=") or "remain" in line:
+                self.update_status(line)
+                break
+        self.add_lines(lines)
+
+    def update_text(self, msg):
+        if self.hidden(msg):
             return
+        self.update_status(slot_prefix.sub("", msg))
+        self.add_lines(msg.splitlines() or [""])
+
+    def update_status(self, msg):
         if msg.startswith("frame="):
             try:
                 frame = {}
@@ -206,7 +375,44 @@ class Logs(QtWidgets.QTextBrowser):
                 pass
         elif "remain" in msg:
             self.status_panel.nvencc_signal.emit(msg)
-        self.append(msg)
+
+    def first_shown_line(self) -> int:
+        """Index in the history of the top line in the window"""
+        return max(len(self.history) - self.document().blockCount(), 0) if self.history is not None else 0
+
+    def scrolled(self, value):
+        scroll_bar = self.verticalScrollBar()
+        if value == scroll_bar.minimum():
+            self.load_older()
+        elif value == scroll_bar.maximum() and self.maximumBlockCount() != self.max_lines:
+            # Back to following the output, drop whatever was read back from disk
+            self.setMaximumBlockCount(self.max_lines)
+
+    def load_older(self):
+        first_shown = self.first_shown_line()
+        if not first_shown:
+            return
+        lines = self.history.read(first_shown - self.page_lines, first_shown)
+        if not lines:
+            return
+        # Lift the cap while looking back, otherwise the lines just read in would be the first ones trimmed
+        self.setMaximumBlockCount(0)
+        cursor = QtGui.QTextCursor(self.document())
+        cursor.movePosition(QtGui.QTextCursor.Start)
+        cursor.insertText("\n".join(lines) + "\n")
+        self.verticalScrollBar().setValue(len(lines))
+
+    def reset_history(self, command_uuid: str):
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+        temp_dir = getattr(self.main, "temp_dir", None)
+        if not temp_dir:
+            return
+        try:
+            self.history = LogHistory(Path(temp_dir) / f"encoder_output_{command_uuid}.log")
+        except OSError:
+            logger.exception("Could not create encoder output history file, only the newest lines will be kept")
 
     def blank(self, data):
         _, video_uuid, command_uuid = data.split(":")
@@ -223,7 +429,9 @@ class Logs(QtWidgets.QTextBrowser):
             self.parent.size_label.setVisible(False)
         else:
             self.parent.size_label.setVisible(True)
-        self.setText("")
+        self.setMaximumBlockCount(self.max_lines)
+        self.clear()
+        self.reset_history(command_uuid)
         self.parent.started_at = datetime.datetime.now(datetime.timezone.utc)
 
     def timer_update(self, cmd):
@@ -284,7 +492,11 @@ class LogUpdater(QtCore.QThread):
                 msg = self.log_queue.get(timeout=0.5)
             except Empty:
                 continue
-            if msg.startswith("CLEAR_WINDOW"):
+            if isinstance(msg, list):
+                self.parent.log_batch_signal.emit(msg)
+            elif isinstance(msg, ProgressEvent):
+                self.parent.status_panel.progress_signal.emit(msg)
+            elif msg.startswith("CLEAR_WINDOW"):
                 self.parent.clear_window.emit(msg)
                 self.parent.timer_signal.emit("START")
             elif msg == "STOP_TIMER":
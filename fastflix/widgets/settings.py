@@ -37,6 +37,8 @@ possible_detect_points = ["1", "2", "4", "6", "8", "10", "15", "20", "25", "50",
 
 scale_digits = ["0", "1", "1.25", "1.5", "1.75", "2", "2.5", "3"]
 scale_percents = ["Disable Scaling", "100%", "125%", "150%", "175%", "200%", "250%", "300%"]
+stall_timeout_minutes = [2, 5, 10, 20, 30, 60]
+thumbnail_cache_sizes = [64, 128, 256, 512, 1024, 2048]
 
 
 class Settings(QtWidgets.QWidget):
@@ -149,6 +151,72 @@ class Settings(QtWidgets.QWidget):
         layout.addWidget(self.crop_detect_points_widget, row, 1)
         row += 1
 
+        # Concurrent Encodes
+        self.concurrent_encodes_widget = QtWidgets.QComboBox()
+        self.concurrent_encodes_widget.addItems([str(x) for x in range(1, 9)])
+        self.concurrent_encodes_widget.setCurrentText(str(self.app.fastflix.config.concurrent_encodes))
+        self.concurrent_encodes_widget.setToolTip(t("Number of queue items to encode at the same time"))
+        layout.addWidget(QtWidgets.QLabel(t("Concurrent Encodes")), row, 0)
+        layout.addWidget(self.concurrent_encodes_widget, row, 1)
+        row += 1
+
+        # GPU Encode Sessions
+        self.gpu_encode_sessions_widget = QtWidgets.QComboBox()
+        self.gpu_encode_sessions_widget.addItems([str(x) for x in range(1, 9)])
+        self.gpu_encode_sessions_widget.setCurrentText(str(self.app.fastflix.config.gpu_encode_sessions))
+        self.gpu_encode_sessions_widget.setToolTip(
+            t("Number of hardware encodes (NVEncC, QSVEncC, VCEEncC, VAAPI...) the GPU can run at the same time")
+        )
+        layout.addWidget(QtWidgets.QLabel(t("GPU Encode Sessions")), row, 0)
+        layout.addWidget(self.gpu_encode_sessions_widget, row, 1)
+        row += 1
+
+        # Stall Watchdog
+        self.stall_timeout_widget = QtWidgets.QComboBox()
+        self.stall_timeout_widget.addItem(t("Disabled"), 0)
+        for minutes in stall_timeout_minutes:
+            self.stall_timeout_widget.addItem(f"{minutes} {t('minutes')}", minutes * 60)
+        if self.stall_timeout_widget.findData(self.app.fastflix.config.stall_timeout) < 0:
+            # Hand edited config value
+            self.stall_timeout_widget.addItem(
+                f"{self.app.fastflix.config.stall_timeout} {t('seconds')}", self.app.fastflix.config.stall_timeout
+            )
+        self.stall_timeout_widget.setCurrentIndex(
+            self.stall_timeout_widget.findData(self.app.fastflix.config.stall_timeout)
+        )
+        self.stall_timeout_widget.setToolTip(
+            t("Stop an encode that has not made any progress for this long, so the rest of the queue keeps going")
+        )
+        self.stall_retries_widget = QtWidgets.QComboBox()
+        self.stall_retries_widget.addItems([str(x) for x in range(0, 4)])
+        self.stall_retries_widget.setCurrentText(str(self.app.fastflix.config.stall_retries))
+        self.stall_retries_widget.setToolTip(t("Times a stalled command is started again before it counts as failed"))
+        stall_layout = QtWidgets.QHBoxLayout()
+        stall_layout.addWidget(self.stall_timeout_widget)
+        stall_layout.addWidget(QtWidgets.QLabel(t("Retries")))
+        stall_layout.addWidget(self.stall_retries_widget)
+        layout.addWidget(QtWidgets.QLabel(t("Stall Timeout")), row, 0)
+        layout.addLayout(stall_layout, row, 1)
+        row += 1
+
+        # Preview Cache
+        self.thumbnail_cache_widget = QtWidgets.QComboBox()
+        self.thumbnail_cache_widget.addItem(t("Disabled"), 0)
+        for size in thumbnail_cache_sizes:
+            self.thumbnail_cache_widget.addItem(f"{size} MB", size)
+        if self.thumbnail_cache_widget.findData(self.app.fastflix.config.thumbnail_cache_size) < 0:
+            # Hand edited config value
+            self.thumbnail_cache_widget.addItem(
+                f"{self.app.fastflix.config.thumbnail_cache_size} MB", self.app.fastflix.config.thumbnail_cache_size
+            )
+        self.thumbnail_cache_widget.setCurrentIndex(
+            self.thumbnail_cache_widget.findData(self.app.fastflix.config.thumbnail_cache_size)
+        )
+        self.thumbnail_cache_widget.setToolTip(t("Disk space kept in the work directory for previews already made"))
+        layout.addWidget(QtWidgets.QLabel(t("Preview Cache")), row, 0)
+        layout.addWidget(self.thumbnail_cache_widget, row, 1)
+        row += 1
+
         # UI Scale
         self.ui_scale_widget = QtWidgets.QComboBox()
         self.ui_scale_widget.addItems(scale_percents)
@@ -458,6 +526,11 @@ class Settings(QtWidgets.QWidget):
         self.app.fastflix.config.logging_level = log_level
         logger.setLevel(log_level)
         self.app.fastflix.config.crop_detect_points = int(self.crop_detect_points_widget.currentText())
+        self.app.fastflix.config.concurrent_encodes = int(self.concurrent_encodes_widget.currentText())
+        self.app.fastflix.config.gpu_encode_sessions = int(self.gpu_encode_sessions_widget.currentText())
+        self.app.fastflix.config.stall_timeout = self.stall_timeout_widget.currentData()
+        self.app.fastflix.config.stall_retries = int(self.stall_retries_widget.currentText())
+        self.app.fastflix.config.thumbnail_cache_size = self.thumbnail_cache_widget.currentData()
 
         new_nvencc = Path(self.nvencc_path.text()) if self.nvencc_path.text().strip() else None
         if str(self.app.fastflix.config.nvencc) != str(new_nvencc):
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import bisect
 from pathlib import Path
 import os
 import logging
@@ -8,7 +9,7 @@ from PySide6 import QtWidgets, QtGui
 from PySide6.QtWidgets import QAbstractItemView
 
 from fastflix.language import t
-from fastflix.flix import probe
+from fastflix.probe_pool import ProbePool, video_stream
 from fastflix.shared import yes_no_message, error_message
 from fastflix.widgets.progress_bar import ProgressBar, Task
 
@@ -164,7 +165,7 @@ class ConcatTable(QtWidgets.QTableView):
         for item in items:
             self.add_item(*item)
 
-    def add_item(self, name, resolution, codec):
+    def add_item(self, name, resolution, codec, row=None):
         filename = QtGui.QStandardItem(name)
         filename.setEditable(False)
         filename.setDropEnabled(False)
@@ -182,7 +183,10 @@ class ConcatTable(QtWidgets.QTableView):
         remove.setDropEnabled(False)
         remove.option_name = name
 
-        self.model.appendRow([filename, res, form, remove])
+        if row is None:
+            self.model.appendRow([filename, res, form, remove])
+        else:
+            self.model.insertRow(row, [filename, res, form, remove])
 
         x_button = CloseButton(self, "X", name)
         x_button.clicked.connect(x_button.close_item)
@@ -287,43 +291,36 @@ class ConcatWindow(QtWidgets.QWidget):
         self.folder_name = folder_name
         self.set_folder_name(folder_name)
 
-        def check_to_add(file, list_of_items, bad_items, **_):
-            try:
-                data = None
-                details = probe(self.app, file)
-                for stream in details.streams:
-                    if stream.codec_type == "video":
-                        data = (file.name, f"{stream.width}x{stream.height}", stream.codec_name)
-                if not data:
-                    raise Exception()
-            except Exception:
-                logger.warning(f"Skipping {file.name} as it is not a video/image file")
-                bad_items.append(file.name)
-            else:
-                list_of_items.append(data)
-
-        items = []
+        files = [
+            file
+            for file in sorted(Path(folder_name).glob("*"), key=lambda x: x.name)
+            if file.is_file() and file.name not in BAD_FILES
+        ]
+        order = {file: i for i, file in enumerate(files)}
+        table = self.concat_area.table
+        table.update_items([])
+        shown = []
         skipped = []
-        tasks = []
-        file_list = sorted(Path(folder_name).glob("*"), key=lambda x: x.name)
-        for file in file_list:
-            if file.is_file():
-                if file.name in BAD_FILES:
-                    continue
-                tasks.append(
-                    Task(
-                        f"Evaluating {file.name}",
-                        command=check_to_add,
-                        kwargs={"file": file, "list_of_items": items, "bad_items": skipped},
-                    )
-                )
-            if len(tasks) > 100:
-                error_message(t("There are more than 100 files, skipping pre-processing."))
-                return self.save((x.name for x in file_list if x.name not in BAD_FILES))
 
-        ProgressBar(self.app, tasks, can_cancel=True, auto_run=True)
+        def scan(signal, stop_signal, **_):
+            # Rows are added as their probes finish, each at its place in the sorted file list
+            with ProbePool(self.app, files) as pool:
+                stop_signal.connect(pool.cancel)
+                while not pool.finished:
+                    for result in pool.drain():
+                        stream = video_stream(result)
+                        if not stream:
+                            logger.warning(f"Skipping {result.file.name} as it is not a video/image file")
+                            skipped.append(result.file.name)
+                            continue
+                        row = bisect.bisect(shown, order[result.file])
+                        shown.insert(row, order[result.file])
+                        table.add_item(result.file.name, f"{stream.width}x{stream.height}", stream.codec_name, row=row)
+                    signal.emit(int(pool.received / len(files) * 100))
+
+        if files:
+            ProgressBar(self.app, [Task(t("Evaluating files"), scan)], signal_task=True, can_cancel=True)
 
-        self.concat_area.table.update_items(items)
         if skipped:
             error_message(
                 "".join(
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import datetime
+import logging
+
+from PySide6 import QtWidgets
+
+from fastflix.language import t
+from fastflix.telemetry import TelemetryStore, telemetry_path
+
+__all__ = ["EncodeHistory"]
+
+logger = logging.getLogger("fastflix")
+
+throughput_columns = {
+    "encoder": "Encoder",
+    "preset": "Preset",
+    "jobs": "Encodes",
+    "avg_fps": "Average FPS",
+    "peak_fps": "Peak FPS",
+    "speed": "Speed",
+    "avg_cpu": "CPU %",
+    "wall_time": "Average Time",
+}
+
+history_columns = {
+    "started": "Started",
+    "name": "Name",
+    "encoder": "Encoder",
+    "preset": "Preset",
+    "wall_time": "Time",
+    "avg_fps": "Average FPS",
+    "speed": "Speed",
+    "output_size": "Size",
+    "status": "Status",
+}
+
+
+def cell_text(column: str, value) -> str:
+    if value is None:
+        return ""
+    if column == "started":
+        return datetime.datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M")
+    if column == "wall_time":
+        return str(datetime.timedelta(seconds=int(value)))
+    if column == "output_size":
+        return f"{value / 2**20:,.1f} MiB"
+    if column == "speed":
+        return f"{value:.2f}x"
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+class EncodeHistory(QtWidgets.QWidget):
+    def __init__(self):
+        super().__init__(None)
+        self.setWindowTitle(t("Encode History"))
+        self.setMinimumSize(900, 500)
+
+        self.encoder_filter = QtWidgets.QComboBox()
+        self.encoder_filter.currentIndexChanged.connect(self.refresh)
+        self.throughput_table = self.new_table(throughput_columns)
+        self.history_table = self.new_table(history_columns)
+
+        filter_layout = QtWidgets.QHBoxLayout()
+        filter_layout.addWidget(QtWidgets.QLabel(t("Encoder")))
+        filter_layout.addWidget(self.encoder_filter)
+        filter_layout.addStretch(1)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(filter_layout)
+        layout.addWidget(QtWidgets.QLabel(t("Throughput")))
+        layout.addWidget(self.throughput_table)
+        layout.addWidget(QtWidgets.QLabel(t("Recent Commands")))
+        layout.addWidget(self.history_table, 2)
+        self.setLayout(layout)
+
+        self.encoder_filter.blockSignals(True)
+        self.encoder_filter.addItem(t("All"), "")
+        for row in self.query("throughput"):
+            if self.encoder_filter.findData(row["encoder"]) < 0:
+                self.encoder_filter.addItem(row["encoder"], row["encoder"])
+        self.encoder_filter.blockSignals(False)
+        self.refresh()
+
+    @staticmethod
+    def new_table(columns: dict) -> QtWidgets.QTableWidget:
+        table = QtWidgets.QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels([t(label) for label in columns.values()])
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.verticalHeader().setVisible(False)
+        return table
+
+    @staticmethod
+    def query(method: str, **kwargs) -> list[dict]:
+        if not telemetry_path.exists():
+            return []
+        try:
+            store = TelemetryStore(telemetry_path, read_only=True)
+        except Exception:
+            logger.exception("Could not open the encode telemetry store")
+            return []
+        try:
+            return getattr(store, method)(**kwargs)
+        finally:
+            store.close()
+
+    @staticmethod
+    def fill(table: QtWidgets.QTableWidget, columns: dict, rows: list[dict]):
+        table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            for column_index, column in enumerate(columns):
+                table.setItem(row_index, column_index, QtWidgets.QTableWidgetItem(cell_text(column, row[column])))
+        table.resizeColumnsToContents()
+
+    def refresh(self):
+        encoder = self.encoder_filter.currentData() or ""
+        self.fill(self.throughput_table, throughput_columns, self.query("throughput", encoder=encoder))
+        self.fill(self.history_table, history_columns, self.query("history", encoder=encoder, limit=200))
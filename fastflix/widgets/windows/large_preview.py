@@ -1,18 +1,21 @@
 # -*- coding: utf-8 -*-
 import logging
-from pathlib import Path
 from subprocess import run, PIPE
 from typing import Optional, TYPE_CHECKING
-import secrets
 
+import cv2
+import numpy as np
 from PySide6 import QtWidgets, QtCore, QtGui
 
 from fastflix.flix import (
     generate_thumbnail_command,
 )
 from fastflix.encoders.common import helpers
+from fastflix.frame_server import can_serve, scaled_size, transform_frame
 from fastflix.resources import get_icon
 from fastflix.language import t
+from fastflix.thumbnail_cache import ThumbnailCache
+from fastflix.widgets.background_tasks import frame_to_image
 
 if TYPE_CHECKING:
     from fastflix.widgets.main import Main
@@ -47,8 +50,6 @@ class LargePreview(QtWidgets.QWidget):
         self.setMaximumHeight(size.height())
         self.setMinimumSize(400, 400)
         self.current_image = QtGui.QPixmap(get_icon("onyx-cover", self.main.app.fastflix.config.theme))
-        self.last_path: Optional[Path] = None
-        self.last_command = "NOPE"
         self.setWindowTitle(t("Preview - Press Q to Exit"))
 
     def keyPressEvent(self, a0: QtGui.QKeyEvent) -> None:
@@ -69,42 +70,82 @@ class LargePreview(QtWidgets.QWidget):
             if not settings.get("color_transfer"):
                 settings["color_transfer"] = self.main.app.fastflix.current_video.color_transfer
 
+        use_keyframes = self.main.app.fastflix.config.use_keyframes_for_preview
         filters = helpers.generate_filters(
             enable_opencl=False,
-            start_filters="select=eq(pict_type\\,I)"
-            if self.main.app.fastflix.config.use_keyframes_for_preview
-            else None,
+            start_filters="select=eq(pict_type\\,I)" if use_keyframes else None,
             scale=self.main.app.fastflix.current_video.scale,
             **settings,
         )
 
-        output = self.main.app.fastflix.config.work_path / f"large_preview_{secrets.token_hex(16)}.tiff"
+        cache = self.main.thumbnail_cache
+        key = ThumbnailCache.key(
+            self.main.source_material,
+            self.main.app.fastflix.current_video.video_settings.selected_track,
+            self.main.preview_place,
+            filters,
+        )
+        if cached := cache.get(key):
+            image = QtGui.QPixmap()
+            image.loadFromData(cached)
+            self.show_image(image)
+            return
 
+        # The frame server reads the exact frame, not the keyframe the select filter would pick
+        if not use_keyframes and (frame := self.frame_server_image(settings)) is not None:
+            success, encoded = cv2.imencode(".png", frame)
+            if success:
+                cache.put(key, encoded.tobytes())
+            self.show_image(QtGui.QPixmap.fromImage(frame_to_image(frame)))
+            return
+
+        # Lossless, read straight from FFmpeg's stdout
         thumb_command = generate_thumbnail_command(
             config=self.main.app.fastflix.config,
             source=self.main.source_material,
-            output=output,
             filters=filters,
             start_time=self.main.preview_place,
             input_track=self.main.app.fastflix.current_video.video_settings.selected_track,
+            image_codec="png",
         )
-        if thumb_command == self.last_command:
-            return
 
         logger.info(f"Generating large thumbnail: {thumb_command}")
 
-        thumb_run = run(thumb_command, shell=True, stderr=PIPE, stdout=PIPE)
-        if thumb_run.returncode > 0:
-            logger.warning(f"Could not generate large thumbnail: {thumb_run.stdout} |----| {thumb_run.stderr}")
+        thumb_run = run(thumb_command, stdin=PIPE, stderr=PIPE, stdout=PIPE)
+        image = QtGui.QPixmap()
+        if thumb_run.returncode > 0 or not image.loadFromData(thumb_run.stdout):
+            logger.warning(f"Could not generate large thumbnail: {thumb_run.stderr}")
             return
 
-        self.current_image = QtGui.QPixmap(str(output))
-        if self.last_path:
-            try:
-                self.last_path.unlink(missing_ok=True)
-            except OSError:
-                logger.warning(f"Could not delete last large preview {self.last_path}")
-        self.last_path = output
+        cache.put(key, thumb_run.stdout)
+        self.show_image(image)
+
+    def frame_server_image(self, settings: dict) -> Optional[np.ndarray]:
+        """Full size preview frame straight from the frame server, None when FFmpeg has to make it"""
+        scale = self.main.app.fastflix.current_video.scale
+        if not can_serve(settings) or not (server := self.main.preview_frame_server()):
+            return None
+        try:
+            if scale:
+                scaled_size(1, 1, scale)
+            frame = server.frame(self.main.preview_place)
+            if frame is None:
+                return None
+            frame = transform_frame(
+                frame,
+                crop=settings.get("crop"),
+                scale=scale,
+                rotate=settings.get("rotate", 0),
+                vertical_flip=settings.get("vertical_flip", False),
+                horizontal_flip=settings.get("horizontal_flip", False),
+            )
+        except Exception:
+            logger.debug("Frame server could not make the large preview, using FFmpeg")
+            return None
+        return frame
+
+    def show_image(self, image: QtGui.QPixmap):
+        self.current_image = image
         self.label.setPixmap(self.current_image)
         self.resize(self.current_image.width(), self.current_image.height())
 
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+from unittest import mock
+
+from fastflix.encoders.common.chunking import (
+    build_chunked,
+    build_sample,
+    chunk_boundaries,
+    chunking_unsupported_reason,
+)
+from fastflix.ff_queue import execute_requests, resumable_commands
+from fastflix.encoders.svt_av1.command_builder import build
+from fastflix.models.encode import SVTAV1Settings, x265Settings
+from fastflix.models.video import VideoSettings
+
+from tests.conftest import create_fastflix_instance
+
+
+def _chunked_instance(tmp_path, duration=300, chunk_length=60, **settings):
+    fastflix = create_fastflix_instance(
+        encoder_settings=SVTAV1Settings(qp=24, qp_mode="crf", speed="7", **settings),
+        video_settings=VideoSettings(
+            remove_hdr=True,
+            output_path=tmp_path / "output.mkv",
+            chunked_encoding=True,
+            chunk_length=chunk_length,
+        ),
+    )
+    fastflix.current_video.duration = duration
+    fastflix.current_video.work_path = tmp_path
+    return fastflix
+
+
+def test_chunk_boundaries_snap_to_keyframes(tmp_path):
+    """Split points move back to the keyframe found before each even split"""
+    fastflix = _chunked_instance(tmp_path)
+    with mock.patch(
+        "fastflix.encoders.common.chunking.keyframe_before", side_effect=lambda *args: args[3] - 2.5
+    ) as keyframes:
+        boundaries = chunk_boundaries(fastflix)
+
+    assert keyframes.call_count == 4
+    assert boundaries == [(0, 57.5), (57.5, 117.5), (117.5, 177.5), (177.5, 237.5), (237.5, 300)]
+
+
+def test_chunk_boundaries_short_video(tmp_path):
+    """Videos shorter than two chunks are not split"""
+    fastflix = _chunked_instance(tmp_path, duration=90)
+    with mock.patch("fastflix.encoders.common.chunking.keyframe_before") as keyframes:
+        assert chunk_boundaries(fastflix) == []
+    keyframes.assert_not_called()
+
+
+def test_chunking_unsupported_reason(tmp_path):
+    """Only the slow CPU encoders and sources without frame based metadata are chunked"""
+    fastflix = _chunked_instance(tmp_path)
+    assert chunking_unsupported_reason(fastflix, "AV1 (SVT AV1)") == ""
+    assert chunking_unsupported_reason(fastflix, "AVC (x264)")
+
+    fastflix.current_video.video_settings.video_encoder_settings = x265Settings(hdr10plus_metadata="meta.json")
+    assert "HDR10+" in chunking_unsupported_reason(fastflix, "HEVC (x265)")
+
+
+def test_build_chunked_two_pass(tmp_path):
+    """Every pass of every chunk is grouped, then a single join command muxes the result"""
+    fastflix = _chunked_instance(tmp_path, duration=180, single_pass=False, bitrate="4000k")
+    with mock.patch("fastflix.encoders.common.chunking.keyframe_before", return_value=None):
+        commands = build_chunked(build, fastflix, "AV1 (SVT AV1)")
+
+    assert fastflix.current_video.video_settings.output_path == tmp_path / "output.mkv"
+    assert [command.parallel_group for command in commands] == ["chunks_0"] * 3 + ["chunks_1"] * 3 + [None]
+    assert [command.duration for command in commands] == [60.0] * 6 + [None]
+
+    first_chunk = commands[0].command
+    assert "-ss" not in first_chunk
+    assert first_chunk[first_chunk.index("-to") + 1] == "60.0"
+    last_chunk = commands[5].command
+    assert last_chunk[last_chunk.index("-ss") + 1] == "120.0"
+    assert "-to" not in last_chunk
+    assert last_chunk[-1].endswith("chunk_0002.mkv")
+
+    join = commands[-1].command
+    assert join[join.index("-f") + 1 : join.index("-f") + 6] == [
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(tmp_path / "chunks.txt"),
+    ]
+    assert join[join.index("-c:v") + 1] == "copy"
+    assert join[-1] == str(tmp_path / "output.mkv")
+
+    # The chunk list is written when the join is sent to run, not while settings change
+    assert not (tmp_path / "chunks.txt").exists()
+    video = fastflix.current_video
+    video.video_settings.conversion_commands = commands
+    video.status.completed_commands = [command.uuid for command in commands[:-1]]
+    assert [request[2] for request in execute_requests(video)] == [commands[-1].uuid]
+    assert (tmp_path / "chunks.txt").read_text(encoding="utf-8").count("file '") == 3
+
+
+def test_keyframes_only_looked_up_for_the_queue(tmp_path):
+    """Settings changes split evenly, the ffprobe keyframe lookups only run once the video is queued"""
+    fastflix = _chunked_instance(tmp_path, duration=180, single_pass=True)
+    with mock.patch("fastflix.encoders.common.chunking.keyframe_before", return_value=None) as keyframes:
+        build_chunked(build, fastflix, "AV1 (SVT AV1)")
+        keyframes.assert_not_called()
+        build_chunked(build, fastflix, "AV1 (SVT AV1)", snap_to_keyframes=True)
+        assert keyframes.call_count == 2
+
+
+def test_build_sample(tmp_path):
+    """A few seconds from the middle of the selected range, encoded with the video's own settings"""
+    fastflix = _chunked_instance(tmp_path, duration=180)
+    fastflix.current_video.video_settings.start_time = 20
+    commands, duration = build_sample(build, fastflix)
+
+    assert duration == 5
+    assert fastflix.current_video.video_settings.output_path == tmp_path / "output.mkv"
+    sample = commands[-1].command
+    assert sample[sample.index("-ss") + 1] == "97.5"
+    assert sample[sample.index("-to") + 1] == "102.5"
+    assert sample[-1] == str(tmp_path / "eta_sample.mkv")
+
+    fastflix.current_video.work_path = None
+    assert build_sample(build, fastflix) == ([], 0)
+
+
+def test_build_chunked_falls_back(tmp_path):
+    """Unsupported encoders get the normal unchunked commands"""
+    fastflix = _chunked_instance(tmp_path)
+    normal_build = mock.Mock(return_value=["normal"])
+    assert build_chunked(normal_build, fastflix, "AVC (x264)") == ["normal"]
+    normal_build.assert_called_once_with(fastflix=fastflix)
+
+
+def test_resume_keeps_finished_chunks(tmp_path):
+    """Only completed chunks whose output is still on disk are skipped when the queue is resumed"""
+    fastflix = _chunked_instance(tmp_path, duration=180, single_pass=True)
+    with mock.patch("fastflix.encoders.common.chunking.keyframe_before", return_value=None):
+        commands = build_chunked(build, fastflix, "AV1 (SVT AV1)")
+    video = fastflix.current_video
+    video.video_settings.conversion_commands = commands
+
+    first, second, third, join = commands
+    (tmp_path / "chunk_0000.mkv").write_bytes(b"chunk")
+    video.status.completed_commands = [first.uuid, second.uuid, join.uuid]
+    video.status.current_command = 3
+    video.status.running = True
+
+    assert resumable_commands(video) == [first.uuid]
+    video.status.clear_for_resume(resumable_commands(video))
+    assert video.status.completed_commands == [first.uuid]
+    assert video.status.current_command == 1
+    assert video.status.ready
+
+
+def test_resume_needs_both_passes_of_a_chunk(tmp_path):
+    """A chunk that only finished its first pass starts over, its pass log may be gone"""
+    fastflix = _chunked_instance(tmp_path, duration=180, single_pass=False, bitrate="4000k")
+    with mock.patch("fastflix.encoders.common.chunking.keyframe_before", return_value=None):
+        commands = build_chunked(build, fastflix, "AV1 (SVT AV1)")
+    video = fastflix.current_video
+    video.video_settings.conversion_commands = commands
+
+    first_passes, second_passes = commands[:3], commands[3:6]
+    (tmp_path / "chunk_0000.mkv").write_bytes(b"chunk")
+    video.status.completed_commands = [command.uuid for command in first_passes] + [second_passes[0].uuid]
+
+    assert resumable_commands(video) == [first_passes[0].uuid, second_passes[0].uuid]
@@ -258,3 +258,21 @@ def test_hevc_x265_tune_profile():
         assert "animation" in cmd
         assert "-profile:v" in cmd
         assert "main10" in cmd
+
+
+def test_hevc_x265_concurrent_thread_budget():
+    """With several concurrent encodes, x265 gets a thread pool and frame threads sized to its share of cores"""
+    fastflix = create_fastflix_instance(
+        encoder_settings=x265Settings(crf=22, frame_threads=0),
+        video_settings=VideoSettings(remove_hdr=True),
+    )
+    fastflix.config.concurrent_encodes = 2
+
+    with mock.patch("fastflix.scheduler.usable_cores", return_value=list(range(16))):
+        cmd = build(fastflix)[0].command
+
+    params = cmd[cmd.index("-x265-params") + 1].split(":")
+    assert "pools=8" in params
+    assert "frame-threads=3" in params
+    assert cmd[cmd.index("-threads") + 1] == "8"
+    assert cmd[cmd.index("-filter_threads") + 1] == "8"
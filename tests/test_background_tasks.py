@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from PySide6 import QtCore, QtGui
+
+from fastflix.thumbnail_cache import ThumbnailCache
+from fastflix.encoders.common.helpers import Command
+from fastflix.widgets.background_tasks import EtaSampler, FilmstripCreator, ThumbnailCreator
+
+
+class FakeMain(QtCore.QObject):
+    thumbnail_complete = QtCore.Signal(int, int)
+    preview_frame_ready = QtCore.Signal(int, QtGui.QImage)
+    thread_logging_signal = QtCore.Signal(str)
+    filmstrip_ready = QtCore.Signal(str, QtGui.QImage)
+    eta_sample_ready = QtCore.Signal(str, float, float)
+
+
+def test_cancelled_thumbnail_kills_ffmpeg_and_reports_nothing():
+    main = FakeMain()
+    results = []
+    main.thumbnail_complete.connect(lambda request, status: results.append((request, status)))
+
+    creator = ThumbnailCreator(main, [sys.executable, "-c", "import time; time.sleep(30)"], request=4)
+    runner = threading.Thread(target=creator.run)
+    started = time.monotonic()
+    runner.start()
+    while creator.process is None:
+        time.sleep(0.01)
+    creator.cancel()
+    runner.join(10)
+    assert not runner.is_alive()
+    assert time.monotonic() - started < 10
+    assert results == []
+
+
+def test_thumbnail_read_from_stdout(tmp_path):
+    main = FakeMain()
+    results = []
+    main.thumbnail_complete.connect(lambda request, status: results.append((request, status)))
+    main.preview_frame_ready.connect(lambda request, image: results.append((request, image.size().toTuple())))
+    picture = tmp_path / "picture.png"
+    picture.write_bytes(cv2.imencode(".png", np.zeros((24, 32, 3), np.uint8))[1].tobytes())
+    write_picture = f"import sys; sys.stdout.buffer.write(open({str(picture)!r}, 'rb').read())"
+
+    ThumbnailCreator(main, [sys.executable, "-c", write_picture], request=7).run()
+    assert results == [(7, (32, 24))]
+
+    ThumbnailCreator(main, [sys.executable, "-c", "pass"], request=8).run()
+    assert results[-1] == (8, 0)
+
+
+def test_filmstrips_made_one_at_a_time_and_cancelled(tmp_path):
+    main = FakeMain()
+    results = []
+    main.filmstrip_ready.connect(
+        lambda key, image: results.append((key, image.isNull())), QtCore.Qt.ConnectionType.DirectConnection
+    )
+    cache = ThumbnailCache(tmp_path / "cache", 2**20)
+    picture = tmp_path / "picture.png"
+    picture.write_bytes(cv2.imencode(".png", np.zeros((24, 32, 3), np.uint8))[1].tobytes())
+    write_picture = [sys.executable, "-c", f"import sys; sys.stdout.buffer.write(open({str(picture)!r}, 'rb').read())"]
+    sleep = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+    worker = FilmstripCreator(main)
+    worker.add("b", write_picture, cache)
+    worker.add("gone", write_picture, cache)
+    worker.add("slow", sleep, cache)
+    worker.add("a", write_picture, cache, first=True)
+    worker.discard("gone")
+    runner = threading.Thread(target=worker.run)
+    runner.start()
+    while len(results) < 2 or worker.process is None:
+        time.sleep(0.01)
+    assert results == [("a", False), ("b", False)]
+    assert worker.current == "slow"
+    assert "a" in cache and "b" in cache
+
+    worker.discard("slow")
+    worker.add("failed", [sys.executable, "-c", "raise SystemExit(1)"], cache)
+    while len(results) < 3:
+        time.sleep(0.01)
+    assert results[-1] == ("failed", True)
+
+    worker.add("slow", sleep, cache)
+    while worker.process is None:
+        time.sleep(0.01)
+    started = time.monotonic()
+    worker.cancel()
+    runner.join(10)
+    assert not runner.is_alive()
+    assert time.monotonic() - started < 10
+    assert len(results) == 3
+
+
+def test_eta_samples_timed_and_cleaned_up(tmp_path):
+    main = FakeMain()
+    results = []
+    main.eta_sample_ready.connect(
+        lambda video, elapsed, duration: results.append((video, elapsed > 0, duration)),
+        QtCore.Qt.ConnectionType.DirectConnection,
+    )
+    output = tmp_path / "eta_sample.mkv"
+    write_sample = Command(command=[sys.executable, "-c", f"open({str(output)!r}, 'w').write('x')", str(output)])
+    sleep = Command(command=[sys.executable, "-c", "import time; time.sleep(30)"])
+
+    sampler = EtaSampler(main)
+    sampler.add(("x265", "slow"), "one", [write_sample], 5.0, tmp_path)
+    # Same settings, one sample predicts both
+    sampler.add(("x265", "slow"), "two", [write_sample], 5.0, tmp_path)
+    sampler.add(
+        ("x265", "fast"), "three", [Command(command=[sys.executable, "-c", "raise SystemExit(1)"])], 5.0, tmp_path
+    )
+    sampler.add(("svt-av1",), "four", [sleep], 5.0, tmp_path)
+    runner = threading.Thread(target=sampler.run)
+    runner.start()
+    while sampler.process is None or sampler.current != "four":
+        time.sleep(0.01)
+    assert results == [("one", True, 5.0), ("three", False, 5.0)]
+    assert not output.exists()
+
+    started = time.monotonic()
+    sampler.cancel()
+    runner.join(10)
+    assert not runner.is_alive()
+    assert time.monotonic() - started < 10
+    assert len(results) == 2
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+from box import Box
+
+from fastflix import cli, conversion_worker, telemetry
+from fastflix.cli import HeadlessQueue
+from fastflix.ff_queue import execute_requests, get_queue, save_queue
+from fastflix.models.encode import x265Settings
+from fastflix.models.video import Video, VideoSettings
+
+
+@pytest.fixture(autouse=True)
+def logs_in_tmp(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversion_worker, "log_path", tmp_path / "logs")
+    monkeypatch.setattr(cli, "log_path", tmp_path / "logs")
+    monkeypatch.setattr(conversion_worker, "telemetry_path", tmp_path / "telemetry.sqlite")
+    monkeypatch.setattr(telemetry, "telemetry_path", tmp_path / "telemetry.sqlite")
+
+
+def make_queue(tmp_path, *scripts):
+    video = Video(
+        source=tmp_path / "source.mkv",
+        duration=10,
+        streams=Box(video=[]),
+        format=Box(),
+        work_path=tmp_path / "work",
+        video_settings=VideoSettings(
+            output_path=tmp_path / "output.mkv",
+            video_encoder_settings=x265Settings(),
+            conversion_commands=[
+                {"command": [sys.executable, "-c", script], "name": f"step {i}", "uuid": f"command-{i}", "shell": False}
+                for i, script in enumerate(scripts)
+            ],
+        ),
+    )
+    queue_file = tmp_path / "queue.yaml"
+    save_queue([video], queue_file)
+    return queue_file, video.uuid
+
+
+def run(queue_file):
+    out = io.StringIO()
+    exit_code = HeadlessQueue(queue_file, out=out).run()
+    return exit_code, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_run_queue_success(tmp_path):
+    """Every command runs in order, the finished video is saved back to the queue file"""
+    queue_file, video_uuid = make_queue(tmp_path, "print('one')", "print('two')")
+    exit_code, events = run(queue_file)
+
+    assert exit_code == 0
+    assert [event["event"] for event in events] == [
+        "queue",
+        "start",
+        "complete",
+        "start",
+        "complete",
+        "video_complete",
+        "summary",
+    ]
+    assert events[-1]["complete"] == 1
+    assert get_queue(queue_file)[0].status.complete
+
+    # Nothing left to do on a second run
+    assert run(queue_file)[1][-1]["total"] == 0
+
+
+def test_run_queue_failure(tmp_path):
+    queue_file, _ = make_queue(tmp_path, "import sys; sys.exit(3)", "print('never')")
+    exit_code, events = run(queue_file)
+
+    assert exit_code == 1
+    assert [event["event"] for event in events] == ["queue", "start", "error", "summary"]
+    assert events[-1]["failed"] == 1
+
+
+def test_run_queue_does_not_import_qt():
+    code = "import sys, fastflix.cli, fastflix.entry; print(any(m.startswith('PySide6') for m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.stdout.strip() == "False", result.stderr
+
+
+def test_execute_requests_send_a_whole_chunk_group(tmp_path):
+    """The GUI and the headless runner share this, chunks go out together and finished ones are skipped"""
+    queue_file, _ = make_queue(tmp_path, "print('chunk 0')", "print('chunk 1')", "print('join')")
+    video = get_queue(queue_file)[0]
+    for command in video.video_settings.conversion_commands[:2]:
+        command.parallel_group = "chunks_0"
+    video.status.completed_commands = ["command-0"]
+
+    requests = execute_requests(video, {"encoder": "x265"})
+    assert [request[2] for request in requests] == ["command-1"]
+    assert requests[0][0] == "execute" and requests[0][-1] == {"encoder": "x265"}
+    assert video.status.running_commands == ["command-1"] and video.status.running
+
+    video.status.completed_commands = ["command-0", "command-1"]
+    assert [request[2] for request in execute_requests(video)] == ["command-2"]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+from queue import Queue
+
+from fastflix.command_runner import BackgroundRunner, LogBatcher
+from fastflix.progress import ProgressEvent
+
+
+def log_lines(log_queue):
+    lines = []
+    for message in list(log_queue.queue):
+        assert isinstance(message, (list, ProgressEvent)), message
+        if isinstance(message, list):
+            lines.extend(message)
+    return lines
+
+
+def run_script(script, tmp_path, **kwargs):
+    log_queue = Queue()
+    runner = BackgroundRunner(log_queue)
+    runner.start_exec([sys.executable, "-c", script], work_dir=str(tmp_path), **kwargs)
+    for _ in range(200):
+        if not runner.is_alive():
+            break
+        time.sleep(0.05)
+    return runner, log_lines(log_queue)
+
+
+def test_carriage_returns_split_lines(tmp_path):
+    """Status lines redrawn with \\r arrive as separate lines"""
+    script = "import sys; sys.stderr.write('1 frames\\r2 frames\\r3 frames\\n'); sys.stdout.write('a\\r\\nb')"
+    _, messages = run_script(script, tmp_path)
+    assert [msg for msg in messages if msg.endswith("frames")] == ["1 frames", "2 frames", "3 frames"]
+    assert "a" in messages
+    assert "b" in messages
+
+
+def test_error_detected_on_final_output(tmp_path):
+    """Errors printed right before the process exits are still detected"""
+    script = "import sys; sys.stderr.write('Conversion failed!\\n')"
+    runner, _ = run_script(script, tmp_path)
+    assert runner.error_detected
+
+
+def test_success_message_detected(tmp_path):
+    """Custom success strings are matched on stdout"""
+    runner, _ = run_script("print('all good')", tmp_path, successes=("all good",))
+    assert runner.success_detected
+    assert not runner.error_detected
+
+
+def test_batcher_collapses_status_lines():
+    """Only the newest status line and progress event of a batch are sent"""
+    sent = []
+    batcher = LogBatcher(sent.append, max_lines=10)
+    batcher.add("x265 [info]: tune: ssim")
+    batcher.add("frame=    1 fps=0.0 q=0.0 size=       0kB time=00:00:00.00 bitrate=N/A speed=   0x")
+    batcher.add("[1.2%] 12/1000 frames, 3.1 fps")
+    batcher.add("[1.3%] 13/1000 frames, 3.1 fps")
+    batcher.add(ProgressEvent(frame=1))
+    batcher.add(ProgressEvent(frame=2))
+    batcher.flush()
+
+    assert sent == [["x265 [info]: tune: ssim", "[1.3%] 13/1000 frames, 3.1 fps"], ProgressEvent(frame=2)]
+
+
+def test_batcher_flushes_when_full():
+    """A full batch is sent right away instead of waiting for the timer"""
+    sent = []
+    batcher = LogBatcher(sent.append, max_lines=3)
+    for i in range(7):
+        batcher.add(f"line {i}")
+    assert sent == [["line 0", "line 1", "line 2"], ["line 3", "line 4", "line 5"]]
+    batcher.stop()
+    assert sent[-1] == ["line 6"]
+
+
+def test_batcher_prefixes_lines():
+    sent = []
+    batcher = LogBatcher(sent.append, prefix="[2] ")
+    batcher.add("x265 [info]: tune: ssim")
+    batcher.add("frame=    1 fps=0.0 q=0.0 size=       0kB time=00:00:00.00 bitrate=N/A speed=   0x")
+    batcher.add("frame=    2 fps=0.0 q=0.0 size=       0kB time=00:00:00.00 bitrate=N/A speed=   0x")
+    batcher.stop()
+    assert sent == [
+        [
+            "[2] x265 [info]: tune: ssim",
+            "[2] frame=    2 fps=0.0 q=0.0 size=       0kB time=00:00:00.00 bitrate=N/A speed=   0x",
+        ]
+    ]
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+import time
+from queue import Queue
+
+import pytest
+
+from fastflix import conversion_worker
+from fastflix.command_runner import BackgroundRunner, StallWatchdog
+from fastflix.conversion_worker import queue_worker
+from fastflix.progress import ProgressEvent
+
+
+class FakeGUIProcess:
+    def is_alive(self):
+        return True
+
+    def join(self):
+        pass
+
+
+def sleep_command(seconds: float) -> str:
+    return f'"{sys.executable}" -c "import time; time.sleep({seconds})"'
+
+
+@pytest.fixture
+def worker_queues(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversion_worker, "log_path", tmp_path)
+    monkeypatch.setattr(conversion_worker, "telemetry_path", tmp_path / "telemetry.sqlite")
+    return Queue(), Queue(), Queue()
+
+
+def execute_request(video_uuid, command_uuid, work_dir, seconds=0.5):
+    return ["execute", video_uuid, command_uuid, sleep_command(seconds), str(work_dir), video_uuid, True]
+
+
+def drain(status_queue):
+    statuses = []
+    while not status_queue.empty():
+        statuses.append(status_queue.get())
+    return statuses
+
+
+def test_concurrent_slots_run_together(tmp_path, worker_queues):
+    """Two commands with two slots should overlap instead of running back to back"""
+    worker_queue, status_queue, log_queue = worker_queues
+    worker_queue.put(["concurrency", 2])
+    worker_queue.put(execute_request("video-1", "command-1", tmp_path, seconds=1))
+    worker_queue.put(execute_request("video-2", "command-2", tmp_path, seconds=1))
+    worker_queue.put(["shutdown"])
+
+    start = time.perf_counter()
+    queue_worker(FakeGUIProcess(), worker_queue, status_queue, log_queue)
+    elapsed = time.perf_counter() - start
+
+    statuses = drain(status_queue)
+    assert sorted(statuses) == [("complete", "video-1", "command-1"), ("complete", "video-2", "command-2")]
+    assert elapsed < 1.9
+    # The second command joins the first one's output in the log window instead of wiping it
+    clears = [msg for msg in log_queue.queue if isinstance(msg, str) and msg.startswith("CLEAR_WINDOW")]
+    assert clears == ["CLEAR_WINDOW:video-1:command-1"]
+
+
+def test_single_slot_waits_for_free_slot(tmp_path, worker_queues):
+    """With the default single slot, the second execute waits until the first command finishes"""
+    worker_queue, status_queue, log_queue = worker_queues
+    worker_queue.put(execute_request("video-1", "command-1", tmp_path, seconds=0.2))
+    worker_queue.put(execute_request("video-2", "command-2", tmp_path, seconds=0.2))
+
+    # Shutdown drops anything still waiting, so only send it once both have been picked up
+    def shutdown_when_done():
+        while status_queue.qsize() < 2:
+            time.sleep(0.05)
+        worker_queue.put(["shutdown"])
+
+    threading.Thread(target=shutdown_when_done, daemon=True).start()
+    queue_worker(FakeGUIProcess(), worker_queue, status_queue, log_queue)
+
+    statuses = drain(status_queue)
+    assert statuses == [("complete", "video-1", "command-1"), ("complete", "video-2", "command-2")]
+    assert log_queue.queue.count("STOP_TIMER") == 2
+
+
+def test_cancel_single_video(tmp_path, worker_queues):
+    """Cancelling one video leaves the other slot running"""
+    worker_queue, status_queue, log_queue = worker_queues
+    worker_queue.put(["concurrency", 2])
+    worker_queue.put(execute_request("video-1", "command-1", tmp_path, seconds=5))
+    worker_queue.put(execute_request("video-2", "command-2", tmp_path, seconds=0.5))
+    worker_queue.put(["cancel", "video-1"])
+    worker_queue.put(["shutdown"])
+
+    queue_worker(FakeGUIProcess(), worker_queue, status_queue, log_queue)
+
+    statuses = drain(status_queue)
+    assert statuses == [("cancelled", "video-1", "command-1"), ("complete", "video-2", "command-2")]
+
+
+@pytest.fixture
+def quick_watchdog(monkeypatch):
+    monkeypatch.setattr(StallWatchdog, "check_interval", 0.1)
+
+
+def test_stalled_command_is_stopped(tmp_path, worker_queues, quick_watchdog):
+    """A command that neither writes output nor uses CPU is killed once the stall timeout passes"""
+    worker_queue, status_queue, log_queue = worker_queues
+    worker_queue.put(execute_request("video-1", "command-1", tmp_path, seconds=30))
+    worker_queue.put(["shutdown"])
+
+    start = time.perf_counter()
+    queue_worker(FakeGUIProcess(), worker_queue, status_queue, log_queue, stall_timeout=0.5)
+
+    assert drain(status_queue) == [("error", "video-1", "command-1")]
+    assert time.perf_counter() - start < 10
+
+
+def test_stalled_command_is_retried(tmp_path, worker_queues, quick_watchdog):
+    """The first run hangs, the restarted one finishes"""
+    worker_queue, status_queue, log_queue = worker_queues
+    marker = tmp_path / "started_once"
+    script = (
+        "import pathlib, time\n"
+        f"marker = pathlib.Path({str(marker)!r})\n"
+        "if not marker.exists():\n"
+        "    marker.touch()\n"
+        "    time.sleep(30)\n"
+    )
+    worker_queue.put(["watchdog", 0.5, 1])
+    worker_queue.put(["execute", "video-1", "command-1", [sys.executable, "-c", script], str(tmp_path), "v", False])
+
+    def shutdown_when_done():
+        while status_queue.empty():
+            time.sleep(0.05)
+        worker_queue.put(["shutdown"])
+
+    threading.Thread(target=shutdown_when_done, daemon=True).start()
+    queue_worker(FakeGUIProcess(), worker_queue, status_queue, log_queue)
+
+    assert drain(status_queue) == [("complete", "video-1", "command-1")]
+    assert any(isinstance(msg, list) and "stalled" in msg[0] for msg in log_queue.queue)
+
+
+def test_watchdog_follows_progress(monkeypatch):
+    """Once progress is reported, only advancing frames keep the command alive"""
+    monkeypatch.setattr(StallWatchdog, "check_interval", 0)
+    runner = BackgroundRunner(Queue())
+    watchdog = StallWatchdog(runner, timeout=60)
+    runner.progress.latest = ProgressEvent(frame=10)
+    assert not watchdog.stalled()
+
+    watchdog.last_activity -= 61
+    runner.lines_read += 5  # Output without progress doesn't count any more
+    assert watchdog.stalled()
+
+    runner.progress.latest = ProgressEvent(frame=11)
+    assert not watchdog.stalled()
+
+    watchdog.last_activity -= 61
+    watchdog.paused = True
+    assert not watchdog.stalled()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+from threading import Thread
+
+import pytest
+from box import Box
+
+from fastflix.exceptions import QueueInUse
+from fastflix.farm import FarmConnection, FarmServer, FarmWorker
+from fastflix.ff_queue import claim_queue, release_queue
+from fastflix.models.video import Video, VideoSettings
+
+
+def make_video(tmp_path, name, *scripts):
+    return Video(
+        source=tmp_path / f"{name}.mkv",
+        work_path=tmp_path / name,
+        video_settings=VideoSettings(
+            output_path=tmp_path / f"{name}-out.mkv",
+            conversion_commands=[
+                Box(command=[sys.executable, "-c", script], name=f"step {i}", uuid=f"{name}-{i}", shell=False)
+                for i, script in enumerate(scripts)
+            ],
+        ),
+    )
+
+
+@pytest.fixture
+def farm():
+    servers = []
+
+    def start(queue, **kwargs):
+        events = []
+        server = FarmServer(queue, port=0, on_event=lambda event, **fields: events.append((event, fields)), **kwargs)
+        server.start()
+        servers.append(server)
+        return server, events
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def run_workers(server, count, **kwargs):
+    host, port = server.address
+    workers = [FarmWorker(host, port, worker_id=f"worker{i}", poll_interval=0.1, **kwargs) for i in range(count)]
+    threads = [Thread(target=worker.run, daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return workers
+
+
+def test_workers_share_the_queue(tmp_path, farm):
+    """Each video is leased by exactly one worker and every command reports back"""
+    queue = [make_video(tmp_path, f"video{i}", "import time; time.sleep(0.3)", "print('done')") for i in range(4)]
+    server, events = farm(queue)
+    run_workers(server, 3)
+
+    assert server.finished
+    assert all(video.status.complete for video in queue)
+    leased = [fields for event, fields in events if event == "leased"]
+    assert sorted(fields["video"] for fields in leased) == sorted(video.uuid for video in queue)
+    assert len({fields["worker"] for fields in leased}) > 1
+    assert all(len(video.status.completed_commands) == 2 for video in queue)
+
+
+def test_dead_worker_lease_expires(tmp_path, farm):
+    """A video leased by a worker that never reports back is handed to the next worker after the timeout"""
+    video = make_video(tmp_path, "video", "print('done')")
+    server, events = farm([video], lease_timeout=0.5)
+
+    dead = FarmConnection(*server.address)
+    assert dead.request("lease")["type"] == "job"
+    assert FarmConnection(*server.address).request("lease")["type"] == "wait"
+
+    run_workers(server, 1)
+    dead.close()
+
+    assert video.status.complete
+    assert [event for event, _ in events][:3] == ["leased", "lease_expired", "leased"]
+    assert events[2][1]["worker"] == "worker0"
+
+
+def test_failed_command_marks_video(tmp_path, farm):
+    video = make_video(tmp_path, "video", "import sys; sys.exit(1)", "print('never')")
+    server, events = farm([video])
+    run_workers(server, 1)
+
+    assert video.status.error
+    assert not video.status.completed_commands
+    assert [event for event, _ in events] == ["leased", "error", "video_error"]
+
+
+def test_token_required(tmp_path, farm):
+    server, _ = farm([make_video(tmp_path, "video", "print('done')")], token="secret")
+    with pytest.raises(PermissionError):
+        FarmWorker(*server.address, token="wrong").run()
+
+
+def test_events_are_handled_outside_the_lock(tmp_path):
+    """A slow or failing event handler (saving the queue) neither holds the lock nor breaks the farm"""
+    video = make_video(tmp_path, "video", "print('done')")
+    locked = []
+
+    def on_event(event, **fields):
+        locked.append(server.lock.locked())
+        raise OSError("disk full")
+
+    server = FarmServer([video], port=0, on_event=on_event, lease_timeout=0.2)
+    try:
+        lease = server.handle("worker0", {"type": "lease"})
+        assert lease["type"] == "job"
+        reply = server.handle(
+            "worker0", {"type": "status", "lease": lease["lease"], "command": "video-0", "status": "complete"}
+        )
+        assert reply == {"type": "ok"}
+        server.leases[lease["lease"]].expires = 0
+        server.expire_leases()
+        assert not server.leases
+    finally:
+        server.server.server_close()
+    assert locked == [False, False, False]
+
+
+@pytest.mark.parametrize("shared_work_dir, sent_again", [(False, ["video-0", "video-1"]), (True, ["video-1"])])
+def test_finished_chunks_only_skipped_where_they_are(tmp_path, shared_work_dir, sent_again):
+    """Another worker can't see the first one's work_dir, unless the server is told they all share it"""
+    video = make_video(tmp_path, "video", "print('one')", "print('two')")
+    server = FarmServer([video], port=0, lease_timeout=0.2, shared_work_dir=shared_work_dir)
+    try:
+        lease = server.handle("worker0", {"type": "lease"})
+        server.handle(
+            "worker0", {"type": "status", "lease": lease["lease"], "command": "video-0", "status": "complete"}
+        )
+        server.leases[lease["lease"]].expires = 0
+        server.expire_leases()
+
+        again = server.handle("worker1", {"type": "lease"})
+        assert [command["uuid"] for command in again["commands"]] == sent_again
+        server.leases[again["lease"]].expires = 0
+        server.expire_leases()
+
+        if not shared_work_dir:
+            server.handle(
+                "worker1", {"type": "status", "lease": again["lease"], "command": "video-0", "status": "complete"}
+            )
+            assert server.handle("worker0", {"type": "lease"})["commands"][0]["uuid"] == "video-0"
+    finally:
+        server.server.server_close()
+
+
+def test_failed_video_retried(tmp_path, farm):
+    video = make_video(tmp_path, "video", "import sys; sys.exit(1)")
+    server, events = farm([video], retries=1)
+    run_workers(server, 1)
+
+    assert video.status.error
+    assert [event for event, _ in events] == ["leased", "error", "video_retry", "leased", "error", "video_error"]
+
+
+def test_queue_claimed_by_one_runner(tmp_path):
+    queue_file = tmp_path / "queue.yaml"
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        (tmp_path / "queue.owner").write_text(json.dumps({"pid": other.pid, "owner": "farm-server"}))
+        with pytest.raises(QueueInUse) as err:
+            claim_queue(queue_file, "run-queue")
+        assert err.value.owner == "farm-server"
+    finally:
+        other.kill()
+        other.wait()
+
+    claim_queue(queue_file, "run-queue")
+    assert json.loads((tmp_path / "queue.owner").read_text())["pid"] == os.getpid()
+    release_queue(queue_file)
+    assert not (tmp_path / "queue.owner").exists()
@@ -1,6 +1,26 @@
 # -*- coding: utf-8 -*-
+import sys
+import time
+from unittest import mock
 from pathlib import Path
 
+import pytest
+from box import Box
+
+from fastflix.flix import (
+    _detect_hdr10_plus_tool,
+    aggregate_crop,
+    analyze_video,
+    cover_timeout,
+    crop_sample_times,
+    extract_covers,
+    generate_filmstrip_command,
+    generate_thumbnail_command,
+    get_auto_crop,
+    parse,
+)
+from fastflix.models.video import Video
+
 from fastflix.rigaya_helpers import (
     parse_vce_devices,
     VCEEncoder,
@@ -88,3 +108,286 @@ def test_nvenc_parse():
 def test_qsv_parse():
     for qsv_test in test_logs["qsv"]:
         assert parse_qsv_devices(qsv_test["text"]) == qsv_test["result"]
+
+
+mastering_display = {
+    "side_data_type": "Mastering display metadata",
+    **{f"{color}_{axis}": "1/50000" for color in ("red", "green", "blue", "white_point") for axis in ("x", "y")},
+    "max_luminance": "10000000/10000",
+    "min_luminance": "50/10000",
+}
+hdr10_plus = {"side_data_type": "HDR Dynamic Metadata SMPTE2094-40 (HDR10+)"}
+
+
+def fake_tools(tmp_path, delay):
+    """
+    ffprobe and FFmpeg stand-ins that take delay seconds for the slow steps and log every call.
+    The single frame read only reaches stream 0, stream 1 has to be read on its own.
+    """
+    calls = tmp_path / "calls"
+    streams = {
+        "streams": [
+            {"index": 0, "codec_type": "video", "codec_name": "hevc", "pix_fmt": "yuv420p10le"},
+            {"index": 1, "codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p"},
+            {"index": 2, "codec_type": "audio", "codec_name": "aac"},
+        ],
+        "format": {"duration": "60.0"},
+    }
+    frames = {
+        "V": {"frames": [{"stream_index": 0, "side_data_list": [mastering_display]}]},
+        "1": {"frames": [{"side_data_list": [hdr10_plus]}]},
+    }
+    ffprobe = tmp_path / "ffprobe"
+    ffprobe.write_text(
+        f"#!{sys.executable}\n"
+        "import json, sys, time\n"
+        f"open({str(calls)!r}, 'a').write(' '.join(sys.argv[1:]) + '\\n')\n"
+        "if '-show_frames' not in sys.argv:\n"
+        f"    print(json.dumps({streams!r}))\n"
+        "    sys.exit()\n"
+        f"time.sleep({delay})\n"
+        f"print(json.dumps({frames!r}[sys.argv[sys.argv.index('-select_streams') + 1]]))\n"
+    )
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, time\n"
+        f"open({str(calls)!r}, 'a').write(' '.join(sys.argv[1:]) + '\\n')\n"
+        f"time.sleep({delay})\n"
+        "sys.stderr.write('[Parsed_idet_0 @ 0] Single frame detection: TFF: 80 BFF: 0 Progressive: 20')\n"
+    )
+    for tool in (ffprobe, ffmpeg):
+        tool.chmod(0o755)
+    return ffprobe, ffmpeg, calls
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake tools are shebang scripts")
+def test_analyze_video(tmp_path):
+    ffprobe, ffmpeg, calls = fake_tools(tmp_path, delay=1)
+    config = Box(
+        ffprobe=ffprobe,
+        ffmpeg=ffmpeg,
+        hdr10plus_parser=None,
+        disable_cover_extraction=False,
+        disable_deinterlace_check=False,
+    )
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"not really a video")
+    app = Box(
+        fastflix=Box(
+            config=config,
+            data_path=tmp_path / "data",
+            ffprobe_version="7.0",
+            current_video=Video(source=source, work_path=tmp_path),
+        )
+    )
+
+    start = time.monotonic()
+    analyze_video(app, config, source=source)
+    # Interlace detection overlaps both frame reads
+    assert time.monotonic() - start < 2.8
+
+    video = app.fastflix.current_video
+    assert [stream.index for stream in video.streams.video] == [0, 1]
+    assert video.duration == 60.0
+    assert [stream.index for stream in video.hdr10_streams] == [0]
+    assert video.hdr10_streams[0].master_display.luminance == "(10000000,50)"
+    assert video.hdr10_plus == [1]
+    assert video.interlaced == "tff"
+    assert sum("-show_frames" in line for line in calls.read_text().splitlines()) == 2
+
+
+def test_cover_timeout_per_cover(tmp_path):
+    covers = {3: "cover.jpg", 4: "small_cover.jpg", 5: "cover_land.jpg"}
+    with mock.patch("fastflix.flix.execute") as execute:
+        extract_covers(Path("ffmpeg"), tmp_path / "video.mkv", covers, tmp_path)
+    command = execute.call_args.args[0]
+    assert [command[i + 1] for i, arg in enumerate(command) if arg == "-map"] == ["0:3", "0:4", "0:5"]
+    assert execute.call_args.kwargs["timeout"] == cover_timeout * 3
+
+
+def test_parse_uses_probe_data(tmp_path):
+    """A file the probe pool already looked at is not probed again"""
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"not really a video")
+    app = Box(
+        fastflix=Box(
+            config=Box(ffprobe=tmp_path / "missing-ffprobe"),
+            data_path=tmp_path / "data",
+            ffprobe_version="7.0",
+            current_video=Video(source=source, work_path=tmp_path),
+        )
+    )
+    data = Box(
+        streams=[{"index": 0, "codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p"}],
+        format={"duration": "12.5"},
+    )
+    parse(app, probe_data=data)
+    assert app.fastflix.current_video.duration == 12.5
+    assert [stream.index for stream in app.fastflix.current_video.streams.video] == [0]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake tools are shebang scripts")
+def test_hdr10_plus_tool_stops_at_verdict(tmp_path):
+    """The tool says yes after the first chunk, neither it nor the endless FFmpeg are waited out"""
+    calls = tmp_path / "calls"
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "assert '-frames:v' in sys.argv\n"
+        "while True:\n"
+        "    sys.stdout.buffer.write(bytes(65536))\n"
+    )
+    tool = tmp_path / "hdr10plus_tool"
+    tool.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, time\n"
+        "if '--version' in sys.argv:\n"
+        "    print('hdr10plus_tool 1.6.0')\n"
+        "    sys.exit()\n"
+        f"open({str(calls)!r}, 'a').write('x')\n"
+        "sys.stdin.buffer.read(1024)\n"
+        "print('Dynamic HDR10+ metadata detected.', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    for script in (ffmpeg, tool):
+        script.chmod(0o755)
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"not really a video")
+    config = Box(ffmpeg=ffmpeg, ffprobe=tmp_path / "ffprobe", hdr10plus_parser=tool)
+    app = Box(
+        fastflix=Box(
+            config=config,
+            data_path=tmp_path / "data",
+            ffprobe_version="7.0",
+            current_video=Video(source=source, work_path=tmp_path),
+        )
+    )
+    stream = Box(index=0, codec_name="hevc")
+
+    start = time.monotonic()
+    assert _detect_hdr10_plus_tool(app, config, stream)
+    assert time.monotonic() - start < 10
+    assert _detect_hdr10_plus_tool(app, config, stream)
+    assert calls.read_text() == "x"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake tools are shebang scripts")
+@pytest.mark.parametrize("tool_exit, runs", [(0, "x"), (1, "xx")])
+def test_hdr10_plus_negative_kept_only_after_clean_run(tmp_path, tool_exit, runs):
+    """No metadata is remembered when the tool finished its check, not when it failed along the way"""
+    calls = tmp_path / "calls"
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(f"#!{sys.executable}\nimport sys\nsys.stdout.buffer.write(bytes(65536))\n")
+    tool = tmp_path / "hdr10plus_tool"
+    tool.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "if '--version' in sys.argv:\n"
+        "    print('hdr10plus_tool 1.6.0')\n"
+        "    sys.exit()\n"
+        f"open({str(calls)!r}, 'a').write('x')\n"
+        "sys.stdin.buffer.read()\n"
+        "print('File doesn\\'t contain dynamic metadata, stopping.', flush=True)\n"
+        f"sys.exit({tool_exit})\n"
+    )
+    for script in (ffmpeg, tool):
+        script.chmod(0o755)
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"not really a video")
+    config = Box(ffmpeg=ffmpeg, ffprobe=tmp_path / "ffprobe", hdr10plus_parser=tool)
+    app = Box(
+        fastflix=Box(
+            config=config,
+            data_path=tmp_path / "data",
+            ffprobe_version="7.0",
+            current_video=Video(source=source, work_path=tmp_path),
+        )
+    )
+    stream = Box(index=0, codec_name="hevc")
+
+    assert not _detect_hdr10_plus_tool(app, config, stream)
+    assert not _detect_hdr10_plus_tool(app, config, stream)
+    assert calls.read_text() == runs
+
+
+def test_crop_sample_times():
+    assert crop_sample_times(1000, 0, 1000, 4) == [100, 280, 460, 640]
+    assert crop_sample_times(1000, 500, 600, 3) == [500, 525, 550]
+    assert crop_sample_times(5, 0, 0, 10) == [0, 1, 2, 3, 4]
+
+
+def test_aggregate_crop():
+    letterbox = (1920, 800, 0, 140)
+    # Dark scene that cropdetect would cut into, and a bright one with a logo reaching into the left side
+    dark = (1200, 600, 360, 240)
+    logo = (1900, 800, 20, 140)
+    assert aggregate_crop([letterbox, dark, letterbox], 1920, 1080) == [0, 140, 0, 140]
+    assert aggregate_crop([letterbox, logo], 1920, 1080) == [0, 140, 0, 140]
+    # Fades to black are left out as long as something else was seen
+    assert aggregate_crop([letterbox, (2, 2, 958, 538)], 1920, 1080) == [0, 140, 0, 140]
+    assert aggregate_crop([(-1920, -1080, 1920, 1080)], 1920, 1080) is None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake tools are shebang scripts")
+def test_auto_crop_is_concurrent_and_cached(tmp_path):
+    calls = tmp_path / "calls"
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, time\n"
+        f"open({str(calls)!r}, 'a').write('x')\n"
+        "time.sleep(1)\n"
+        "for y in (300, 140):\n"
+        "    sys.stderr.write(f'[Parsed_cropdetect_0 @ 0] x1:0 x2:1919 crop=1920:{1080 - 2 * y}:0:{y}\\n')\n"
+    )
+    ffmpeg.chmod(0o755)
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"not really a video")
+    config = Box(ffmpeg=ffmpeg, ffprobe=tmp_path / "ffprobe", crop_detect_points=4)
+    app = Box(
+        fastflix=Box(
+            config=config,
+            data_path=tmp_path / "data",
+            ffprobe_version="7.0",
+            current_video=Video(source=source, duration=1000),
+        )
+    )
+    kwargs = dict(source=source, video_width=1920, video_height=1080, input_track=0, start_time=0, end_time=1000)
+
+    start = time.monotonic()
+    first = []
+    get_auto_crop(app, config, result_list=first, **kwargs)
+    assert time.monotonic() - start < 3
+    assert first == [[0, 140, 0, 140]]
+
+    again = []
+    get_auto_crop(app, config, result_list=again, **kwargs)
+    assert again == first
+    assert calls.read_text() == "xxxx"
+
+    get_auto_crop(app, config, result_list=[], **{**kwargs, "start_time": 300})
+    assert calls.read_text() == "x" * 8
+
+
+def test_filmstrip_is_one_keyframe_only_command():
+    config = Box(ffmpeg=Path("ffmpeg"))
+    command = generate_filmstrip_command(config, Path("video.mkv"), duration=600, input_track=1, frames=10)
+    assert command[0] == "ffmpeg"
+    assert command.index("-skip_frame") < command.index("-i")
+    assert command[command.index("-skip_frame") + 1] == "nokey"
+    assert command[command.index("-map") + 1] == "0:1"
+    video_filter = command[command.index("-vf") + 1]
+    assert "gte(t-prev_selected_t,60.000)" in video_filter
+    assert video_filter.endswith("tile=10x1")
+    assert command[-1] == "-"
+
+
+def test_thumbnail_written_to_stdout():
+    config = Box(ffmpeg=Path("ffmpeg"))
+    command = generate_thumbnail_command(config, Path("video.mkv"), filters="-vf scale=440:-8", start_time=5)
+    assert command[-5:] == ["-f", "image2pipe", "-c:v", "mjpeg", "-"]
+    assert command[command.index("-map") + 1] == "0:0"
+    command = generate_thumbnail_command(config, Path("video.mkv"), filters=[], image_codec="png")
+    assert command[-2:] == ["png", "-"]
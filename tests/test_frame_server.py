@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import cv2
+import numpy as np
+import pytest
+
+from fastflix.frame_server import FrameServer, can_serve, scaled_size, transform_frame
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Three seconds at 10 fps, each frame a flat gray that gets brighter by 8 every frame"""
+    path = tmp_path / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), i * 8, np.uint8))
+    writer.release()
+    return path
+
+
+def test_frames_by_time(video):
+    server = FrameServer(video)
+    # Nothing is opened until the first frame is asked for
+    assert server.capture is None
+    assert server.opened
+    assert server.frame(1.5).shape == (48, 64, 3)
+    assert server.frame(1.5).mean() == pytest.approx(120, abs=4)
+    assert server.frame(0.2).mean() == pytest.approx(16, abs=4)
+    server.close()
+    assert not server.opened
+    assert server.frame(0.2) is None
+
+
+def test_unreadable_source(tmp_path):
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"not really a video")
+    assert not FrameServer(source).opened
+
+
+def test_scaled_size():
+    assert scaled_size(1920, 1080, "1280:-8") == (1280, 720)
+    assert scaled_size(1920, 800, "-8:480") == (1152, 480)
+    assert scaled_size(1920, 1080, "640:360") == (640, 360)
+    with pytest.raises(ValueError):
+        scaled_size(1920, 1080, "iw/2:ih/2")
+
+
+def test_transform_frame():
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    frame[0, 0] = 255
+    crop = {"top": 140, "left": 0, "width": 1920, "height": 800}
+    assert transform_frame(frame, crop=crop).shape == (800, 1920, 3)
+    assert transform_frame(frame, crop=crop, scale="960:-2", rotate=1).shape == (960, 400, 3)
+    assert transform_frame(frame, max_width=440).shape == (248, 440, 3)
+
+    flipped = transform_frame(frame, vertical_flip=True, horizontal_flip=True)
+    assert flipped[-1, -1].tolist() == [255, 255, 255]
+    assert flipped.flags["C_CONTIGUOUS"]
+
+
+def test_can_serve():
+    assert can_serve({"crop": {"top": 2}, "rotate": 1, "remove_hdr": False, "brightness": None})
+    assert not can_serve({"remove_hdr": True})
+    assert not can_serve({"deinterlace": True})
+    assert not can_serve({"denoise": "hqdn3d=4"})
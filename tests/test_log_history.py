@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+from queue import Queue
+
+import pytest
+from box import Box
+from PySide6 import QtCore, QtWidgets
+
+from fastflix.models.video import Video, VideoSettings
+from fastflix.progress import ProgressEvent
+from fastflix.widgets.panels.status_panel import LogHistory, Logs, StatusPanel
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    if sys.platform == "linux" and not os.environ.get("DISPLAY") and os.environ.get("QT_QPA_PLATFORM") != "offscreen":
+        pytest.skip("Cannot create QApplication in headless environment")
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv)
+    yield app
+
+
+class FakeStatusPanel(QtWidgets.QWidget):
+    speed = QtCore.Signal(str)
+    bitrate = QtCore.Signal(str)
+    nvencc_signal = QtCore.Signal(str)
+    progress_signal = QtCore.Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.hide_nal = QtWidgets.QCheckBox()
+
+
+def test_history_reads_back_sections(tmp_path):
+    """Any range of older lines can be read back from disk, including non ascii output"""
+    history = LogHistory(tmp_path / "output.log")
+    history.add([f"line {i}" for i in range(10)])
+    history.add(["déjà vu", "last"])
+
+    assert len(history) == 12
+    assert history.read(0, 3) == ["line 0", "line 1", "line 2"]
+    assert history.read(8, 12) == ["line 8", "line 9", "déjà vu", "last"]
+    assert history.read(-5, 1) == ["line 0"]
+    assert history.read(12, 20) == []
+
+    history.add(["after read"])
+    assert history.read(11, 13) == ["last", "after read"]
+
+    history.close()
+    assert not (tmp_path / "output.log").exists()
+
+
+def test_batches_update_the_status_labels(qapp):
+    panel = FakeStatusPanel()
+    logs = Logs(panel, app=None, main=None, log_queue=Queue())
+    try:
+        emitted = []
+        panel.speed.connect(lambda value: emitted.append(("speed", value)))
+        panel.bitrate.connect(lambda value: emitted.append(("bitrate", value)))
+        panel.nvencc_signal.connect(lambda value: emitted.append(("nvencc", value)))
+
+        logs.update_batch(
+            ["encoding", "frame= 240 fps= 48 q=28.0 size= 1024kB time=00:00:10.01 bitrate= 838.1kbits/s speed=2.0x"]
+        )
+        assert emitted == [("speed", "00:00:10.01|2.0"), ("bitrate", "838.1kbits/s")]
+
+        emitted.clear()
+        logs.update_batch(["[45.2%] 2400 frames: 120.5 fps, 5000 kb/s, remain 0:01:10"])
+        assert emitted == [("nvencc", "[45.2%] 2400 frames: 120.5 fps, 5000 kb/s, remain 0:01:10")]
+        assert "remain 0:01:10" in logs.toPlainText()
+
+        emitted.clear()
+        logs.update_batch(["[2] [45.3%] 2401 frames: 120.5 fps, 5000 kb/s, remain 0:01:09"])
+        assert emitted == [("nvencc", "[45.3%] 2401 frames: 120.5 fps, 5000 kb/s, remain 0:01:09")]
+        assert "[2] [45.3%]" in logs.toPlainText()
+    finally:
+        logs.log_updater.request_shutdown()
+        logs.log_updater.wait()
+
+
+class FakeProgressPanel:
+    """Just what StatusPanel.update_progress needs"""
+
+    command_length = StatusPanel.command_length
+    running_progress = StatusPanel.running_progress
+    update_progress = StatusPanel.update_progress
+    update_speed = StatusPanel.update_speed
+    video_length = staticmethod(StatusPanel.video_length)
+
+    def __init__(self, videos):
+        self.app = Box(fastflix=Box(conversion_list=videos))
+        self.observed = []
+        self.main = Box(eta_predictor=Box(observe=lambda video, speed: self.observed.append((video.uuid, speed))))
+        self.progress = {}
+        self.eta_label = QtWidgets.QLabel()
+        self.size_label = QtWidgets.QLabel()
+        self.queue_etas = []
+
+    def update_queue_eta(self, current_left):
+        self.queue_etas.append(current_left)
+
+
+def test_progress_of_every_running_command_is_combined(qapp, tmp_path):
+    video = Video(
+        source=tmp_path / "source.mkv",
+        duration=100,
+        video_settings=VideoSettings(
+            output_path=tmp_path / "output.mkv",
+            conversion_commands=[Box(uuid=f"chunk-{i}", command="", duration=50) for i in range(2)],
+        ),
+    )
+    video.status.running_commands = ["chunk-0", "chunk-1"]
+    panel = FakeProgressPanel([video])
+
+    panel.update_progress(ProgressEvent(video.uuid, "chunk-0", out_time_us=10_000_000, speed=1, total_size=1_000_000))
+    panel.update_progress(ProgressEvent(video.uuid, "chunk-1", out_time_us=10_000_000, speed=2, total_size=1_000_000))
+    # The slowest chunk decides when the video is done, both chunks' output counts towards the size
+    assert panel.queue_etas[-1] == 40
+    assert panel.size_label.text().endswith("10.00MB")
+    assert panel.observed[-1] == (video.uuid, 3)
+
+    video.status.running_commands = ["chunk-1"]
+    panel.update_progress(ProgressEvent(video.uuid, "chunk-1", out_time_us=20_000_000, speed=2, total_size=2_000_000))
+    assert list(panel.progress) == [(video.uuid, "chunk-1")]
+    assert panel.queue_etas[-1] == 15
+
+
+def test_stats_lines_only_used_without_progress_events(qapp, tmp_path):
+    video = Video(
+        source=tmp_path / "source.mkv",
+        duration=100,
+        video_settings=VideoSettings(output_path=tmp_path / "output.mkv", conversion_commands=[]),
+    )
+    video.status.running_commands = ["encode"]
+    panel = FakeProgressPanel([video])
+    panel.get_movie_length = lambda: 100
+
+    panel.update_speed("00:00:10.00|2.0")
+    assert panel.eta_label.text().endswith("0:00:45")
+
+    panel.update_progress(ProgressEvent(video.uuid, "encode", out_time_us=20_000_000, speed=4))
+    panel.update_speed("00:00:10.00|2.0")
+    assert panel.eta_label.text().endswith("0:00:20")
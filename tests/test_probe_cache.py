@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+from box import Box
+
+from fastflix.flix import probe
+from fastflix.probe_cache import ProbeCache
+
+probe_output = {"streams": [{"index": 0, "codec_type": "video", "width": 1920, "height": 1080}], "format": {}}
+
+
+def test_key_follows_file_changes(tmp_path):
+    video = tmp_path / "video.mkv"
+    video.write_bytes(b"1234")
+    key = ProbeCache.key(video, "7.0")
+    assert key == ProbeCache.key(tmp_path / "." / "video.mkv", "7.0")
+    assert key != ProbeCache.key(video, "7.1")
+
+    os.utime(video, ns=(1, 1))
+    touched = ProbeCache.key(video, "7.0")
+    assert touched != key
+
+    video.write_bytes(b"12345")
+    os.utime(video, ns=(1, 1))
+    assert ProbeCache.key(video, "7.0") != touched
+
+    assert ProbeCache.key(tmp_path / "missing.mkv") is None
+    assert ProbeCache.key(tmp_path) is None
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProbeCache, "evict_every", 1)
+    cache = ProbeCache(tmp_path / "probe_cache.sqlite", max_entries=3)
+    for i in range(3):
+        cache.put(f"key-{i}", f"file-{i}", f'{{"i": {i}}}')
+    assert cache.get("key-0") == '{"i": 0}'
+    cache.put("key-3", "file-3", '{"i": 3}')
+
+    assert len(cache) == 3
+    assert cache.get("key-1") is None
+    assert cache.get("key-0") and cache.get("key-3")
+    cache.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake ffprobe is a shebang script")
+def test_probe_uses_cache(tmp_path):
+    calls = tmp_path / "calls"
+    ffprobe = tmp_path / "ffprobe"
+    ffprobe.write_text(
+        f"#!{sys.executable}\nopen({str(calls)!r}, 'a').write('x')\nprint({json.dumps(json.dumps(probe_output))})\n"
+    )
+    ffprobe.chmod(0o755)
+    app = Box(fastflix=Box(config=Box(ffprobe=ffprobe), data_path=tmp_path / "data", ffprobe_version="7.0"))
+    video = tmp_path / "video.mkv"
+    video.write_bytes(b"not really a video")
+
+    assert probe(app, video).streams[0].width == 1920
+    assert probe(app, video).streams[0].width == 1920
+    assert calls.read_text() == "x"
+
+    probe(app, video, use_cache=False)
+    video.write_bytes(b"a different video")
+    probe(app, video)
+    assert calls.read_text() == "xxx"
+
+
+def test_details_follow_their_probe(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProbeCache, "evict_every", 1)
+    cache = ProbeCache(tmp_path / "probe_cache.sqlite", max_entries=1)
+    cache.put("key-0", "file-0", "{}")
+    cache.put_detail("key-0", "hdr10plus:0", "1")
+    assert cache.get_detail("key-0", "hdr10plus:0") == "1"
+    assert cache.get_detail("key-0", "hdr10plus:1") is None
+
+    cache.put("key-1", "file-1", "{}")
+    assert cache.get_detail("key-0", "hdr10plus:0") is None
+    cache.close()
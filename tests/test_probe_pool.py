@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import json
+import sys
+import time
+
+import pytest
+from box import Box
+
+from fastflix.probe_pool import ProbePool, video_stream
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="fake ffprobe is a shebang script")
+
+probe_output = {"streams": [{"index": 0, "codec_type": "video", "width": 1920, "height": 1080}], "format": {}}
+
+
+def fake_app(tmp_path, delay=0.0):
+    """ffprobe that sleeps, fails for anything named bad*, and otherwise reports one video stream"""
+    ffprobe = tmp_path / "ffprobe"
+    ffprobe.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, time\n"
+        f"time.sleep({delay})\n"
+        "if '/bad' in sys.argv[-1]:\n"
+        "    sys.exit(1)\n"
+        f"print({json.dumps(json.dumps(probe_output))})\n"
+    )
+    ffprobe.chmod(0o755)
+    return Box(fastflix=Box(config=Box(ffprobe=ffprobe), data_path=tmp_path / "data", ffprobe_version="7.0"))
+
+
+def make_files(tmp_path, names):
+    files = []
+    for name in names:
+        file = tmp_path / name
+        file.write_bytes(name.encode())
+        files.append(file)
+    return files
+
+
+def test_results_stream_in(tmp_path):
+    files = make_files(tmp_path, [f"video-{i}.mkv" for i in range(6)] + ["bad.txt"])
+    received = []
+    with ProbePool(fake_app(tmp_path), files, workers=4) as pool:
+        while not pool.finished:
+            received.extend(pool.drain())
+
+    assert sorted(result.file for result in received) == sorted(files)
+    streams = {result.file.name: video_stream(result) for result in received}
+    assert streams["video-0.mkv"].width == 1920
+    assert streams["bad.txt"] is None
+
+
+def test_probes_run_at_the_same_time(tmp_path):
+    files = make_files(tmp_path, [f"video-{i}.mkv" for i in range(4)])
+    start = time.monotonic()
+    with ProbePool(fake_app(tmp_path, delay=1), files, workers=4) as pool:
+        assert all(pool.result(file, timeout=10) for file in files)
+    assert time.monotonic() - start < 3
+
+
+def test_cancel_stops_waiting(tmp_path):
+    files = make_files(tmp_path, [f"video-{i}.mkv" for i in range(4)])
+    with ProbePool(fake_app(tmp_path, delay=2), files, workers=1) as pool:
+        assert pool.result(files[-1], timeout=0.1) is None
+        pool.cancel()
+        assert pool.finished
+        start = time.monotonic()
+        assert pool.result(files[-1], timeout=10) is None
+        assert time.monotonic() - start < 1
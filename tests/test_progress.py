@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+from queue import Queue
+
+from fastflix.command_runner import BackgroundRunner
+from fastflix.progress import ProgressEvent, ProgressParser
+
+progress_block = """frame=240
+fps=47.95
+stream_0_0_q=28.0
+bitrate=1523.4kbits/s
+total_size=1900544
+out_time_us=9980000
+out_time_ms=9980000
+out_time=00:00:09.980000
+dup_frames=0
+drop_frames=0
+speed=1.99x
+progress=continue"""
+
+
+def test_progress_line_detection():
+    """Only ffmpeg -progress key=value lines are picked up, not normal log output"""
+    assert ProgressParser.is_progress_line("frame=240")
+    assert ProgressParser.is_progress_line("stream_0_0_q=28.0")
+    assert ProgressParser.is_progress_line("progress=end")
+    assert not ProgressParser.is_progress_line("frame=  240 fps= 48 q=28.0 size=    1856kB time=00:00:09.98")
+    assert not ProgressParser.is_progress_line("x265 [info]: frame threads / pool features : 4 / wpp(34 rows)")
+    assert not ProgressParser.is_progress_line("encoder=Lavf60.3.100")
+
+
+def test_progress_block_builds_event():
+    """A block of progress lines produces one typed event when the progress= line arrives"""
+    parser = ProgressParser(video_uuid="video", command_uuid="command")
+    events = [parser.feed(line) for line in progress_block.splitlines()]
+    assert events[:-1] == [None] * (len(events) - 1)
+    event = events[-1]
+    assert event == ProgressEvent(
+        video_uuid="video",
+        command_uuid="command",
+        frame=240,
+        fps=47.95,
+        out_time_us=9980000,
+        bitrate=1523.4,
+        speed=1.99,
+        total_size=1900544,
+        finished=False,
+    )
+    assert event.out_time == 9.98
+
+
+def test_progress_not_available_values():
+    """ffmpeg reports N/A before the first frame is written"""
+    parser = ProgressParser()
+    for line in ("frame=0", "bitrate=N/A", "total_size=N/A", "out_time_us=N/A", "speed=N/A"):
+        parser.feed(line)
+    event = parser.feed("progress=end")
+    assert event.bitrate is None
+    assert event.speed is None
+    assert event.total_size == 0
+    assert event.out_time_us == 0
+    assert event.finished
+
+
+def test_runner_sends_progress_events(tmp_path):
+    """Progress blocks on stderr reach the log queue as events instead of text"""
+    log_queue = Queue()
+    script = f"import sys; sys.stderr.write({progress_block!r} + '\\n'); print('done')"
+    runner = BackgroundRunner(log_queue, video_uuid="video", command_uuid="command")
+    runner.start_exec([sys.executable, "-c", script], work_dir=str(tmp_path))
+    for _ in range(100):
+        if not runner.is_alive():
+            break
+        time.sleep(0.05)
+
+    messages = list(log_queue.queue)
+    events = [msg for msg in messages if isinstance(msg, ProgressEvent)]
+    lines = [line for msg in messages if isinstance(msg, list) for line in msg]
+    assert len(events) == 1
+    assert events[0].command_uuid == "command"
+    assert "done" in lines
+    assert not any(line.startswith("frame=") for line in lines)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+from unittest import mock
+
+import pytest
+from box import Box
+
+from fastflix.models.config import Config
+from fastflix.models.encode import GIFSettings, NVEncCSettings, x265Settings
+from fastflix.models.video import Video, VideoSettings
+from fastflix.scheduler import (
+    ResourceEstimate,
+    ResourceScheduler,
+    estimate_resources,
+    job_thread_budget,
+    slot_cpu_sets,
+)
+
+memory = namedtuple("memory", "total available")
+
+
+def make_video(encoder_settings, width=1920, height=1080):
+    return Video(
+        source="source.mkv",
+        duration=60,
+        streams=Box(video=[Box(index=0, width=width, height=height)]),
+        video_settings=VideoSettings(video_encoder_settings=encoder_settings),
+    )
+
+
+@pytest.fixture
+def system():
+    with (
+        mock.patch("psutil.cpu_count", return_value=16),
+        mock.patch("psutil.cpu_percent", return_value=0.0) as cpu_percent,
+        mock.patch("psutil.virtual_memory", return_value=memory(32 * 2**30, 24 * 2**30)),
+    ):
+        yield cpu_percent
+
+
+def test_estimates_follow_encoder_resolution_and_preset(system):
+    """4K software encodes need the most cores, hardware and GIF encodes barely any CPU"""
+    hd = estimate_resources(make_video(x265Settings()))
+    uhd = estimate_resources(make_video(x265Settings(), width=3840, height=2160))
+    fast = estimate_resources(make_video(x265Settings(preset="ultrafast")))
+    assert hd.cpu < uhd.cpu <= 16
+    assert fast.cpu < hd.cpu
+    assert uhd.memory == hd.memory * 4
+
+    assert estimate_resources(make_video(NVEncCSettings())) == ResourceEstimate(cpu=0.5, memory=500, gpu_sessions=1)
+    assert estimate_resources(make_video(GIFSettings())).cpu < 1
+
+
+def test_admit_respects_budgets(system):
+    """A second 4K x265 has to wait, but cheap and GPU jobs can run alongside it"""
+    scheduler = ResourceScheduler(Config(concurrent_encodes=4, gpu_encode_sessions=1))
+    big = [make_video(x265Settings(), width=3840, height=2160) for _ in range(2)]
+    gif = make_video(GIFSettings())
+    gpu = [make_video(NVEncCSettings()) for _ in range(2)]
+
+    assert scheduler.admit([*big, gif, *gpu], []) == [big[0], gif, gpu[0]]
+    assert scheduler.admit([big[1], gpu[1]], [big[0], gpu[0]]) == []
+
+
+def test_admit_always_runs_something(system):
+    """The first job starts even on a busy system, but nothing else joins it"""
+    system.return_value = 95.0
+    scheduler = ResourceScheduler(Config(concurrent_encodes=2))
+    videos = [make_video(x265Settings()) for _ in range(2)]
+    assert scheduler.admit(videos, []) == [videos[0]]
+
+
+def test_admit_limited_by_concurrent_encodes(system):
+    scheduler = ResourceScheduler(Config(concurrent_encodes=2))
+    videos = [make_video(GIFSettings()) for _ in range(3)]
+    assert scheduler.admit(videos, []) == videos[:2]
+    assert scheduler.admit(videos[2:], videos[:2]) == []
+
+
+def test_slot_cpu_sets_split_cores():
+    with mock.patch("fastflix.scheduler.usable_cores", return_value=list(range(10))):
+        assert slot_cpu_sets(1) == []
+        assert slot_cpu_sets(4) == [[0, 1, 8], [2, 3, 9], [4, 5], [6, 7]]
+        assert slot_cpu_sets(12) == []
+
+
+def test_job_thread_budget():
+    with mock.patch("fastflix.scheduler.usable_cores", return_value=list(range(12))):
+        assert job_thread_budget(Config(concurrent_encodes=1)) == 0
+        assert job_thread_budget(Config(concurrent_encodes=3)) == 4
+        assert job_thread_budget(Config(concurrent_encodes=24)) == 1
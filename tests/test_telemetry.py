@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+
+import psutil
+import pytest
+from box import Box
+
+from fastflix import conversion_worker, telemetry
+from fastflix.conversion_worker import queue_worker
+from fastflix.models.encode import x265Settings
+from fastflix.models.video import Video, VideoSettings
+from fastflix.progress import ProgressEvent
+from fastflix.telemetry import EtaPredictor, JobRecorder, TelemetryStore, job_details, run_telemetry_cli
+
+
+class FakeGUIProcess:
+    def is_alive(self):
+        return True
+
+    def join(self):
+        pass
+
+
+def finished_recorder(encoder="HEVC (x265)", preset="medium", frames=240, name="job") -> JobRecorder:
+    recorder = JobRecorder("video", "command", name=name, details={"encoder": encoder, "preset": preset})
+    recorder.sample(None, ProgressEvent(frame=frames // 2, fps=24.0, out_time_us=5_000_000, speed=1.0))
+    recorder.last_sample = (recorder.last_sample[0] - recorder.interval, recorder.last_sample[1])
+    recorder.sample(None, ProgressEvent(frame=frames, fps=24.0, out_time_us=10_000_000, speed=1.0))
+    return recorder
+
+
+def test_store_history_and_throughput(tmp_path):
+    store = TelemetryStore(tmp_path / "telemetry.sqlite")
+    first = store.record(finished_recorder(), "complete")
+    store.record(finished_recorder(), "complete")
+    store.record(finished_recorder(preset="slow"), "complete")
+    store.record(finished_recorder(encoder="AV1 (SVT AV1)", preset="8"), "error")
+
+    assert len(store.history()) == 4
+    assert {row["status"] for row in store.history(encoder="AV1 (SVT AV1)")} == {"error"}
+
+    throughput = store.throughput()
+    assert [(row["encoder"], row["preset"], row["jobs"]) for row in throughput] == [
+        ("HEVC (x265)", "medium", 2),
+        ("HEVC (x265)", "slow", 1),
+    ]
+    assert throughput[0]["peak_fps"] > 0
+
+    samples = store.samples(first)
+    assert [sample["frame"] for sample in samples] == [120, 240]
+    store.close()
+
+
+def test_samples_are_downsampled(monkeypatch):
+    """Long encodes keep at most max_samples, spreading them out further each time the limit is hit"""
+    monkeypatch.setattr(telemetry, "max_samples", 10)
+    recorder = JobRecorder("video", "command")
+    for frame in range(25):
+        recorder.last_sample = None
+        recorder.sample(None, ProgressEvent(frame=frame))
+    assert len(recorder.samples) < 10
+    assert recorder.interval == telemetry.sample_interval * 16
+    assert recorder.samples[0][1] == 0
+
+
+def test_process_usage_includes_children():
+    recorder = JobRecorder("video", "command")
+    cpu, memory = recorder.process_usage(psutil.Process())
+    assert memory > 0
+    assert recorder.process_usage(None) == (0.0, 0)
+
+
+def test_worker_records_commands(tmp_path, monkeypatch):
+    """Every command the worker finishes or cancels ends up in the store, with the details sent along"""
+    monkeypatch.setattr(conversion_worker, "log_path", tmp_path)
+    monkeypatch.setattr(conversion_worker, "telemetry_path", tmp_path / "telemetry.sqlite")
+    worker_queue, status_queue, log_queue = Queue(), Queue(), Queue()
+    quick = [sys.executable, "-c", "print('done')"]
+    slow = [sys.executable, "-c", "import time; time.sleep(5)"]
+    details = {"encoder": "AVC (x264)", "preset": "fast", "width": 1920, "height": 1080}
+    worker_queue.put(["concurrency", 2])
+    worker_queue.put(["execute", "video-1", "command-1", quick, str(tmp_path), "quick", False, details])
+    worker_queue.put(["execute", "video-2", "command-2", slow, str(tmp_path), "slow", False])
+
+    def cancel_and_shutdown():
+        while status_queue.empty():
+            time.sleep(0.05)
+        worker_queue.put(["cancel", "video-2"])
+        worker_queue.put(["shutdown"])
+
+    Thread(target=cancel_and_shutdown, daemon=True).start()
+    queue_worker(FakeGUIProcess(), worker_queue, status_queue, log_queue)
+
+    store = TelemetryStore(tmp_path / "telemetry.sqlite", read_only=True)
+    rows = {row["command_uuid"]: row for row in store.history()}
+    store.close()
+    assert rows["command-1"]["status"] == "complete"
+    assert rows["command-1"]["encoder"] == "AVC (x264)"
+    assert rows["command-1"]["width"] == 1920
+    assert rows["command-2"]["status"] == "cancelled"
+
+
+def test_output_size_is_each_commands_own(tmp_path):
+    """Passes and chunks report what they wrote themselves, only the final encode is measured on disk"""
+    final = tmp_path / "out.mkv"
+    final.write_bytes(bytes(5000))
+    chunk = tmp_path / "chunk_0.mkv"
+    chunk.write_bytes(bytes(300))
+    details = {"output": str(final)}
+
+    def size(command, status="complete", total_size=0):
+        recorder = JobRecorder("video", "command", details=details, command=command)
+        recorder.event = ProgressEvent(total_size=total_size)
+        return recorder.result(status)["output_size"]
+
+    assert size(["ffmpeg", "-i", "in.mkv", "-pass", "1", "-f", "null", "/dev/null"]) == 0
+    assert size("ffmpeg -i in.mkv -pass 1 -f null NUL") == 0
+    assert size(["ffmpeg", "-i", "in.mkv", str(chunk)], total_size=250) == 250
+    assert size(["ffmpeg", "-i", "in.mkv", "-pass", "2", str(final)], total_size=4900) == 5000
+    # A failed retry leaves whatever an earlier run wrote, which says nothing about this one
+    assert size(["ffmpeg", "-i", "in.mkv", str(final)], status="error", total_size=100) == 100
+
+
+@pytest.mark.parametrize("extra", [[], ["--history", "5"], ["--json"]])
+def test_telemetry_cli(tmp_path, monkeypatch, capsys, extra):
+    path = tmp_path / "telemetry.sqlite"
+    monkeypatch.setattr(telemetry, "telemetry_path", path)
+    assert run_telemetry_cli(extra) == 0
+    assert "No encodes" in capsys.readouterr().out
+
+    store = TelemetryStore(path)
+    store.record(finished_recorder(name="first job"), "complete")
+    store.close()
+    assert run_telemetry_cli(extra) == 0
+    assert "HEVC (x265)" in capsys.readouterr().out
+
+
+def make_video(width=1920, height=1080, duration=600.0, preset="medium", crf=22):
+    return Video(
+        source=Path("source.mkv"),
+        duration=duration,
+        streams=Box(video=[Box(index=0, width=width, height=height, r_frame_rate="24000/1001", codec_type="video")]),
+        format=Box(),
+        video_settings=VideoSettings(
+            video_encoder_settings=x265Settings(preset=preset, crf=crf), output_path=Path("out.mkv")
+        ),
+    )
+
+
+def record_video_run(store, video, elapsed, commands=2):
+    details = job_details(video)
+    details["commands"] = commands
+    for i in range(commands):
+        recorder = JobRecorder(video.uuid, f"{video.uuid}-{i}", details=details)
+        recorder.started = 1000.0 + i * elapsed / commands
+        recorder.started_monotonic = time.monotonic() - elapsed / commands
+        store.record(recorder, "complete")
+
+
+def test_job_details():
+    details = job_details(make_video(preset="slow", crf=20))
+    assert details["encoder"] == "HEVC (x265)"
+    assert details["preset"] == "slow"
+    assert details["quality"] == "20"
+    assert (details["width"], details["height"]) == (1920, 1080)
+    assert details["frame_rate"] == pytest.approx(23.976, abs=0.001)
+    assert details["duration"] == 600.0
+
+
+def test_eta_from_history(tmp_path):
+    """Past runs predict new videos by encoded pixels, only finished videos count"""
+    path = tmp_path / "telemetry.sqlite"
+    store = TelemetryStore(path)
+    record_video_run(store, make_video(), elapsed=300)
+    record_video_run(store, make_video(), elapsed=500)
+    record_video_run(store, make_video(preset="slow"), elapsed=900)
+    # Only one of its two commands finished, so it says nothing about whole videos
+    partial = make_video()
+    partial_details = {**job_details(partial), "commands": 2}
+    store.record(JobRecorder(partial.uuid, "only", details=partial_details), "complete")
+    store.close()
+
+    predictor = EtaPredictor()
+    predictor.refresh(path)
+    assert predictor.predict(make_video()) == pytest.approx(400, rel=0.05)
+    assert predictor.predict(make_video(duration=300)) == pytest.approx(200, rel=0.05)
+    assert predictor.predict(make_video(preset="slow")) == pytest.approx(900, rel=0.05)
+    # No 4K runs, falls back to the same encoder and preset scaled by pixels
+    assert predictor.predict(make_video(width=3840, height=2160)) == pytest.approx(1600, rel=0.05)
+
+    queue = [make_video(), make_video(preset="slow"), make_video()]
+    queue[2].status.complete = True
+    assert predictor.queue_eta(queue) == (pytest.approx(1300, rel=0.05), 0)
+    assert predictor.queue_eta(queue, slots=2)[0] == pytest.approx(650, rel=0.05)
+
+
+def test_eta_live_sample():
+    """Without any history, a running encode with the same settings serves as the sample"""
+    predictor = EtaPredictor()
+    video = make_video()
+    assert predictor.predict(video) is None
+    assert predictor.queue_eta([video]) == (0, 1)
+
+    predictor.observe(make_video(), speed=2.0)
+    assert predictor.predict(video) == pytest.approx(300)
+    # Nothing closer to go by than the same encoder on another preset
+    assert predictor.predict(make_video(preset="slow")) == pytest.approx(300)
+
+
+def test_eta_generation():
+    """Predictions only need working out again once a new sample or the history changed them"""
+    predictor = EtaPredictor()
+    running = make_video()
+    predictor.observe(running, speed=2.0)
+    generation = predictor.generation
+    predictor.observe(running, speed=2.5)
+    assert predictor.generation == generation
+    predictor.observe(make_video(), speed=2.0)
+    assert predictor.generation > generation
+
+    videos = [make_video(), make_video()]
+    asked = []
+    assert predictor.queue_eta(videos, predict=lambda video: asked.append(video) or 60.0) == (120.0, 0)
+    assert asked == videos
+
+
+def test_eta_sample_encode():
+    """A sample encode of part of a video predicts every video with the same settings"""
+    predictor = EtaPredictor()
+    generation = predictor.generation
+    predictor.add_sample(make_video(), elapsed=10.0, duration=5.0)
+    assert predictor.generation > generation
+    # Ten seconds for five seconds of video, twenty minutes for the whole ten
+    assert predictor.predict(make_video()) == pytest.approx(1200)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from fastflix.thumbnail_cache import ThumbnailCache
+from fastflix.widgets.background_tasks import PreviewJob, ThumbnailPrefetcher
+
+
+def test_key_covers_source_track_time_and_filters(tmp_path):
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"1234")
+    filters = ["-filter_complex", "[0:0]crop=1920:800:0:140[v]", "-map", "[v]"]
+    key = ThumbnailCache.key(source, 0, 12.5, filters)
+    assert key == ThumbnailCache.key(source, 0, 12.5, list(filters))
+    assert key != ThumbnailCache.key(source, 1, 12.5, filters)
+    assert key != ThumbnailCache.key(source, 0, 13, filters)
+    assert key != ThumbnailCache.key(source, 0, 12.5, [])
+    assert ThumbnailCache.key(source, 0, None, []) == ThumbnailCache.key(source, 0, 0, [])
+
+    source.write_bytes(b"12345")
+    assert key != ThumbnailCache.key(source, 0, 12.5, filters)
+    assert ThumbnailCache.key(tmp_path / "missing.mkv", 0, 0, []) is None
+
+
+def test_memory_and_disk(tmp_path):
+    cache = ThumbnailCache(tmp_path / "cache", max_size=2**20)
+    cache.put("first", b"image")
+    assert cache.get("first") == b"image"
+    assert cache.get("second") is None
+
+    # A fresh cache, as after a restart, reads it back from disk
+    assert ThumbnailCache(tmp_path / "cache", max_size=2**20).get("first") == b"image"
+
+    disabled = ThumbnailCache(tmp_path / "disabled", max_size=0)
+    disabled.put("first", b"image")
+    assert disabled.get("first") is None
+    assert not (tmp_path / "disabled").exists()
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(ThumbnailCache, "memory_limit", 150)
+    cache = ThumbnailCache(tmp_path / "cache", max_size=350)
+    for i, name in enumerate(("a", "b", "c")):
+        cache.put(name, bytes(100))
+        os.utime(cache.file(name), (1000 + i, 1000 + i))
+    # Reading "a" from disk makes it the most recently used
+    assert "a" not in cache.memory
+    assert cache.get("a")
+
+    cache.put("d", bytes(100))
+    assert not cache.file("b").exists()
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c") and cache.get("d")
+    assert cache.memory_size <= 150
+
+    cache.resize(150)
+    assert sorted(entry.stem for entry in (tmp_path / "cache").glob("*.img")) == ["d"]
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), i * 8, np.uint8))
+    writer.release()
+    return path
+
+
+def prefetch_jobs(video, times):
+    return [
+        PreviewJob(
+            source=video,
+            track=0,
+            video_stream=0,
+            start_time=start_time,
+            filters="",
+            key=ThumbnailCache.key(video, 0, start_time, ""),
+            transforms={"max_width": 32},
+        )
+        for start_time in times
+    ]
+
+
+def test_prefetch_fills_the_cache(tmp_path, video):
+    cache = ThumbnailCache(tmp_path / "cache", max_size=2**20)
+    jobs = prefetch_jobs(video, (0.5, 1.5, 2.5))
+    ThumbnailPrefetcher(None, jobs, cache, config=None).run()
+    for job in jobs:
+        image = cv2.imdecode(np.frombuffer(cache.get(job.key), np.uint8), cv2.IMREAD_COLOR)
+        assert image.shape == (24, 32, 3)
+
+
+def test_cancelled_prefetch_stops(tmp_path, video):
+    cache = ThumbnailCache(tmp_path / "cache", max_size=2**20)
+    jobs = prefetch_jobs(video, (0.5, 1.5))
+    prefetcher = ThumbnailPrefetcher(None, jobs, cache, config=None)
+    prefetcher.cancel()
+    prefetcher.run()
+    assert not any(job.key in cache for job in jobs)
+
+
+def test_replacing_an_image_keeps_the_size_right(tmp_path, monkeypatch):
+    cache = ThumbnailCache(tmp_path / "cache", max_size=1000)
+    cache.put("first", bytes(300))
+    evictions = []
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(cache.disk_size))
+    for _ in range(5):
+        cache.put("first", bytes(300))
+    assert cache.disk_size == 300
+    assert evictions == []